@@ -0,0 +1,68 @@
+"""
+file size and load time of the JSON and binary data file formats.
+
+usage: python -m benchmark.binary_format_benchmark [--enrollments 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from dao.database.config import DatabaseConfig
+from dao.database.file_sync import FileSync
+from dao.database.table_file import TableFile
+
+TABLE_NAMES = ("students", "admins", "subjects")
+
+
+def build_tables(enrollment_count):
+    # four enrollments per student
+    student_count = max(enrollment_count // 4, 1)
+    return {
+        "students": [(f"{i:06d}", f"name{i}", f"name{i}@university.com", "5f4dcc3b5aa765d61d8327deb882cf99", None)
+                     for i in range(student_count)],
+        "admins": [],
+        "subjects": [(f"{i // 4:06d}", f"{i % 4:03d}", 25 + i % 76, "P") for i in range(enrollment_count)],
+    }
+
+
+def measure(path, file_format, tables):
+    """
+    :return: (file size in bytes, load seconds)
+    """
+    file_sync = FileSync(DatabaseConfig.FSYNC_NEVER)
+    table_file = TableFile(path, TABLE_NAMES, file_sync, file_format)
+    for table, rows in tables.items():
+        table_file.set_rows(table, rows)
+    table_file.overwrite()
+
+    # a new TableFile has no cache, so load reads and parses the whole file
+    reader = TableFile(path, TABLE_NAMES, file_sync, file_format)
+    start = time.perf_counter()
+    reader.load()
+    elapsed = time.perf_counter() - start
+
+    assert reader.get_rows("subjects") == tables["subjects"]
+    return os.path.getsize(path), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enrollments", type=int, default=1000000)
+    args = parser.parse_args()
+
+    tables = build_tables(args.enrollments)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        json_size, json_time = measure(os.path.join(temp_dir, 'json.data'), DatabaseConfig.FORMAT_JSON, tables)
+        binary_size, binary_time = measure(os.path.join(temp_dir, 'binary.data'), DatabaseConfig.FORMAT_BINARY,
+                                           tables)
+
+    print(f"{args.enrollments} enrollments, {len(tables['students'])} students")
+    print(f"{'format':<10}{'size MB':>10}{'load s':>10}")
+    print(f"{'json':<10}{json_size / 1e6:>10.1f}{json_time:>10.3f}")
+    print(f"{'binary':<10}{binary_size / 1e6:>10.1f}{binary_time:>10.3f}")
+    print(f"reduction: size {json_size / binary_size:.1f}x, load time {json_time / binary_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
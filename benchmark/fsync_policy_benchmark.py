@@ -0,0 +1,62 @@
+"""
+write throughput of each fsync policy, in both storage modes.
+
+usage: python -m benchmark.fsync_policy_benchmark [--students 1000] [--ops 500]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+
+POLICIES = (DatabaseConfig.FSYNC_ALWAYS, DatabaseConfig.FSYNC_INTERVAL, DatabaseConfig.FSYNC_NEVER)
+STORAGE_MODES = (DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.STORAGE_WAL)
+
+
+def build_dataset(database, student_count):
+    # one student with four enrollments per student_count
+    database.write_students([Student(f"{i:06d}", f"name{i}", f"name{i}@university.com", "pass")
+                             for i in range(student_count)])
+    database.write_subjects([Subject(f"{i:06d}", f"{j:03d}", 50 + j, "P")
+                             for i in range(student_count) for j in range(4)])
+
+
+def run(storage_mode, policy, student_count, ops):
+    """
+    :return: (updates per second, fsync calls)
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = Database(os.path.join(temp_dir, 'student.data'), storage_mode,
+                            DatabaseConfig.LAYOUT_SINGLE, policy)
+        build_dataset(database, student_count)
+
+        start = time.perf_counter()
+        for i in range(ops):
+            # a mark update, the typical small write
+            database.update_subject(Subject(f"{i % student_count:06d}", "000", i % 100, "P"))
+        elapsed = time.perf_counter() - start
+
+        database._file_sync.flush()
+        return ops / elapsed, database._file_sync.get_sync_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{args.ops} subject updates, {args.students} students, {args.students * 4} enrollments")
+    print(f"{'storage mode':<14}{'fsync policy':<14}{'updates/s':>12}{'fsync calls':>14}")
+    for storage_mode in STORAGE_MODES:
+        for policy in POLICIES:
+            throughput, sync_count = run(storage_mode, policy, args.students, args.ops)
+            print(f"{storage_mode:<14}{policy:<14}{throughput:>12.0f}{sync_count:>14}")
+
+
+if __name__ == '__main__':
+    main()
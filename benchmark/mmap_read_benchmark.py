@@ -0,0 +1,55 @@
+"""
+cold login lookup latency of eager and mmap read modes, for a growing number of enrollments.
+
+usage: python -m benchmark.mmap_read_benchmark [--students 10000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+
+
+def open_database(path, read_mode):
+    return Database(path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                    DatabaseConfig.FSYNC_NEVER, DatabaseConfig.FORMAT_BINARY, read_mode)
+
+
+def login_seconds(path, read_mode, email):
+    # a new engine, like a short-lived CLI process, up to the first query answered
+    start = time.perf_counter()
+    student = open_database(path, read_mode).find_student_by_email(email)
+    elapsed = time.perf_counter() - start
+    assert student is not None
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10000)
+    args = parser.parse_args()
+
+    students = [Student(f"{i:06d}", f"name{i}", f"name{i}@university.com", "pass") for i in range(args.students)]
+    email = students[-1].get_student_email()
+
+    print(f"{args.students} students")
+    print(f"{'enrollments':>12}{'eager ms':>12}{'mmap ms':>12}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'student.data')
+        for enrollment_count in (0, 100000, 1000000):
+            database = open_database(path, DatabaseConfig.READ_EAGER)
+            database.write_students(students)
+            database.write_subjects([Subject(f"{i % args.students:06d}", f"{i:07d}", 50, "P")
+                                     for i in range(enrollment_count)])
+
+            eager = login_seconds(path, DatabaseConfig.READ_EAGER, email)
+            mapped = login_seconds(path, DatabaseConfig.READ_MMAP, email)
+            print(f"{enrollment_count:>12}{eager * 1000:>12.1f}{mapped * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+cold start of an engine whose log was never checkpointed, e.g. after a crash, for a growing number of records.
+the log holds the enrollments of the students and then mark updates of single columns, one record per line.
+
+usage: python -m benchmark.wal_replay_benchmark [--records 1000000] [--students 10000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.wal import WriteAheadLog
+from dao.entity.subject import Subject
+
+
+def write_log(path, record_count, student_count):
+    # one record per line as single writes append them, four enrollments per student, then patches of their marks
+    enrollments = [(f"{i:06d}", f"{j:03d}") for i in range(student_count) for j in range(4)]
+    with open(path + ".wal", 'w') as file:
+        for number in range(record_count):
+            student_id, subject_id = enrollments[number % len(enrollments)]
+            if number < len(enrollments):
+                record = {"op": "insert", "table": "subjects",
+                          "row": Subject(student_id, subject_id, 50, "P").to_dict()}
+            else:
+                record = {"op": "patch", "table": "subjects",
+                          "where": {"student_id": student_id, "subject_id": subject_id}, "set": {"mark": number % 100}}
+            file.write(WriteAheadLog.encode(record))
+
+
+def replay_seconds(path):
+    # a new engine up to the first answered query, which loads data file and log
+    start = time.perf_counter()
+    count = Database(path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                     DatabaseConfig.FSYNC_NEVER).count_subjects_by_student_id("000000")
+    elapsed = time.perf_counter() - start
+    assert count == 4
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--students", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"log replay of {args.students * 4} enrollments and their mark patches")
+    print(f"{'records':>12}{'log MB':>10}{'replay s':>12}{'records/s':>14}")
+    record_count = args.students * 4
+    while True:
+        record_count = min(record_count * 5, args.records)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'student.data')
+            write_log(path, record_count, args.students)
+            size = os.path.getsize(path + ".wal")
+            seconds = replay_seconds(path)
+        print(f"{record_count:>12}{size / (1 << 20):>10.1f}{seconds:>12.2f}{record_count / seconds:>14.0f}")
+        if record_count >= args.records:
+            break
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import copy
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from util.exception import DataAccessException
+
+
+class AsyncDatabase:
+    """
+    asyncio front of a storage engine, its blocking calls run on a bounded thread pool, so one event loop serves
+    many sessions without a thread per session, and at most max_workers calls do file I/O at a time.
+        students = await async_database.read(("students",), database.read_students)
+        await async_database.run(database.delete_students, student_id)
+    concurrent reads with the same key are coalesced: while one is running, a read of the same key on the same
+    event loop waits for it instead of loading again. a write started meanwhile ends the coalescing, a read after
+    it runs on its own and sees the write. every waiting reader gets its own deep copy of the result, so no two
+    sessions share an entity.
+    ** Note ** only calls through this object are coalesced and counted as writes, e.g. a write of another process
+    or of synchronous code on the same engine is seen by the next read that runs, not by one already running.
+
+    Fields:
+        _database       Database or SqliteDatabase whose methods are called
+        _executor       ThreadPoolExecutor with DatabaseConfig.ASYNC_WORKERS threads by default
+        _generation     number of writes started, part of the key of a running read
+        _inflight       (event loop, generation, key) -> [future of the running read, number of waiting readers]
+        _stats          counters, see get_stats
+        _instances      class level registry of the shared instances, keyed by engine
+    Methods:
+        read:           coalesced call of a function that only reads
+        run:            call of a function that may write
+        get_stats:      reads, coalesced reads and writes
+        close:          wait for the running calls and stop the threads
+        get_instance:   class method for the async front of the shared engine
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, database=None, max_workers=None):
+        self._database = database if database is not None else Database.get_instance()
+        max_workers = max_workers if max_workers is not None else DatabaseConfig.ASYNC_WORKERS
+        if max_workers < 1:
+            raise DataAccessException(f"invalid number of async workers: {max_workers}")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dao-async")
+        self._generation = 0
+        self._inflight = {}
+        self._stats = {"reads": 0, "coalesced": 0, "writes": 0}
+
+    @classmethod
+    def get_instance(cls, data_file_path=None):
+        # one AsyncDatabase per shared engine, see Database.get_instance
+        database = Database.get_instance(data_file_path)
+        with cls._instances_lock:
+            instance = cls._instances.get(id(database))
+            if instance is None or instance.get_database() is not database:
+                instance = cls(database)
+                cls._instances[id(database)] = instance
+            return instance
+
+    def get_database(self):
+        # getter for _database
+        return self._database
+
+    async def read(self, key, function, *args):
+        """
+        :param key:         hashable identity of the read, equal keys must return equal results, e.g. the name of
+                            the operation and its arguments
+        :param function:    function that does not write, called with args on an executor thread
+        :return: result of function, a deep copy for every reader that waited for another one
+        """
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, self._generation, key)
+        entry = self._inflight.get(inflight_key)
+        if entry is not None:
+            entry[1] += 1
+            self._stats["coalesced"] += 1
+            return copy.deepcopy(await asyncio.shield(entry[0]))
+
+        self._stats["reads"] += 1
+        entry = [loop.run_in_executor(self._executor, functools.partial(function, *args)), 0]
+        self._inflight[inflight_key] = entry
+        try:
+            result = await asyncio.shield(entry[0])
+        finally:
+            if self._inflight.get(inflight_key) is entry:
+                del self._inflight[inflight_key]
+        # the result stays untouched for the waiting readers, which copy it later
+        return copy.deepcopy(result) if entry[1] else result
+
+    async def run(self, function, *args):
+        """
+        :param function:    function that may write, called with args on an executor thread
+        :return: result of function
+        """
+        self._generation += 1
+        self._stats["writes"] += 1
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args))
+
+    def get_stats(self):
+        return dict(self._stats)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,192 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from util.exception import CorruptDataException, DataAccessException
+
+
+class BinaryFormat:
+    """
+    compact binary encoding of the tables of a data file.
+
+    layout (little endian):
+        header      MAGIC, u8 VERSION, u16 table count
+        table       u16 name length, name, u32 row count, u16 column count, columns
+        column      u16 name length, name, u8 kind, u32 payload length, u32 CRC32 of the payload, payload
+
+    each column of a table is one length-prefixed block, so key names are stored once per table
+    and decoding is a few C-level calls per column instead of Python work per row.
+    a block is checked against its CRC32 when it is decoded, so damaged bytes raise CorruptDataException instead
+    of becoming wrong rows. version 1 files have no checksums and are still read.
+    column kinds:
+        KIND_STR    all values are str, joined by the unit separator \\x1f
+        KIND_INT    all values are int64, stored as an array of 8-byte integers
+        KIND_JSON   anything else (None, mixed types), stored as a compact JSON array
+
+    Methods:
+        is_binary:      check the header of file content
+        encode:         tables of row tuples -> bytes
+        index:          bytes -> offset table of every column block, without decoding
+        decode:         bytes -> tables of row tuples
+        decode_column:  one column block -> list of values
+        check_column:   verify the checksum of one column block
+    """
+
+    MAGIC = b"UNIAPPDB"
+    VERSION = 2
+    # versions that are read, version 1 has no checksums
+    READ_VERSIONS = (1, 2)
+
+    KIND_STR = 1
+    KIND_INT = 2
+    KIND_JSON = 3
+
+    SEPARATOR = "\x1f"
+
+    @classmethod
+    def is_binary(cls, content):
+        return content[:len(cls.MAGIC)] == cls.MAGIC
+
+    @classmethod
+    def encode(cls, tables, table_columns):
+        """
+        :param tables:          dict of table name -> list of row tuples
+        :param table_columns:   dict of table name -> column names, in row tuple order
+        :return: bytes
+        """
+        parts = [cls.MAGIC, struct.pack("<BH", cls.VERSION, len(tables))]
+        for table, rows in tables.items():
+            columns = table_columns[table]
+            parts.append(cls._pack_name(table))
+            parts.append(struct.pack("<IH", len(rows), len(columns)))
+            for index, column in enumerate(columns):
+                kind, payload = cls._encode_column([row[index] for row in rows])
+                parts.append(cls._pack_name(column))
+                parts.append(struct.pack("<BII", kind, len(payload), zlib.crc32(payload)))
+                parts.append(payload)
+        return b"".join(parts)
+
+    @classmethod
+    def index(cls, content):
+        """
+        read only the headers and build the offset table, no column is decoded.
+
+        :param content: bytes or mmap, starting with the header
+        :return: dict of table name -> (row count, dict of column name -> (kind, payload offset, payload length,
+                 CRC32 or None for version 1))
+        """
+        if not cls.is_binary(content):
+            raise DataAccessException("not a binary data file")
+        offset = len(cls.MAGIC)
+        version, table_count = struct.unpack_from("<BH", content, offset)
+        if version not in cls.READ_VERSIONS:
+            raise DataAccessException(f"unsupported binary format version: {version}")
+        offset += 3
+
+        offsets = {}
+        try:
+            for _ in range(table_count):
+                table, offset = cls._unpack_name(content, offset)
+                row_count, column_count = struct.unpack_from("<IH", content, offset)
+                offset += 6
+
+                columns = {}
+                for _ in range(column_count):
+                    column, offset = cls._unpack_name(content, offset)
+                    if version == 1:
+                        (kind, length), crc = struct.unpack_from("<BI", content, offset), None
+                        offset += 5
+                    else:
+                        kind, length, crc = struct.unpack_from("<BII", content, offset)
+                        offset += 9
+                    if offset + length > len(content):
+                        raise CorruptDataException(f"column block {table}.{column} ends after the data file")
+                    columns[column] = (kind, offset, length, crc)
+                    offset += length
+                offsets[table] = (row_count, columns)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise CorruptDataException(f"corrupt binary data file header: {e}") from e
+        return offsets
+
+    @classmethod
+    def decode(cls, content, table_columns):
+        """
+        :param content:         bytes or mmap, starting with the header
+        :param table_columns:   dict of table name -> column names, in row tuple order
+        :return: dict of table name -> list of row tuples, for the tables in table_columns
+        """
+        offsets = cls.index(content)
+
+        tables = {table: [] for table in table_columns}
+        for table, columns in table_columns.items():
+            if table not in offsets or not offsets[table][0]:
+                continue
+            row_count, column_offsets = offsets[table]
+            missing = [None] * row_count
+            values = [cls.decode_column(content, column_offsets[column], row_count)
+                      if column in column_offsets else missing for column in columns]
+            tables[table] = list(zip(*values))
+        return tables
+
+    @classmethod
+    def decode_column(cls, content, column_offset, row_count):
+        """
+        :param content:         bytes or mmap
+        :param column_offset:   (kind, payload offset, payload length, CRC32) from @index
+        :param row_count:       number of values
+        :return: list of values
+        """
+        cls.check_column(content, column_offset)
+        kind, offset, length, _ = column_offset
+        return cls._decode_column(kind, content[offset:offset + length], row_count)
+
+    @staticmethod
+    def check_column(content, column_offset):
+        # raise CorruptDataException if the payload does not match its CRC32, a block without one passes
+        _, offset, length, crc = column_offset
+        if crc is None:
+            return
+        # a view, so the block is not copied out of a mapping
+        with memoryview(content) as view, view[offset:offset + length] as payload:
+            if zlib.crc32(payload) != crc:
+                raise CorruptDataException(f"checksum mismatch of the column block at byte {offset}")
+
+    @classmethod
+    def _encode_column(cls, values):
+        if all(type(value) is str and cls.SEPARATOR not in value for value in values):
+            return cls.KIND_STR, cls.SEPARATOR.join(values).encode("utf-8")
+        if all(type(value) is int and -2 ** 63 <= value < 2 ** 63 for value in values):
+            numbers = array("q", values)
+            if sys.byteorder == "big":
+                numbers.byteswap()
+            return cls.KIND_INT, numbers.tobytes()
+        return cls.KIND_JSON, json.dumps(values, separators=(',', ':')).encode("utf-8")
+
+    @classmethod
+    def _decode_column(cls, kind, payload, row_count):
+        if row_count == 0:
+            return []
+        if kind == cls.KIND_STR:
+            return bytes(payload).decode("utf-8").split(cls.SEPARATOR)
+        if kind == cls.KIND_INT:
+            numbers = array("q")
+            numbers.frombytes(payload)
+            if sys.byteorder == "big":
+                numbers.byteswap()
+            return numbers.tolist()
+        if kind == cls.KIND_JSON:
+            return json.loads(bytes(payload))
+        raise DataAccessException(f"unknown column kind: {kind}")
+
+    @staticmethod
+    def _pack_name(name):
+        encoded = name.encode("utf-8")
+        return struct.pack("<H", len(encoded)) + encoded
+
+    @staticmethod
+    def _unpack_name(content, offset):
+        (length,) = struct.unpack_from("<H", content, offset)
+        offset += 2
+        return bytes(content[offset:offset + length]).decode("utf-8"), offset + length
@@ -0,0 +1,190 @@
+import queue
+import threading
+
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+
+
+class ChangeEvent:
+    """
+    one committed change of a student or an enrollment, published by the engine through its ChangeEventBus.
+    a subscriber keeps derived state fresh from the events alone, e.g. adds the new mark of SUBJECT_UPDATED
+    to an aggregate, and only rebuilds it after a *_REPLACED event.
+
+    Fields:
+        _kind   one of the kinds below
+        _key    dict of the primary key columns of the changed row, a deletion of enrollments may only name the
+                student, then all of its enrollments were deleted
+        _row    dict of all columns after the change, as Student.to_dict or Subject.to_dict, None for deletions
+                and replacements
+    Methods:
+        get_entity:     Student or Subject of the row, None for deletions and replacements
+        from_record:    event of an applied change record, see WriteAheadLog
+        replaced:       event of a table written as a whole, e.g. by write_students or delete_data_file
+    """
+
+    STUDENT_ADDED = "student_added"
+    STUDENT_UPDATED = "student_updated"
+    STUDENT_DELETED = "student_deleted"
+    SUBJECT_ADDED = "subject_added"
+    SUBJECT_UPDATED = "subject_updated"
+    SUBJECT_DELETED = "subject_deleted"
+    # all rows of the table may have changed, derived state is rebuilt from a full read
+    STUDENTS_REPLACED = "students_replaced"
+    SUBJECTS_REPLACED = "subjects_replaced"
+
+    # (table, record op) -> kind, changes of other tables are not published
+    KINDS = {("students", "insert"): STUDENT_ADDED, ("students", "update"): STUDENT_UPDATED,
+             ("students", "patch"): STUDENT_UPDATED, ("students", "delete"): STUDENT_DELETED,
+             ("subjects", "insert"): SUBJECT_ADDED, ("subjects", "update"): SUBJECT_UPDATED,
+             ("subjects", "patch"): SUBJECT_UPDATED, ("subjects", "delete"): SUBJECT_DELETED}
+
+    # primary key columns of each table
+    KEYS = {"students": ("id",), "subjects": ("student_id", "subject_id")}
+
+    def __init__(self, kind, key, row=None):
+        self._kind = kind
+        self._key = key
+        self._row = row
+
+    def get_kind(self):
+        # getter for _kind
+        return self._kind
+
+    def get_key(self):
+        # getter for _key
+        return self._key
+
+    def get_row(self):
+        # getter for _row
+        return self._row
+
+    def get_entity(self):
+        if self._row is None:
+            return None
+        if self._kind.startswith("student"):
+            return Student.from_dict(self._row)
+        return Subject.from_dict(self._row)
+
+    def __eq__(self, other):
+        return (isinstance(other, ChangeEvent) and other.get_kind() == self._kind and other.get_key() == self._key
+                and other.get_row() == self._row)
+
+    def __repr__(self):
+        return f"ChangeEvent({self._kind}, {self._key})"
+
+    @classmethod
+    def from_record(cls, record, row=None):
+        """
+        :param record:  applied change record
+        :param row:     dict of all columns of the row after an insert, update or patch
+        :return: ChangeEvent, None for a table without events
+        """
+        table = record["table"]
+        kind = cls.KINDS.get((table, record["op"]))
+        if kind is None:
+            return None
+        values = record["where"] if "where" in record else record["row"]
+        key = {column: values[column] for column in cls.KEYS[table] if column in values}
+        return cls(kind, key, row if record["op"] != "delete" else None)
+
+    @classmethod
+    def replaced(cls, table):
+        # None for a table without events
+        kind = {"students": cls.STUDENTS_REPLACED, "subjects": cls.SUBJECTS_REPLACED}.get(table)
+        return cls(kind, {}) if kind is not None else None
+
+
+class ChangeEventBus:
+    """
+    in-process delivery of the ChangeEvents of one engine to its subscribers, after the changes are committed.
+    changes of other processes are not seen, their derived state is refreshed by reading the files.
+        database.subscribe(callback)                                synchronous
+        database.subscribe(callback, kinds={ChangeEvent.SUBJECT_UPDATED}, queued=True)
+    a synchronous subscriber is called by the committing thread once the file lock is released, so it may read and
+    write the database itself. a queued subscriber is called in commit order by one background thread of the bus,
+    the committing thread does not wait for it. an exception of a subscriber is counted, not raised, the change
+    is committed already and the other subscribers still get the event.
+
+    Fields:
+        _subscribers    list of (callback, set of kinds or None for all, queued)
+        _queue          queue of (callback, event) for the delivery thread
+        _thread         delivery thread, started by the first queued subscriber
+        _lock           guards _subscribers, _thread and _stats
+        _stats          counters, see get_stats
+    Methods:
+        subscribe:      register a function of one ChangeEvent
+        unsubscribe:    remove a registered function
+        publish:        deliver the events of one commit
+        flush:          wait until the queued events are delivered
+        get_stats:      published and delivered events, and exceptions of subscribers
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "delivered": 0, "errors": 0}
+
+    def subscribe(self, callback, kinds=None, queued=False):
+        """
+        :param callback:    function of one ChangeEvent
+        :param kinds:       ChangeEvent kinds the callback is called for, None for all
+        :param queued:      False: called by the committing thread, True: called by the delivery thread
+        :return: callback, for unsubscribe
+        """
+        with self._lock:
+            self._subscribers = self._subscribers + [(callback, set(kinds) if kinds is not None else None, queued)]
+            if queued and self._thread is None:
+                self._thread = threading.Thread(target=self._deliver_queued, name="change-events", daemon=True)
+                self._thread.start()
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber[0] is not callback]
+
+    def publish(self, events):
+        # events of one commit in the order of the changes, None entries are skipped
+        subscribers = self._subscribers
+        for event in events:
+            if event is None:
+                continue
+            self._count("published")
+            for callback, kinds, queued in subscribers:
+                if kinds is not None and event.get_kind() not in kinds:
+                    continue
+                if queued:
+                    self._queue.put((callback, event))
+                else:
+                    self._deliver(callback, event)
+
+    def flush(self):
+        # wait until the delivery thread has called the queued subscribers with every event published so far
+        self._queue.join()
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    def _count(self, key):
+        # committing threads and the delivery thread count at the same time, += on a dict item is no atomic step
+        with self._lock:
+            self._stats[key] += 1
+
+    def _deliver(self, callback, event):
+        try:
+            callback(event)
+        except Exception:
+            self._count("errors")
+        else:
+            self._count("delivered")
+
+    def _deliver_queued(self):
+        while True:
+            callback, event = self._queue.get()
+            try:
+                self._deliver(callback, event)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,134 @@
+import threading
+import time
+
+from dao.database.config import DatabaseConfig
+from util.exception import DataAccessException
+
+
+class IoBudget:
+    """
+    token bucket of bytes per second, consume sleeps until the bytes fit into the budget.
+    at most one second of unused budget is saved up, so a burst after a pause stays bounded.
+
+    Fields:
+        _rate               bytes per second, 0 for no limit
+        _available          bytes that may be written now, negative while in debt
+        _last               monotonic time _available was computed at
+        _throttled_seconds  total time slept
+        _lock               guards the fields, the runs sharing a budget consume it at the same time
+    Methods:
+        consume:    account for bytes about to be written
+    """
+
+    def __init__(self, bytes_per_second):
+        self._rate = bytes_per_second
+        self._available = 0.0
+        self._last = time.monotonic()
+        self._throttled_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def get_throttled_seconds(self):
+        # getter for _throttled_seconds
+        with self._lock:
+            return self._throttled_seconds
+
+    def consume(self, size):
+        if self._rate <= 0:
+            return
+        # the debt is booked under the lock, the sleep is not
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self._rate, self._available + (now - self._last) * self._rate) - size
+            self._last = now
+            if self._available >= 0:
+                return
+            wait = -self._available / self._rate
+            self._throttled_seconds += wait
+        time.sleep(wait)
+
+
+class Compactor:
+    """
+    storage maintenance of one engine on a background thread.
+    every interval it calls the compact method of the engine, see Database.compact, which checkpoints the data
+    files whose logs have grown and drops the logs. the writes are throttled by an IoBudget, and foreground calls
+    only wait for the final rename, so they are not blocked by a compaction.
+    a failed run, e.g. a lock timeout, is counted and the next run tries again. so is an unexpected error, whose
+    repr is kept in the stats, the thread ends only on stop.
+
+    Fields:
+        _database   Database or SqliteDatabase
+        _interval   seconds between two runs
+        _budget     IoBudget shared by all runs
+        _thread     background thread, None until started
+        _stop       event that ends the background thread
+        _stats      counters of all runs, see get_stats
+        _lock       guards _stats, runs of the background thread and of run_once count at the same time
+    Methods:
+        start:      start the background thread
+        stop:       end the background thread, a running compaction is completed first
+        run_once:   one compaction now, in the calling thread
+        is_running: whether the background thread is started
+        get_stats:  runs, compacted and skipped files, reclaimed bytes and throttling of all runs
+    """
+
+    def __init__(self, database, interval_ms=None, io_budget=None):
+        self._database = database
+        interval_ms = interval_ms if interval_ms is not None else DatabaseConfig.COMPACTION_INTERVAL_MS
+        self._interval = interval_ms / 1000
+        self._budget = IoBudget(io_budget if io_budget is not None else DatabaseConfig.COMPACTION_IO_BUDGET)
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "compacted": 0, "skipped": 0, "errors": 0, "unexpected_errors": 0,
+                       "last_error": None, "bytes_written": 0, "reclaimed_bytes": 0, "last_report": None}
+
+    def start(self):
+        if self._thread is not None or self._interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None
+
+    def run_once(self, min_log_bytes=None):
+        """
+        :param min_log_bytes:   log size from which a data file is compacted, see DatabaseConfig
+        :return: report of the engine, see Database.compact
+        """
+        report = self._database.compact(min_log_bytes, self._budget)
+        with self._lock:
+            self._stats["runs"] += 1
+            for key in ("compacted", "skipped", "bytes_written", "reclaimed_bytes"):
+                self._stats[key] += report[key]
+            self._stats["last_report"] = report
+        return report
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, throttled_seconds=self._budget.get_throttled_seconds())
+
+    def _count_error(self, error, unexpected=False):
+        with self._lock:
+            self._stats["errors"] += 1
+            self._stats["unexpected_errors"] += int(unexpected)
+            self._stats["last_error"] = repr(error)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.run_once()
+            except (DataAccessException, OSError) as e:
+                self._count_error(e)
+            except Exception as e:
+                # e.g. a bug, the thread keeps running, a later run may still succeed
+                self._count_error(e, unexpected=True)
@@ -0,0 +1,115 @@
+import os
+
+
+class DatabaseConfig:
+    # define database configuration, each value can be overridden by an environment variable
+
+    # type 1: storage mode
+    # -----1.1: rewrite the whole data file on every change
+    STORAGE_OVERWRITE = "overwrite"
+    # -----1.2: append every change to a write-ahead log, replayed on top of the data file (checkpoint) on load
+    STORAGE_WAL = "wal"
+    STORAGE_MODE = os.environ.get("UNIAPP_STORAGE_MODE", STORAGE_OVERWRITE)
+
+    # type 2: file layout
+    # -----2.1: all tables in one data file
+    LAYOUT_SINGLE = "single"
+    # -----2.2: one data file per table, listed in a manifest next to the data file
+    LAYOUT_SPLIT = "split"
+    # -----2.3: students and their enrollments in SHARD_COUNT data files by hash of the student id, admins and a
+    #           global email index in one file each, listed in a manifest next to the data file
+    LAYOUT_SHARDED = "sharded"
+    LAYOUT = os.environ.get("UNIAPP_LAYOUT", LAYOUT_SINGLE)
+    # shards of a new sharded layout, an existing one keeps its count until it is resharded, see Database.reshard
+    SHARD_COUNT = int(os.environ.get("UNIAPP_SHARD_COUNT", "4"))
+
+    # type 3: storage backend
+    # -----3.1: JSON data files handled by Database
+    BACKEND_JSON = "json"
+    # -----3.2: sqlite3 database next to the data file, handled by SqliteDatabase
+    BACKEND_SQLITE = "sqlite"
+    BACKEND = os.environ.get("UNIAPP_DB_BACKEND", BACKEND_JSON)
+
+    # type 4: fsync policy of data files and logs
+    # -----4.1: fsync every commit before it returns
+    FSYNC_ALWAYS = "always"
+    # -----4.2: group commit, a background thread fsyncs all logs and directories written in the last
+    #           FSYNC_INTERVAL_MS, the temp file of a data file is still synced before it is renamed into place
+    FSYNC_INTERVAL = "interval"
+    # -----4.3: leave it to the operating system
+    FSYNC_NEVER = "never"
+    FSYNC_POLICY = os.environ.get("UNIAPP_FSYNC_POLICY", FSYNC_ALWAYS)
+    FSYNC_INTERVAL_MS = int(os.environ.get("UNIAPP_FSYNC_INTERVAL_MS", "50"))
+
+    # type 5: data file format, both are detected on read, this one is used for writing
+    # -----5.1: pretty printed JSON
+    FORMAT_JSON = "json"
+    # -----5.2: compact binary, see BinaryFormat
+    FORMAT_BINARY = "binary"
+    FILE_FORMAT = os.environ.get("UNIAPP_FILE_FORMAT", FORMAT_JSON)
+
+    # type 6: read mode of binary data files
+    # -----6.1: decode all tables when the file is loaded
+    READ_EAGER = "eager"
+    # -----6.2: mmap the file and decode columns and rows only when accessed, see MappedTable
+    READ_MMAP = "mmap"
+    READ_MODE = os.environ.get("UNIAPP_READ_MODE", READ_EAGER)
+
+    # type 7: rows per chunk of the streaming iterators iter_students and iter_subjects
+    STREAM_CHUNK_ROWS = int(os.environ.get("UNIAPP_STREAM_CHUNK_ROWS", "1000"))
+
+    # type 8: comparison of student emails in the unique email index
+    # -----8.1: emails are unique as stored
+    EMAIL_CASE_SENSITIVE = "sensitive"
+    # -----8.2: emails are unique ignoring case, lookups ignore case as well
+    EMAIL_CASE_INSENSITIVE = "insensitive"
+    EMAIL_CASE = os.environ.get("UNIAPP_EMAIL_CASE", EMAIL_CASE_SENSITIVE)
+
+    # type 9: sidecar index files of JSON data files, see IndexFile
+    # -----9.1: keyed lookups of a cold process read the index file, it is rebuilt lazily after the data file changed
+    INDEX_FILES_ON = "on"
+    # -----9.2: no index files, the first lookup parses the data file
+    INDEX_FILES_OFF = "off"
+    INDEX_FILES = os.environ.get("UNIAPP_INDEX_FILES", INDEX_FILES_ON)
+
+    # type 10: milliseconds to wait for the database file lock before LockTimeoutException, see FileLock
+    LOCK_TIMEOUT_MS = int(os.environ.get("UNIAPP_LOCK_TIMEOUT_MS", "10000"))
+
+    # type 11: concurrency control of writers in several processes
+    # -----11.1: a transaction holds the exclusive file lock from its first read to its commit
+    CONCURRENCY_LOCKING = "locking"
+    # -----11.2: reads take no file lock, a commit is only written if the generation is unchanged since the
+    #            transaction started, otherwise the transaction is run again up to CAS_RETRIES times
+    CONCURRENCY_OPTIMISTIC = "optimistic"
+    CONCURRENCY = os.environ.get("UNIAPP_CONCURRENCY", CONCURRENCY_LOCKING)
+    CAS_RETRIES = int(os.environ.get("UNIAPP_CAS_RETRIES", "5"))
+
+    # type 12: threads of one process sharing a Database
+    # -----12.1: reads and writes of all threads are serialized by the mutex of the file lock
+    THREADING_SERIALIZED = "serialized"
+    # -----12.2: every load and commit publishes an immutable copy-on-write version of the rows, threads query the
+    #            current one without lock, only writers and reads of changed files take the mutex
+    THREADING_SNAPSHOT = "snapshot"
+    THREADING = os.environ.get("UNIAPP_THREADING", THREADING_SERIALIZED)
+
+    # type 13: background compaction of the shared engine, see Compactor
+    # -----13.1: Database.get_instance starts a background thread that compacts the logs
+    COMPACTION_ON = "on"
+    # -----13.2: no background thread, Database.compact and Database.start_compaction can still be called.
+    #           in wal mode a commit that finds a log of COMPACTION_MIN_LOG_BYTES rewrites the data file instead
+    COMPACTION_OFF = "off"
+    COMPACTION = os.environ.get("UNIAPP_COMPACTION", COMPACTION_OFF)
+    # milliseconds between two runs, 0 turns the background thread off
+    COMPACTION_INTERVAL_MS = int(os.environ.get("UNIAPP_COMPACTION_INTERVAL_MS", "60000"))
+    # log size from which a data file is compacted, replay time of a cold start grows with it
+    COMPACTION_MIN_LOG_BYTES = int(os.environ.get("UNIAPP_COMPACTION_MIN_LOG_BYTES", str(1 << 20)))
+    # bytes per second a compaction may write, 0 for no limit
+    COMPACTION_IO_BUDGET = int(os.environ.get("UNIAPP_COMPACTION_IO_BUDGET", str(8 << 20)))
+
+    # type 14: delta segment of overwrite mode
+    # a commit of patch records only, e.g. a changed mark or password, is appended to the log of the data file instead
+    # of rewriting it, until the log has this size, then the next commit rewrites the data file, 0 always rewrites
+    DELTA_MAX_BYTES = int(os.environ.get("UNIAPP_DELTA_MAX_BYTES", str(1 << 20)))
+
+    # type 15: threads of the executor of AsyncDatabase, they bound the blocking file I/O of all asyncio sessions
+    ASYNC_WORKERS = int(os.environ.get("UNIAPP_ASYNC_WORKERS", "4"))
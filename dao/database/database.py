@@ -1,21 +1,59 @@
+import contextlib
+import itertools
 import json
 import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
+from dao.database.change_events import ChangeEvent, ChangeEventBus
+from dao.database.compactor import Compactor
+from dao.database.config import DatabaseConfig
+from dao.database.file_lock import FileLock
+from dao.database.file_sync import FileSync
+from dao.database.sqlite_database import SqliteDatabase
+from dao.database.table_file import TableFile
 from dao.entity.admin import Admin
 from dao.entity.student import Student
 from dao.entity.subject import Subject
+from util.exception import DataAccessException, WriteConflictException
 
 
 class Database:
     """
     this is a simulation of database basis operations that include query from file and write data to file.
     Fields:
-        _students           student array
-        _subjects           subject enrollment array
-        _data_file_path     database file
+        _data_file_path     database file, in split layout the manifest and table files are named after it
+        _storage_mode       DatabaseConfig.STORAGE_OVERWRITE or DatabaseConfig.STORAGE_WAL
+        _layout             DatabaseConfig.LAYOUT_SINGLE, LAYOUT_SPLIT or LAYOUT_SHARDED
+        _table_files        TableFile of each table, all tables share one TableFile in single layout,
+                            in sharded layout only admins and the global email index
+        _shards             TableFiles of students and subjects in sharded layout, see @shard_of, None otherwise
+        _executor           thread pool loading several shards in parallel, None unless there are several shards
+        _file_sync          FileSync of all files of this engine, see DatabaseConfig.FSYNC_POLICY
+        _file_format        format for writing data files, see DatabaseConfig.FILE_FORMAT
+        _read_mode          eager or mmap reading of binary data files, see DatabaseConfig.READ_MODE
+        _email_case         case sensitivity of the unique email index, see DatabaseConfig.EMAIL_CASE
+        _index_files        sidecar index files of JSON data files on or off, see DatabaseConfig.INDEX_FILES
+        _cache_hits         number of loads answered from the parsed rows without touching the file content
+        _cache_misses       number of loads that had to read and parse a data file
+        _cache_lock         guards _cache_hits and _cache_misses, snapshot reads count them without file lock
+        _file_lock          FileLock of "<data file>.lock", shared for loads and lookups, exclusive for writes
+        _concurrency        locking or optimistic concurrency control, see DatabaseConfig.CONCURRENCY
+        _conflicts          number of optimistic transactions that were run again after a write conflict
+        _threading_mode     serialized or snapshot reads of the threads of this process, see DatabaseConfig.THREADING
+        _compactor          Compactor of this engine, its background thread runs only in the shared engine
+        _snapshot           thread local, its versions attribute maps each table file to the TableVersion or
+                            PinnedFile pinned by the open snapshot block of the thread
+        _pending            TableFile -> change records applied in memory by the open transaction, None outside,
+                            records are None if rows were replaced as a whole and the data file is rewritten
+        _event_bus          ChangeEventBus of the subscribers of this engine
+        _events             ChangeEvents of the open transaction, published once it is committed, None outside
+        _instances          class level registry of shared engines, keyed by absolute data file path
     Methods:
-        __init__:       default constructor that init 3 attributes for objects storage:
-                        _students, _admins, _subjects
+        __init__:       default constructor that init the table files of students, admins and subjects
                         **Note**:
                         @_init_file() should be called to physically init a file in disk.
 
@@ -24,136 +62,1083 @@ class Database:
                          **Note**:
                          @_load_file() should be called to load data from data file in disk in all getter methods.
 
+        iter_students, iter_subjects:
+                         public methods for streaming all students / subjects in chunks of rows,
+                         memory stays bounded by the chunk size whatever the size of the table.
+
         write_students:   public method for saving students information to database file.
         write_subjects:   public method for saving a student's all subjects information to database file.
                         **Note**:
                         @_load_file() should be called to load data from data file in disk in all getter methods.
                         @_overwrite_data should be called to physically saving data to data file in disk.
 
-        _load_data      load data from file to memory
-        _overwrite_data write data in memory into file
+        insert_student, update_student, delete_students,
+        insert_subject, update_subject, delete_subjects:
+                        public methods for changing single rows, used by DAOs.
+                        in wal storage mode only the change itself is appended to the log.
+                        an update of an entity changed by its setters only writes the changed columns, in overwrite
+                        mode to the log as a delta segment, see DatabaseConfig.DELTA_MAX_BYTES.
+        insert_students, insert_subjects:
+                        public methods for adding many rows with a single write.
+        email_key:       public method for the form of an email that the unique email index compares.
+        find_student_by_id, find_student_by_email, find_subject,
+        find_subjects_by_student_id, count_subjects_by_student_id:
+                        public methods for keyed queries, used by DAOs.
+                        ids, emails and enrollments of a student are answered by the hash indexes of TableFile,
+                        or by its sidecar index file before the table is loaded.
+                        in snapshot threading mode they and the read methods query the published version of the
+                        table without lock, see TableFile.get_snapshot.
+        checkpoint:      public method for folding the logs into the data files.
+        recover:         public method for cutting every log off after its last valid record, e.g. at startup after
+                         an unclean shutdown. a write does the same for the log it appends to, so it is optional.
+        reshard:         public method for moving the students and enrollments into another number of shards.
+        compact:         public method for checkpointing the data files whose logs have grown, without blocking
+                         foreground calls, and reporting the reclaimed bytes.
+        start_compaction, get_compaction_stats:
+                         public methods for the background Compactor of this engine.
+        transaction:     context manager for a unit of work, the changes of all calls inside are written once
+                         at the end and dropped if it raises.
+        run_transaction: public method for running a function in a transaction, again after a write conflict.
+        snapshot:        context manager pinning one version of all tables, the reads of the thread inside see
+                         only that version, e.g. for reports that read several tables.
+
+        subscribe, unsubscribe, get_event_bus:
+                         public methods for the ChangeEvents of the students and enrollments changed by this engine,
+                         delivered synchronously or through a queue once the change is committed.
+
+        get_cache_stats: public method for getting hit/miss counters of the parse-once cache.
+        get_lock_stats:  public method for getting lock-wait metrics of the file lock.
+        get_instance:    class method for getting the process-wide shared engine of a data file,
+                         a SqliteDatabase if DatabaseConfig.BACKEND is sqlite.
+
+        _load_data      load tables from file to memory, skipped if the file fingerprint is unchanged
+        _overwrite_data write tables in memory into file
     """
 
-    def __init__(self):
+    TABLE_NAMES = ("students", "admins", "subjects")
+
+    # tables partitioned by student id in sharded layout, and their student id column
+    SHARD_KEYS = {"students": "id", "subjects": "student_id"}
+
+    # version of the split and sharded layout manifest
+    MANIFEST_VERSION = 1
+
+    # seconds of the first random backoff before a transaction is run again after a write conflict
+    CONFLICT_BACKOFF = 0.002
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, data_file_path=None, storage_mode=None, layout=None, fsync_policy=None, file_format=None,
+                 read_mode=None, email_case=None, index_files=None, concurrency=None, threading_mode=None,
+                 shard_count=None):
+        """
+        step 1: state the file path as static.
         """
-        step 1: define 3 attributes parsed from student.data file
+        if data_file_path is None:
+            data_file_path = self.default_data_file_path()
+        self._data_file_path = data_file_path
+
+        """
+        step 2: storage mode, the log is used in wal mode but always replayed, so modes can be switched.
         """
-        # _students array, show all students information
-        self._students = []
-        # _admins array includes all admins information
-        self._admins = []
-        # _enrollments array includes all students subject enrollments information
-        self._subjects = []
+        self._storage_mode = storage_mode if storage_mode is not None else DatabaseConfig.STORAGE_MODE
+        if self._storage_mode not in (DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.STORAGE_WAL):
+            raise DataAccessException(f"unknown storage mode: {self._storage_mode}")
+
+        self._file_sync = FileSync(fsync_policy)
+        self._file_format = file_format if file_format is not None else DatabaseConfig.FILE_FORMAT
+        self._read_mode = read_mode if read_mode is not None else DatabaseConfig.READ_MODE
+        self._email_case = email_case if email_case is not None else DatabaseConfig.EMAIL_CASE
+        self._index_files = index_files if index_files is not None else DatabaseConfig.INDEX_FILES
+        self._concurrency = concurrency if concurrency is not None else DatabaseConfig.CONCURRENCY
+        if self._concurrency not in (DatabaseConfig.CONCURRENCY_LOCKING, DatabaseConfig.CONCURRENCY_OPTIMISTIC):
+            raise DataAccessException(f"unknown concurrency: {self._concurrency}")
+        self._threading_mode = threading_mode if threading_mode is not None else DatabaseConfig.THREADING
+        if self._threading_mode not in (DatabaseConfig.THREADING_SERIALIZED, DatabaseConfig.THREADING_SNAPSHOT):
+            raise DataAccessException(f"unknown threading mode: {self._threading_mode}")
 
         """
-        step 2: state the file path as static and then init the file if file exists.
+        step 3: file layout, an existing manifest always means split or sharded layout, whichever it lists.
         """
+        self._layout = layout if layout is not None else DatabaseConfig.LAYOUT
+        if self._layout not in (DatabaseConfig.LAYOUT_SINGLE, DatabaseConfig.LAYOUT_SPLIT,
+                                DatabaseConfig.LAYOUT_SHARDED):
+            raise DataAccessException(f"unknown layout: {self._layout}")
+        shard_count = shard_count if shard_count is not None else DatabaseConfig.SHARD_COUNT
+        if shard_count < 1:
+            raise DataAccessException(f"invalid shard count: {shard_count}")
+        self._file_lock = FileLock(self._data_file_path + ".lock")
+        with self._file_lock.exclusive():
+            manifest = self._read_manifest()
+            if manifest is None and self._layout != DatabaseConfig.LAYOUT_SINGLE:
+                with self._file_lock.writing():
+                    if self._layout == DatabaseConfig.LAYOUT_SPLIT:
+                        self._migrate_to_split_layout()
+                    else:
+                        self._migrate_to_sharded_layout(shard_count)
+                manifest = self._read_manifest()
+            self._open_table_files(manifest)
+
+        """
+        step 4: parse-once cache, rows are kept in memory until the data file fingerprint changes.
+        """
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_lock = threading.Lock()
+
+        """
+        step 5: no transaction is open, changes are persisted by each call.
+        """
+        self._pending = None
+        self._conflicts = 0
+        self._snapshot = threading.local()
+        self._compactor = Compactor(self)
+
+        """
+        step 6: change events of the changes of this engine, published after their commit.
+        """
+        self._event_bus = ChangeEventBus()
+        self._events = None
+
+        # init file
+        self._init_file()
+
+    @staticmethod
+    def default_data_file_path():
         # current work path
         current_dir = os.getcwd()
         # project root path
         project_root = os.path.abspath(os.path.join(current_dir, '..'))
         # data file path
-        self._data_file_path = os.path.join(project_root, 'unidemo', 'student.data')
+        return os.path.join(project_root, 'unidemo', 'student.data')
 
-        # init file
-        self._init_file()
+    @classmethod
+    def get_instance(cls, data_file_path=None):
+        """
+        get the shared engine of a data file, create it on first use.
+        all DAOs of one process use the same engine, so the tables are loaded and cached only once.
+        with the sqlite backend the engine uses "<data file>.sqlite", a new one imports the JSON data file.
+
+        :param data_file_path:  database file, default path is used if None
+        :return: Database or SqliteDatabase
+        """
+        if data_file_path is None:
+            data_file_path = cls.default_data_file_path()
+        key = os.path.abspath(data_file_path)
+
+        with cls._instances_lock:
+            database = cls._instances.get(key)
+            if database is None:
+                if DatabaseConfig.BACKEND == DatabaseConfig.BACKEND_SQLITE:
+                    database = cls._open_sqlite(key)
+                elif DatabaseConfig.BACKEND == DatabaseConfig.BACKEND_JSON:
+                    database = cls(key)
+                else:
+                    raise DataAccessException(f"unknown backend: {DatabaseConfig.BACKEND}")
+                # the logs of the shared engine are compacted in the background, if it is turned on
+                if DatabaseConfig.COMPACTION == DatabaseConfig.COMPACTION_ON:
+                    database.start_compaction()
+                cls._instances[key] = database
+            return database
+
+    @classmethod
+    def _open_sqlite(cls, data_file_path):
+        db_file_path = data_file_path + ".sqlite"
+        is_new = not os.path.exists(db_file_path)
+        database = SqliteDatabase(db_file_path, DatabaseConfig.FSYNC_POLICY, DatabaseConfig.EMAIL_CASE)
+        if is_new and (os.path.exists(data_file_path) or os.path.exists(data_file_path + ".manifest")):
+            database.import_from(cls(data_file_path))
+        return database
 
     def _init_file(self):
-        # Check if the file exists, if not, create it
-        if not os.path.exists(self._data_file_path):
-            # Create the directory if it doesn't exist
-            os.makedirs(os.path.dirname(self._data_file_path), exist_ok=True)
+        # Check if the files exist, if not, create them
+        with self._file_lock.exclusive():
+            for table_file in self._distinct_table_files():
+                table_file.init_file()
+
+    def get_data_file_path(self):
+        # getter for _data_file_path
+        return self._data_file_path
+
+    def get_storage_mode(self):
+        # getter for _storage_mode
+        return self._storage_mode
+
+    def get_layout(self):
+        # getter for _layout
+        return self._layout
+
+    def get_manifest_path(self):
+        # manifest of the split and sharded layouts
+        return self._data_file_path + ".manifest"
+
+    def get_shard_count(self):
+        # number of shards in sharded layout, 1 otherwise
+        return len(self._shards) if self._shards is not None else 1
 
-            # Create an empty file or initialize with some content
-            with open(self._data_file_path, 'w') as file:
-                file.write('')  # Write an empty file or add some initial content here
+    @staticmethod
+    def shard_of(student_id, shard_count):
+        # shard of a student and its enrollments, crc32 is stable across processes unlike hash()
+        return zlib.crc32(str(student_id).encode("utf-8")) % shard_count
 
     def read_students(self):
-        # getter for _students
-        self._load_data()
-        return self._students
+        # getter for students
+        return [Student.from_row(row) for row in self._load_data("students")]
 
     def read_admins(self):
-        # getter for _admins
-        self._load_data()
-        return self._admins
+        # getter for admins
+        return [Admin.from_row(row) for row in self._load_data("admins")]
 
     def read_subjects(self):
-        # getter for _subjects
-        self._load_data()
-        return self._subjects
+        # getter for subjects
+        return [Subject.from_row(row) for row in self._load_data("subjects")]
+
+    def iter_students(self, chunk_size=None):
+        # generator of all students, see @_iter_rows
+        for chunk in self._iter_rows("students", chunk_size):
+            for row in chunk:
+                yield Student.from_row(row)
+
+    def iter_subjects(self, chunk_size=None):
+        # generator of all subjects, see @_iter_rows
+        for chunk in self._iter_rows("subjects", chunk_size):
+            for row in chunk:
+                yield Subject.from_row(row)
 
     def write_students(self, students):
-        # setter for _students
+        # setter for students
+        self._overwrite_data("students", [TableFile.to_row("students", student.to_dict()) for student in students])
 
-        # 1. load latest data
-        self._load_data()
+    def write_admins(self, admins):
+        # setter for admins
+        self._overwrite_data("admins", [TableFile.to_row("admins", admin.to_dict()) for admin in admins])
 
-        # 2. process data
-        self._students = students
+    def write_subjects(self, subjects):
+        # setter for subjects
+        self._overwrite_data("subjects", [TableFile.to_row("subjects", subject.to_dict()) for subject in subjects])
 
-        # 3 call overwrite method for saving data to file
-        self._overwrite_data()
+    def insert_student(self, student):
+        # add one student, the caller is responsible for key checks
+        self._commit_records([{"op": "insert", "table": "students", "row": student.to_dict()}])
 
-    def write_admins(self, admins):
-        # setter for _admins
-        # 1. load latest data
-        self._load_data()
+    def insert_students(self, students):
+        # add many students with one write, the caller is responsible for key checks
+        self._commit_records([{"op": "insert", "table": "students", "row": student.to_dict()} for student in students])
 
-        # 2. process data
-        self._admins = admins
+    def update_student(self, student):
+        # replace the student with the same id, or only set the columns changed by its setters, see @_update_record
+        self._commit_records([self._update_record("students", student)])
+        student.mark_clean()
 
-        # 3 call overwrite method for saving data to file
-        self._overwrite_data()
+    def delete_students(self, student_id):
+        # delete the student with the given id
+        self._commit_records([{"op": "delete", "table": "students", "where": {"id": student_id}}])
 
-    def write_subjects(self, subjects):
-        # setter for _subjects
-        # 1. load latest data
-        self._load_data()
-
-        # # 2. process data
-        self._subjects = subjects
-        #
-        # # 3 call overwrite method for saving data to file
-        self._overwrite_data()
-
-    def _load_data(self):
-        # load data from file using JSON tools
-        self._init_file()
+    def insert_subject(self, subject):
+        # add one enrollment, the caller is responsible for key checks
+        self._commit_records([{"op": "insert", "table": "subjects", "row": subject.to_dict()}])
+
+    def insert_subjects(self, subjects):
+        # add many enrollments with one write, the caller is responsible for key checks
+        self._commit_records([{"op": "insert", "table": "subjects", "row": subject.to_dict()} for subject in subjects])
+
+    def update_subject(self, subject):
+        # replace the enrollment with the same student id and subject id, or only set its changed columns
+        self._commit_records([self._update_record("subjects", subject)])
+        subject.mark_clean()
+
+    def delete_subjects(self, student_id, subject_id=None):
+        # delete one enrollment of a student, or all of them if subject_id is None
+        where = {"student_id": student_id}
+        if subject_id is not None:
+            where["subject_id"] = subject_id
+        self._commit_records([{"op": "delete", "table": "subjects", "where": where}])
+
+    def email_key(self, email):
+        # emails with equal keys are duplicates, see DatabaseConfig.EMAIL_CASE
+        if self._email_case == DatabaseConfig.EMAIL_CASE_INSENSITIVE:
+            return TableFile.fold_case(email)
+        return email
+
+    def find_student_by_id(self, student_id):
+        # the student with the given id, or None
+        rows = self._find_rows("students", ("id",), student_id, student_id)
+        return Student.from_row(rows[0]) if rows else None
 
-        # step 1: load all data from student.data by using _data_file_path
-        with open(self._data_file_path, 'r') as file:
-            content = file.read()
+    def find_student_by_email(self, email):
+        # the student with the given email, or None, in sharded layout the global email index names the shard
+        if self._shards is None:
+            rows = self._find_rows("students", ("email",), email)
+            return Student.from_row(rows[0]) if rows else None
 
-        # step 2: parse json string to objects (students array, admin array, subject array)
-        if content:
-            data = json.loads(content)
+        rows = self._find_rows("emails", ("email",), self.email_key(email))
+        student = self.find_student_by_id(rows[0][1]) if rows else None
+        # the index and the shard are separate writes, a student changed in between is not found
+        if student is None or self.email_key(student.get_student_email()) != self.email_key(email):
+            return None
+        return student
+
+    def find_subject(self, student_id, subject_id):
+        # the enrollment with the given student id and subject id, or None
+        rows = self._find_rows("subjects", ("student_id", "subject_id"), (student_id, subject_id), student_id)
+        return Subject.from_row(rows[0]) if rows else None
+
+    def find_subjects_by_student_id(self, student_id):
+        # all enrollments of a student
+        rows = self._find_rows("subjects", ("student_id",), student_id, student_id)
+        return [Subject.from_row(row) for row in rows]
+
+    def count_subjects_by_student_id(self, student_id):
+        # number of enrollments of a student, no entity is created
+        table_file = self._files_of("subjects", student_id)[0]
+        version = self._snapshot_of(table_file)
+        if version is not None:
+            return version.count_rows("subjects", "student_id", student_id)
+
+        def count():
+            rows = table_file.find_persisted("subjects", ("student_id",), student_id)
+            if rows is not None:
+                return len(rows)
+            self._load_table_files([table_file])
+            return table_file.count_rows("subjects", "student_id", student_id)
+        return self._read(count)
+
+    def checkpoint(self):
+        """
+        write all tables to the data files and drop the logs, so the next load does not need to replay them.
+        """
+        with self._file_lock.exclusive(), self._file_lock.writing():
+            table_files = self._distinct_table_files()
+            self._load_table_files(table_files)
+            self._fan_out(TableFile.overwrite, table_files)
+
+    def recover(self):
+        """
+        repair the logs after a crash: a torn or damaged line and everything after it is cut off, see TableFile.recover.
+        the records before it are kept. a damaged JSON data file is rewritten with the rows that pass their
+        checksums first, see TableFile.salvage, data files are otherwise only replaced by atomic renames.
+        in sharded layout the global email index is written again from the shards if a crash left them apart.
+
+        :return: dict of the number of repaired table files, the bytes dropped from their logs and the damaged rows
+                 dropped from their data files
+        """
+        with self._file_lock.exclusive(), self._file_lock.writing():
+            table_files = self._distinct_table_files()
+            dropped_rows = self._fan_out(TableFile.salvage, table_files)
+            self._load_table_files(table_files)
+            dropped = self._fan_out(TableFile.recover, table_files)
+            rebuilt = self._rebuild_email_index()
+        return {"repaired": sum(1 for size, rows in zip(dropped, dropped_rows) if size or rows) + rebuilt,
+                "dropped_bytes": sum(dropped), "dropped_rows": sum(dropped_rows)}
+
+    def _rebuild_email_index(self):
+        """
+        sharded layout: write the global email index from the students of the shards, if it differs from them.
+        ** Note ** the caller holds the exclusive lock inside writing and has loaded all table files.
+
+        :return: 1 if the index was written, 0 otherwise
+        """
+        if self._shards is None:
+            return 0
+        index_file = self._table_files["emails"]
+        rows = self._email_rows([row for shard in self._shards for row in shard.get_rows("students")])
+        indexed = index_file.get_rows("emails")
+        if len(indexed) == len(rows) and set(indexed) == set(rows):
+            return 0
+        index_file.set_rows("emails", rows)
+        index_file.overwrite()
+        return 1
+
+    def compact(self, min_log_bytes=None, budget=None):
+        """
+        write a compact checkpoint of the live rows of every table file whose log has grown to min_log_bytes,
+        and drop the log, so deleted and replaced rows no longer take space and a cold start replays nothing.
+        unlike @checkpoint only the end of each table file holds the exclusive lock:
+            1. pin the rows under the shared lock
+            2. encode and write them to a temp file without lock, throttled by budget
+            3. rename it over the data file under the exclusive lock, if the generation is unchanged,
+               a table file written meanwhile is skipped until the next run
+        :param min_log_bytes:   DatabaseConfig.COMPACTION_MIN_LOG_BYTES by default
+        :param budget:          IoBudget of the writes, None for no throttling
+        :return: dict of compacted and skipped table files, bytes written, and bytes of data files and logs
+                 before and after, reclaimed_bytes is their difference
+        """
+        min_log_bytes = min_log_bytes if min_log_bytes is not None else DatabaseConfig.COMPACTION_MIN_LOG_BYTES
+        report = {"compacted": 0, "skipped": 0, "bytes_written": 0, "bytes_before": 0, "bytes_after": 0}
+        for table_file in self._distinct_table_files():
+            if table_file.get_file_sizes()[1] < max(min_log_bytes, 1):
+                continue
+
+            # 1: rows of the current generation
+            with self._file_lock.shared():
+                self._load_table_files([table_file])
+                generation = self._file_lock.read_generation()
+                bytes_before = sum(table_file.get_file_sizes())
+                version = table_file.pin()
+
+            # 2: no lock while writing
+            temp_path = table_file.write_checkpoint(version, budget)
+
+            # 3: compare and swap
+            with self._file_lock.exclusive():
+                if self._file_lock.read_generation() != generation:
+                    self._file_sync.discard(temp_path)
+                    report["skipped"] += 1
+                    continue
+                with self._file_lock.writing():
+                    table_file.install_checkpoint(temp_path)
+            bytes_after = sum(table_file.get_file_sizes())
+            report["compacted"] += 1
+            report["bytes_written"] += bytes_after
+            report["bytes_before"] += bytes_before
+            report["bytes_after"] += bytes_after
+        report["reclaimed_bytes"] = report["bytes_before"] - report["bytes_after"]
+        return report
+
+    def start_compaction(self):
+        # start the background Compactor, every DatabaseConfig.COMPACTION_INTERVAL_MS, unless that is 0
+        self._compactor.start()
+
+    def get_compaction_stats(self):
+        """
+        :return: dict of runs, compacted and skipped table files, failed runs, unexpected ones and the last error,
+                 bytes written and reclaimed, seconds throttled by the I/O budget, and the report of the last run,
+                 see Compactor.get_stats
+        """
+        return self._compactor.get_stats()
+
+    def reshard(self, shard_count):
+        """
+        offline resharding: move the students and enrollments of a sharded layout into shard_count new shard files,
+        switch the manifest to them and delete the old ones. admins and the email index stay as they are.
+        ** Note ** other processes must not use the database meanwhile, they would keep using the old shard files.
+
+        :param shard_count: new number of shards
+        """
+        if self._shards is None:
+            raise DataAccessException(f"resharding needs the sharded layout: {self._data_file_path}")
+        if shard_count < 1:
+            raise DataAccessException(f"invalid shard count: {shard_count}")
+        if shard_count == len(self._shards):
+            return
+
+        with self._file_lock.exclusive(), self._file_lock.writing():
+            # step 1: all rows of the old shards, including the changes in their logs
+            self._load_table_files(self._shards)
+            tables = {table: [row for shard in self._shards for row in shard.get_rows(table)]
+                      for table in self.SHARD_KEYS}
+
+            # step 2: write the new shards, then the manifest that switches to them
+            manifest = self._read_manifest()
+            manifest["shards"] = self._write_shards(tables, shard_count)
+            self._file_sync.write_atomic(self.get_manifest_path(), json.dumps(manifest, indent=4))
+
+            # step 3: the old shards are no longer listed
+            for shard in self._shards:
+                shard.delete()
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._open_table_files(manifest)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        unit of work over several DAO calls:
+            with database.transaction():
+                subject_dao.add_subject(subject)
+                subject_dao.update_subject(subject)
+        changes are applied in memory at once, so reads inside see them, and written when the block ends,
+        one data file rewrite or one log batch per table file. if the block raises, nothing is written
+        and the rows are read from the files again. a nested transaction joins the outer one.
+        locking concurrency: the block holds the exclusive file lock, other processes wait until it is written.
+        optimistic concurrency: only the commit holds the exclusive file lock, it raises WriteConflictException
+        if another process has written since the block started, see @run_transaction for retries.
+        ** Note ** in split layout each changed table file gets its own write, they are not atomic together.
+        """
+        optimistic = self._concurrency == DatabaseConfig.CONCURRENCY_OPTIMISTIC
+        with self._file_lock.local() if optimistic else self._file_lock.exclusive():
+            if self._pending is not None:
+                yield self
+                return
+
+            # 1. the generation all reads of the block start from
+            generation = self._file_lock.read_generation()
+            self._pending = {}
+            self._events = []
+            try:
+                yield self
+                pending = self._pending
+            except BaseException:
+                self._rollback()
+                raise
+
+            # 2. compare and swap, the changes are only written on top of the generation they were made on
+            try:
+                if pending:
+                    with self._file_lock.exclusive():
+                        if self._file_lock.read_generation() != generation:
+                            raise WriteConflictException(f"{self._data_file_path} was changed by another process")
+                        with self._file_lock.writing():
+                            for table_file, records in self._commit_order(pending):
+                                self._persist_records(table_file, records)
+            except BaseException:
+                self._rollback()
+                raise
+            self._pending = None
+            events, self._events = self._events, None
+
+        # 3. subscribers hear of the committed changes once the file lock is released
+        self._event_bus.publish(events)
+
+    def _commit_order(self, pending):
+        """
+        sharded layout: the global email index is written before the shards. a crash in between leaves an index entry
+        of a student that is missing or has another email, find_student_by_email checks the shard and finds nobody,
+        and @recover writes the index again from the shards.
+
+        :param pending: dict of TableFile -> records of the transaction, None for a rewrite
+        :return: list of (TableFile, records) in the order they are persisted
+        """
+        items = list(pending.items())
+        if self._shards is None:
+            return items
+        index_file = self._table_files["emails"]
+        return sorted(items, key=lambda item: item[0] is not index_file)
+
+    def run_transaction(self, operation, retries=None):
+        """
+        run operation in a transaction, after a WriteConflictException it is run again on the rows written by the
+        other process. inside an open transaction operation joins it, and the outermost transaction is retried.
+
+        :param operation:   function without parameters, e.g. a DAO method with its arguments
+        :param retries:     runs after the first one, DatabaseConfig.CAS_RETRIES by default
+        :return: result of operation
+        """
+        retries = retries if retries is not None else DatabaseConfig.CAS_RETRIES
+        with self._file_lock.local():
+            if self._pending is not None:
+                return operation()
+
+            for attempt in range(retries + 1):
+                try:
+                    with self.transaction():
+                        return operation()
+                except WriteConflictException:
+                    self._conflicts += 1
+                    if attempt == retries:
+                        raise
+                    # random backoff, so conflicting processes do not retry in lockstep
+                    time.sleep(random.uniform(0, self.CONFLICT_BACKOFF * 2 ** attempt))
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """
+        point-in-time reads over several calls:
+            with database.snapshot():
+                subjects = database.read_subjects()
+                students = database.read_students()
+        all reads of the thread inside the block see the tables as they were when it started, writes of other
+        threads and processes are neither seen nor blocked. the lock is only held while the versions are pinned,
+        a pinned version is released when the block ends and no rows of it are referenced any more.
+        a data file without log is pinned as a mapping of the file, so iter_students and iter_subjects inside stream
+        it in chunks like outside, the rows of a table file with log records are pinned in memory.
+        a nested snapshot joins the outer one.
+        """
+        if getattr(self._snapshot, "versions", None) is not None:
+            yield self
+            return
 
-            # step 3: assign temp objects to fields.
-            self._students = [Student.from_dict(student) for student in data.get('students', [])]
-            self._admins = [Admin.from_dict(admin) for admin in data.get('admins', [])]
-            self._subjects = [Subject.from_dict(subject) for subject in data.get('subjects', [])]
+        self._snapshot.versions = self._read(self._pin_versions)
+        try:
+            yield self
+        finally:
+            self._snapshot.versions = None
+
+    def subscribe(self, callback, kinds=None, queued=False):
+        """
+        call callback with each ChangeEvent of the students and enrollments committed by this engine.
+
+        :param callback:    function of one ChangeEvent
+        :param kinds:       ChangeEvent kinds, None for all
+        :param queued:      False: called by the committing thread after the commit, True: by a delivery thread
+        :return: callback, for @unsubscribe
+        """
+        return self._event_bus.subscribe(callback, kinds, queued)
+
+    def unsubscribe(self, callback):
+        self._event_bus.unsubscribe(callback)
+
+    def get_event_bus(self):
+        # getter for _event_bus
+        return self._event_bus
+
+    def get_lock_stats(self):
+        """
+        :return: dict with acquires, waits and timeouts of the file lock, see FileLock.get_stats,
+                 and write conflicts of optimistic transactions
+        """
+        return dict(self._file_lock.get_stats(), conflicts=self._conflicts)
+
+    def get_cache_stats(self):
+        """
+        :return: dict with cache hits and misses of @_load_data
+        """
+        with self._cache_lock:
+            return {"hits": self._cache_hits, "misses": self._cache_misses}
+
+    def _commit_records(self, records):
+        """
+        apply change records to memory and persist them, only the table files of the changed tables are touched.
+        overwrite mode rewrites the data file, wal mode appends only the records to the log.
+        records that change nothing, e.g. deleting a missing row, are not persisted.
+
+        :param records: list of change records, see @WriteAheadLog
+        """
+        # persisted when the open transaction ends, or by a transaction of their own
+        self.run_transaction(lambda: self._apply_records(records))
+
+    def _apply_records(self, records):
+        # load, apply and remember the records of each table file for the commit of the transaction
+        records_of_files = {}
+        for record in records + self._email_records(records):
+            for table_file in self._files_of_record(record):
+                records_of_files.setdefault(table_file, []).append(record)
+
+        for table_file, file_records in records_of_files.items():
+            # 1. load latest data
+            self._load_table_file(table_file)
+
+            # 2. process data
+            applied = table_file.apply(file_records)
+            if not applied:
+                continue
+
+            # 3. saving changes to file when the transaction ends
+            if self._pending.get(table_file, []) is not None:
+                self._pending.setdefault(table_file, []).extend(applied)
+
+            # 4. events of the changes, published when the transaction is committed
+            self._events.extend(ChangeEvent.from_record(record, self._changed_row(table_file, record))
+                                for record in applied)
+
+    def _persist_records(self, table_file, records):
+        # overwrite mode rewrites the data file, wal mode appends the records as one batch
+        # records is None after rows were replaced as a whole, which needs a rewrite in any mode
+        appended = self._storage_mode == DatabaseConfig.STORAGE_WAL and not self._log_is_full(table_file)
+        if records is not None and (appended or self._is_delta(table_file, records)):
+            table_file.append(records)
         else:
-            self._students = []
-            self._admins = []
-            self._subjects = []
+            table_file.overwrite()
 
+    def _log_is_full(self, table_file):
+        # wal mode without background compaction: the commit that finds the log at COMPACTION_MIN_LOG_BYTES
+        # checkpoints the data file, so the log does not grow without bound
+        if self._compactor.is_running():
+            return False
+        return table_file.get_file_sizes()[1] >= max(DatabaseConfig.COMPACTION_MIN_LOG_BYTES, 1)
 
-    def _overwrite_data(self):
-        # overwrite all data to student.data file
-        self._init_file()
+    @staticmethod
+    def _is_delta(table_file, records):
+        # overwrite mode: patches are appended to the log as a delta segment while it is below DELTA_MAX_BYTES,
+        # the log is replayed on load like in wal mode and dropped by the next rewrite or compaction
+        return (all(record["op"] == "patch" for record in records)
+                and table_file.get_file_sizes()[1] < DatabaseConfig.DELTA_MAX_BYTES)
+
+    @staticmethod
+    def _update_record(table, entity):
+        """
+        change record of an updated entity. an entity loaded and changed by its setters is a patch of the changed
+        columns, so the commit only writes those, see @_is_delta. an entity created by the caller replaces the
+        whole row, its constructor values are not tracked as changes, as does one without tracked changes or with a
+        changed key column.
 
-        # step 1: format objects to json string
-        data = {
-            "students": [student.to_dict() for student in self._students],
-            "admins": [admin.to_dict() for admin in self._admins],
-            "subjects": [subject.to_dict() for subject in self._subjects]
-        }
-        json_str = json.dumps(data, indent=4)
+        :param table:   table name
+        :param entity:  Student or Subject
+        :return: update or patch record, see WriteAheadLog
+        """
+        row = entity.to_dict()
+        columns = entity.get_dirty_fields()
+        if not entity.is_loaded() or not columns or not TableFile.patchable(table, columns):
+            return {"op": "update", "table": table, "row": row}
+        return {"op": "patch", "table": table, "where": {column: row[column] for column in TableFile.TABLE_KEYS[table]},
+                "set": {column: row[column] for column in sorted(columns)}}
+
+    @staticmethod
+    def _changed_row(table_file, record):
+        # dict of all columns of the row after an insert, update or patch, a patch only holds the changed columns
+        if record["op"] != "patch":
+            return record.get("row")
+        table = record["table"]
+        key_columns = TableFile.TABLE_KEYS[table]
+        key = tuple(record["where"][column] for column in key_columns)
+        rows = table_file.find_indexed(table, key_columns, key[0] if len(key) == 1 else key)
+        return dict(zip(TableFile.TABLE_COLUMNS[table], rows[0])) if rows else None
+
+    def _rollback(self):
+        # drop the changes and events of the transaction from memory, the next load reads the files again
+        pending, self._pending = self._pending, None
+        self._events = None
+        for table_file in pending:
+            table_file.invalidate()
+
+    def _pin_versions(self):
+        """
+        all table files at one version, in split and sharded layout no write of another process lies between them.
+        a data file without log is pinned as a file, its rows are not loaded, see TableFile.pin_file.
+
+        :return: dict of TableFile -> PinnedFile or TableVersion
+        """
+        pinned = {}
+        for table_file in self._distinct_table_files():
+            pinned_file = table_file.pin_file()
+            if pinned_file is not None:
+                pinned[table_file] = pinned_file
+                continue
+            self._load_table_files([table_file])
+            pinned[table_file] = table_file.pin()
+        return pinned
+
+    def _email_records(self, records):
+        # sharded layout: changes of the global email index that follow from changes of students
+        if self._shards is None:
+            return []
+        email_records = []
+        for record in records:
+            # a patch never changes the email, see TableFile.patchable
+            if record["table"] != "students" or record["op"] == "patch":
+                continue
+            if record["op"] == "delete":
+                email_records.append({"op": "delete", "table": "emails", "where": {"student_id": record["where"]["id"]}})
+                continue
+            row = record["row"]
+            email_records.append({"op": "delete", "table": "emails", "where": {"student_id": row["id"]}})
+            email_records.append({"op": "insert", "table": "emails",
+                                  "row": {"email": self.email_key(row["email"]), "student_id": row["id"]}})
+        return email_records
+
+    def _distinct_table_files(self):
+        # each TableFile once, in table order, then the shards
+        return list(dict.fromkeys(self._table_files.values())) + (self._shards or [])
+
+    def _files_of(self, table, student_id=None):
+        """
+        :param table:       table name
+        :param student_id:  student of the rows, None for all rows
+        :return: list of the TableFiles holding the rows, in sharded layout the shard of the student or all shards
+        """
+        if self._shards is None or table not in self.SHARD_KEYS:
+            return [self._table_files[table]]
+        if student_id is None:
+            return self._shards
+        return [self._shards[self.shard_of(student_id, len(self._shards))]]
+
+    def _files_of_record(self, record):
+        # TableFiles a change record applies to, a where without student id applies to all shards
+        shard_key = self.SHARD_KEYS.get(record["table"])
+        values = record["row"] if "row" in record else record["where"]
+        return self._files_of(record["table"], values.get(shard_key) if shard_key is not None else None)
 
-        # step 2: overwrite all data to file
-        with open(self._data_file_path, 'w') as file:
-            file.write(json_str)
+    def _fan_out(self, function, table_files):
+        # function applied to each table file, several shards in parallel, the results in the same order
+        if self._executor is None or len(table_files) < 2:
+            return [function(table_file) for table_file in table_files]
+        return list(self._executor.map(function, table_files))
+
+    def _load_table_files(self, table_files):
+        # load table files, the caller holds the lock, see @_read
+        loaded = self._fan_out(TableFile.load, table_files)
+        self._count_loads(hits=loaded.count(False), misses=len(loaded) - loaded.count(False))
+
+    def _count_loads(self, hits, misses=0):
+        with self._cache_lock:
+            self._cache_hits += hits
+            self._cache_misses += misses
+
+    def _load_table_file(self, table_file):
+        self._read(lambda: self._load_table_files([table_file]))
+
+    def _find_rows(self, table, columns, key, student_id=None):
+        """
+        rows with a key, from the sidecar index file while the table file is not loaded, e.g. right after start,
+        otherwise from the indexes in memory.
+
+        :param table:       table name
+        :param columns:     indexed column names
+        :param key:         value of a single column, or tuple of values
+        :param student_id:  student of the rows, in sharded layout only its shard is read, all shards if None
+        :return: list of row tuples
+        """
+        table_files = self._files_of(table, student_id)
+        versions = self._snapshots_of(table_files)
+        if versions is not None:
+            return [row for version in versions for row in version.find_indexed(table, columns, key)]
+
+        def find():
+            found = [table_file.find_persisted(table, columns, key) for table_file in table_files]
+            self._load_table_files([table_file for table_file, rows in zip(table_files, found) if rows is None])
+            return [row for table_file, rows in zip(table_files, found)
+                    for row in (rows if rows is not None else table_file.find_indexed(table, columns, key))]
+        return self._read(find)
+
+    def _read(self, read):
+        """
+        read the files, never half way through a write of another process.
+        locking concurrency reads under the shared lock. optimistic concurrency reads without file lock and compares
+        the generation before and after, only if a write was in progress or completed meanwhile it reads again
+        under the shared lock.
+
+        :param read:    function reading data file, log or index file
+        :return: result of read
+        """
+        if self._concurrency == DatabaseConfig.CONCURRENCY_OPTIMISTIC:
+            with self._file_lock.local():
+                generation = self._file_lock.read_generation()
+                if generation % 2 == 0:
+                    result = read()
+                    if self._file_lock.read_generation() == generation:
+                        return result
+                # what was read may be torn, even the rows in memory
+                for table_file in self._distinct_table_files():
+                    table_file.invalidate()
+
+        with self._file_lock.shared():
+            return read()
+
+    def _load_data(self, table):
+        """
+        load the files of one table, in split and sharded layout the other tables are not parsed.
+
+        :param table:   table name
+        :return: rows of the table, of all shards in shard order
+        """
+        table_files = self._files_of(table)
+        versions = self._snapshots_of(table_files)
+        if versions is not None:
+            self._count_loads(hits=len(versions))
+        else:
+            versions = self._read(lambda: self._load_table_files(table_files) or table_files)
+        if len(versions) == 1:
+            return versions[0].get_rows(table)
+        return [row for version in versions for row in version.get_rows(table)]
+
+    def _snapshot_of(self, table_file):
+        """
+        the version of a table file pinned by the snapshot block of the current thread, or in snapshot threading mode
+        the published version. neither is ever changed, so they are queried without lock.
+        the thread of an open transaction reads its own changes under the lock instead.
+
+        :param table_file:  TableFile
+        :return: TableVersion, None if the table file is read under the lock
+        """
+        versions = getattr(self._snapshot, "versions", None)
+        if versions is not None:
+            return versions[table_file]
+        if self._threading_mode != DatabaseConfig.THREADING_SNAPSHOT or self._file_lock.is_owned():
+            return None
+        return table_file.get_snapshot()
+
+    def _snapshots_of(self, table_files):
+        # versions of all table files, see @_snapshot_of, None if any of them is read under the lock
+        versions = [self._snapshot_of(table_file) for table_file in table_files]
+        return None if any(version is None for version in versions) else versions
+
+    def _iter_rows(self, table, chunk_size=None):
+        """
+        stream the rows of one table in chunks, the parsed rows are not cached.
+
+        :param table:       table name
+        :param chunk_size:  rows per chunk, DatabaseConfig.STREAM_CHUNK_ROWS by default
+        :return: generator of lists of row tuples
+        """
+        chunk_size = chunk_size if chunk_size is not None else DatabaseConfig.STREAM_CHUNK_ROWS
+        if chunk_size < 1:
+            raise DataAccessException(f"invalid chunk size: {chunk_size}")
+        table_files = self._files_of(table)
+        # a pinned or published version is never changed, otherwise the rows are chosen under the lock, so an open
+        # transaction of another thread is either committed or rolled back, see TableFile.iter_rows
+        versions = self._snapshots_of(table_files)
+        # the mapped rows of a published version would be decoded whole, its data file is streamed instead
+        if versions is not None and getattr(self._snapshot, "versions", None) is None and \
+                any(version.is_mapped(table) for version in versions):
+            versions = None
+        if versions is not None:
+            chunks = [version.iter_rows(table, chunk_size) for version in versions]
+        else:
+            chunks = self._read(lambda: [table_file.iter_rows(table, chunk_size) for table_file in table_files])
+        return itertools.chain.from_iterable(chunks)
+
+    def _overwrite_data(self, table, rows):
+        """
+        replace all rows of one table and write its data file.
+
+        :param table:   table name
+        :param rows:    new rows of the table
+        """
+        self.run_transaction(lambda: self._replace_rows(table, rows))
+
+    def _replace_rows(self, table, rows):
+        # the rows of each table file, in sharded layout each shard gets the rows of its students
+        changes = self._rows_of_files(table, rows)
+        if self._shards is not None and table == "students":
+            changes.append((self._table_files["emails"], "emails", self._email_rows(rows)))
+
+        for table_file, table_name, file_rows in changes:
+            # 1. load latest data, in single layout the other tables are written back as well
+            self._load_table_file(table_file)
+
+            # 2. process data
+            table_file.set_rows(table_name, file_rows)
+
+            # 3 the data file is overwritten when the transaction ends
+            self._pending[table_file] = None
+        self._events.append(ChangeEvent.replaced(table))
+
+    def _rows_of_files(self, table, rows):
+        # list of (TableFile, table, rows of the table in that file)
+        table_files = self._files_of(table)
+        if len(table_files) == 1:
+            return [(table_files[0], table, rows)]
+        position = TableFile.column_index(table, self.SHARD_KEYS[table])
+        rows_of_files = {table_file: [] for table_file in table_files}
+        for row in rows:
+            rows_of_files[table_files[self.shard_of(row[position], len(table_files))]].append(row)
+        return [(table_file, table, file_rows) for table_file, file_rows in rows_of_files.items()]
+
+    def _email_rows(self, student_rows):
+        # rows of the global email index of the sharded layout
+        id_position = TableFile.column_index("students", "id")
+        email_position = TableFile.column_index("students", "email")
+        return [(self.email_key(row[email_position]), row[id_position]) for row in student_rows]
+
+    def _new_table_file(self, file_path, table_names):
+        return TableFile(file_path, table_names, self._file_sync, self._file_format, self._read_mode,
+                         self._email_case, self._index_files, self._threading_mode)
+
+    def _read_manifest(self):
+        # manifest of the split or sharded layout, None in single layout
+        if not os.path.exists(self.get_manifest_path()):
+            return None
+        with open(self.get_manifest_path(), 'r') as file:
+            manifest = json.load(file)
+        if manifest.get("version") != self.MANIFEST_VERSION:
+            raise DataAccessException(f"unsupported manifest version: {manifest.get('version')}")
+        return manifest
+
+    def _open_table_files(self, manifest):
+        """
+        single layout: one TableFile for all tables, split layout: one TableFile per table from the manifest,
+        sharded layout: the TableFiles of admins and email index, and the shards from the manifest.
+        sets _layout, _table_files, _shards and _executor.
+        """
+        self._shards = None
+        self._executor = None
+        if manifest is None:
+            self._layout = DatabaseConfig.LAYOUT_SINGLE
+            table_file = self._new_table_file(self._data_file_path, self.TABLE_NAMES)
+            self._table_files = {table: table_file for table in self.TABLE_NAMES}
+            return
+
+        manifest_dir = os.path.dirname(self.get_manifest_path())
+        self._table_files = {table: self._new_table_file(os.path.join(manifest_dir, file_name), (table,))
+                             for table, file_name in manifest["tables"].items()}
+        if "shards" not in manifest:
+            self._layout = DatabaseConfig.LAYOUT_SPLIT
+            return
+
+        self._layout = DatabaseConfig.LAYOUT_SHARDED
+        self._shards = [self._new_table_file(os.path.join(manifest_dir, file_name), tuple(self.SHARD_KEYS))
+                        for file_name in manifest["shards"]]
+        if len(self._shards) > 1:
+            self._executor = ThreadPoolExecutor(len(self._shards), thread_name_prefix="shard")
+
+    def _migrate_to_split_layout(self):
+        """
+        move the tables of the single data file into one file per table and write the manifest.
+        the manifest is written last, a crash before it leaves the single data file in use.
+        the single data file is kept as ".bak" backup.
+        """
+        # step 1: read all tables, including the changes that are still in the log
+        single_file = self._new_table_file(self._data_file_path, self.TABLE_NAMES)
+        if os.path.exists(self._data_file_path):
+            single_file.load()
+
+        # step 2: write each table to its own file
+        base_name = os.path.basename(self._data_file_path)
+        table_file_names = {table: f"{base_name}.{table}" for table in self.TABLE_NAMES}
+        for table, file_name in table_file_names.items():
+            table_file = self._new_table_file(os.path.join(os.path.dirname(self._data_file_path), file_name),
+                                              (table,))
+            table_file.set_rows(table, single_file.get_rows(table))
+            table_file.overwrite()
+
+        # step 3: write the manifest atomically
+        manifest = {"version": self.MANIFEST_VERSION, "tables": table_file_names}
+        self._file_sync.write_atomic(self.get_manifest_path(), json.dumps(manifest, indent=4))
+
+        # step 4: keep the single data file as backup, its log is already included in the table files
+        if os.path.exists(self._data_file_path):
+            os.replace(self._data_file_path, self._data_file_path + ".bak")
+        single_file.delete()
+
+    def _migrate_to_sharded_layout(self, shard_count):
+        """
+        move the tables of the single data file into shard_count shards, the admins file and the email index,
+        and write the manifest. like @_migrate_to_split_layout the manifest is written last and a ".bak" is kept.
+        """
+        # step 1: read all tables, including the changes that are still in the log
+        single_file = self._new_table_file(self._data_file_path, self.TABLE_NAMES)
+        if os.path.exists(self._data_file_path):
+            single_file.load()
+        tables = {table: single_file.get_rows(table) for table in self.TABLE_NAMES}
+
+        # step 2: write the shards, the admins and the email index
+        base_name = os.path.basename(self._data_file_path)
+        table_file_names = {"admins": f"{base_name}.admins", "emails": f"{base_name}.emails"}
+        for table, rows in (("admins", tables["admins"]), ("emails", self._email_rows(tables["students"]))):
+            table_file = self._new_table_file(os.path.join(os.path.dirname(self._data_file_path),
+                                                           table_file_names[table]), (table,))
+            table_file.set_rows(table, rows)
+            table_file.overwrite()
+        shard_file_names = self._write_shards(tables, shard_count)
+
+        # step 3: write the manifest atomically
+        manifest = {"version": self.MANIFEST_VERSION, "tables": table_file_names, "shards": shard_file_names}
+        self._file_sync.write_atomic(self.get_manifest_path(), json.dumps(manifest, indent=4))
+
+        # step 4: keep the single data file as backup, its log is already included in the shards
+        if os.path.exists(self._data_file_path):
+            os.replace(self._data_file_path, self._data_file_path + ".bak")
+        single_file.delete()
+
+    def _write_shards(self, tables, shard_count):
+        """
+        write students and subjects to shard_count new shard files, named after the count,
+        so they never replace the files of another count that the manifest may still list.
+
+        :param tables:      dict of table -> all rows, for the tables of SHARD_KEYS
+        :param shard_count: number of shards
+        :return: list of shard file names
+        """
+        base_name = os.path.basename(self._data_file_path)
+        shard_file_names = [f"{base_name}.shard{shard}of{shard_count}" for shard in range(shard_count)]
+        shards = [self._new_table_file(os.path.join(os.path.dirname(self._data_file_path), file_name),
+                                       tuple(self.SHARD_KEYS)) for file_name in shard_file_names]
+        for table in self.SHARD_KEYS:
+            position = TableFile.column_index(table, self.SHARD_KEYS[table])
+            rows_of_shards = [[] for _ in shards]
+            for row in tables[table]:
+                rows_of_shards[self.shard_of(row[position], shard_count)].append(row)
+            for shard, rows in zip(shards, rows_of_shards):
+                shard.set_rows(table, rows)
+        for shard in shards:
+            shard.overwrite()
+        return shard_file_names
 
     def delete_data_file(self):
-        os.remove(self._data_file_path)
+        # the shared engine may already have deleted them, a missing file is already empty.
+        # deleted under the exclusive lock inside writing, so no reader sees only some of the files gone
+        with self._file_lock.exclusive(), self._file_lock.writing():
+            for table_file in self._distinct_table_files():
+                table_file.delete()
+        self._event_bus.publish([ChangeEvent.replaced("students"), ChangeEvent.replaced("subjects")])
@@ -0,0 +1,219 @@
+import contextlib
+import os
+import struct
+import threading
+import time
+
+from dao.database.config import DatabaseConfig
+from util.exception import LockTimeoutException
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, only the threads of one process are coordinated there
+    fcntl = None
+
+
+class FileLock:
+    """
+    reader/writer lock of one database shared by all processes on a host, an flock on "<data file>.lock".
+    the data file cannot carry the lock itself, because every write replaces it with a new file.
+    reads hold the shared lock, read-modify-write cycles the exclusive lock, so one process never writes
+    rows that it loaded before another process changed them.
+    flock is held per open file, so the threads of a process are serialized by a re-entrant mutex first.
+    nested acquires of the owning thread only count the depth, a nested exclusive acquire upgrades a shared lock.
+
+    the lock file also carries the generation of the database, a u64 that grows by 2 with every write:
+    odd while a write is in progress, even when it is complete. readers without the lock compare it before and
+    after reading, writers compare it with the one their transaction started from.
+
+    Fields:
+        _lock_file_path     lock file, created on first acquire and never removed
+        _timeout            seconds to wait for the lock, see DatabaseConfig.LOCK_TIMEOUT_MS
+        _mutex              re-entrant mutex of the threads of this process
+        _fd                 open lock file descriptor
+        _depth              nested acquires of the thread holding the lock
+        _owner              thread ident holding the mutex in acquire or local, None if it is free
+        _holds              nested acquires and local blocks of the owner
+        _exclusive          True while the flock held is exclusive
+        _stats              acquire counters and wait times, see get_stats
+    Methods:
+        shared:     context manager holding the shared lock
+        exclusive:  context manager holding the exclusive lock
+        local:      context manager holding only the mutex of the threads of this process
+        is_owned:   True if the current thread holds the lock or is inside local
+        read_generation:
+                    current generation, no lock needed
+        writing:    context manager around a write, advances the generation, the exclusive lock must be held
+        get_stats:  lock-wait metrics
+        close:      close the lock file
+    """
+
+    # seconds between two attempts to get a contended flock
+    POLL_INTERVAL = 0.002
+
+    # generation at the start of the lock file
+    GENERATION = struct.Struct("<Q")
+
+    def __init__(self, lock_file_path, timeout_ms=None):
+        self._lock_file_path = lock_file_path
+        timeout_ms = timeout_ms if timeout_ms is not None else DatabaseConfig.LOCK_TIMEOUT_MS
+        self._timeout = timeout_ms / 1000
+        self._mutex = threading.RLock()
+        self._fd = None
+        self._depth = 0
+        self._owner = None
+        self._holds = 0
+        self._exclusive = False
+        self._stats = {"shared": 0, "exclusive": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                       "timeouts": 0}
+
+    def get_lock_file_path(self):
+        # getter for _lock_file_path
+        return self._lock_file_path
+
+    @contextlib.contextmanager
+    def shared(self):
+        self.acquire(False)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        self.acquire(True)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @contextlib.contextmanager
+    def local(self):
+        with self._mutex:
+            self._hold()
+            try:
+                yield self
+            finally:
+                self._unhold()
+
+    def is_owned(self):
+        # an ident is only set by its own thread, so another thread never reads the current one
+        return self._owner == threading.get_ident()
+
+    def read_generation(self):
+        with self._mutex:
+            fd = self._open()
+            os.lseek(fd, 0, os.SEEK_SET)
+            content = os.read(fd, self.GENERATION.size)
+        return self.GENERATION.unpack(content)[0] if len(content) == self.GENERATION.size else 0
+
+    @contextlib.contextmanager
+    def writing(self):
+        # a writer that crashed left the generation odd, the next write completes it
+        generation = self.read_generation()
+        generation += 1 - generation % 2
+        self._write_generation(generation)
+        yield generation
+        self._write_generation(generation + 1)
+
+    def get_stats(self):
+        """
+        :return: dict of shared and exclusive acquires, acquires that had to wait, total and longest wait in seconds,
+                 and acquires that timed out
+        """
+        return dict(self._stats)
+
+    def close(self):
+        with self._mutex:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def acquire(self, exclusive):
+        """
+        :param exclusive:   True for the exclusive lock, False for the shared lock
+        :raise LockTimeoutException: if the lock is not free within the timeout, nothing is held then
+        """
+        start = time.monotonic()
+        deadline = start + self._timeout
+
+        # step 1: other threads of this process
+        waited = not self._mutex.acquire(blocking=False)
+        if waited and not self._mutex.acquire(timeout=self._timeout):
+            self._record_timeout()
+
+        # step 2: other processes, only the outermost acquire or an upgrade takes the flock
+        try:
+            if self._depth == 0 or (exclusive and not self._exclusive):
+                waited = self._flock(exclusive, deadline) or waited
+                self._exclusive = exclusive or self._exclusive
+        except BaseException:
+            if self._depth == 0:
+                self._exclusive = False
+            self._mutex.release()
+            raise
+        self._depth += 1
+        self._hold()
+
+        # step 3: metrics
+        wait = time.monotonic() - start if waited else 0.0
+        self._stats["exclusive" if exclusive else "shared"] += 1
+        if waited:
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+
+    def release(self):
+        self._unhold()
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._exclusive = False
+        self._mutex.release()
+
+    def _flock(self, exclusive, deadline):
+        # take the flock, polling until the deadline, return True if it was contended
+        if fcntl is None:
+            return False
+
+        operation = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        waited = False
+        while True:
+            try:
+                fcntl.flock(self._open(), operation)
+                return waited
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self._record_timeout()
+                waited = True
+                time.sleep(self.POLL_INTERVAL)
+
+    def _hold(self):
+        # the mutex is held by the current thread
+        self._owner = threading.get_ident()
+        self._holds += 1
+
+    def _unhold(self):
+        self._holds -= 1
+        if self._holds == 0:
+            self._owner = None
+
+    def _write_generation(self, generation):
+        with self._mutex:
+            fd = self._open()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, self.GENERATION.pack(generation))
+
+    def _open(self):
+        # the lock file descriptor, the file is created on first use
+        with self._mutex:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self._lock_file_path)), exist_ok=True)
+                self._fd = os.open(self._lock_file_path, os.O_RDWR | os.O_CREAT, 0o644)
+            return self._fd
+
+    def _record_timeout(self):
+        self._stats["timeouts"] += 1
+        raise LockTimeoutException(f"database is locked, gave up after {self._timeout:g}s: {self._lock_file_path}")
+
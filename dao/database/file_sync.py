@@ -0,0 +1,197 @@
+import atexit
+import os
+import threading
+import time
+
+from dao.database.config import DatabaseConfig
+from util.exception import DataAccessException
+
+
+class FileSync:
+    """
+    writes data files and logs according to an fsync policy.
+    data files are never written in place: the content goes to a temp file that is renamed over the old file,
+    so a crash leaves either the old or the new version, never a truncated one.
+
+    Fields:
+        _policy         DatabaseConfig.FSYNC_ALWAYS, FSYNC_INTERVAL or FSYNC_NEVER
+        _interval       seconds between two group commits of the interval policy
+        _pending        files and directories written since the last group commit
+        _flusher        background thread of the interval policy, started on first write
+        _sync_count     number of fsync calls, for benchmarks and tests
+    Methods:
+        write_atomic:   replace a file with new content
+        write_temp, install:
+                        the two halves of write_atomic, so the content can be written without holding a lock
+                        and only the rename holds it
+        discard:        remove a temp file that is not installed
+        append:         append content to a file
+        truncate:       cut a file off at a size, used by logs
+        flush:          fsync all pending files now
+    """
+
+    def __init__(self, policy=None, interval_ms=None):
+        self._policy = policy if policy is not None else DatabaseConfig.FSYNC_POLICY
+        if self._policy not in (DatabaseConfig.FSYNC_ALWAYS, DatabaseConfig.FSYNC_INTERVAL,
+                                DatabaseConfig.FSYNC_NEVER):
+            raise DataAccessException(f"unknown fsync policy: {self._policy}")
+        interval_ms = interval_ms if interval_ms is not None else DatabaseConfig.FSYNC_INTERVAL_MS
+        self._interval = interval_ms / 1000
+
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._sync_count = 0
+
+    def get_policy(self):
+        # getter for _policy
+        return self._policy
+
+    def get_sync_count(self):
+        # getter for _sync_count
+        return self._sync_count
+
+    # bytes written at once by write_temp with an IoBudget
+    BLOCK_SIZE = 1 << 16
+
+    def write_atomic(self, path, content):
+        """
+        write content to a temp file in the same directory and rename it over path.
+
+        :param path:    file to replace
+        :param content: str or bytes
+        """
+        self.install(self.write_temp(path, content), path)
+
+    def write_temp(self, path, content, budget=None):
+        """
+        write content to a temp file next to path, see @install.
+
+        :param path:    file the content is for
+        :param content: str or bytes
+        :param budget:  IoBudget the writes are throttled by, None for no throttling
+        :return: temp file path
+        """
+        # unique per process and thread, so concurrent writers never share a temp file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb' if isinstance(content, bytes) else 'w') as file:
+                if budget is None:
+                    file.write(content)
+                else:
+                    for start in range(0, len(content), self.BLOCK_SIZE):
+                        block = content[start:start + self.BLOCK_SIZE]
+                        budget.consume(len(block))
+                        file.write(block)
+                file.flush()
+                # the content must be on disk before the rename makes it visible, also for group commit: a rename
+                # that reaches the disk before the content would leave an empty or partial file after a crash
+                if self._policy != DatabaseConfig.FSYNC_NEVER:
+                    self._fsync(file.fileno())
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        return temp_path
+
+    def install(self, temp_path, path):
+        # rename a file of @write_temp over path, the temp file is removed if that fails
+        directory = os.path.dirname(path) or "."
+        try:
+            os.replace(temp_path, path)
+        except BaseException:
+            self.discard(temp_path)
+            raise
+
+        # the rename itself is stored in the directory, the content was synced by @write_temp
+        if self._policy == DatabaseConfig.FSYNC_ALWAYS:
+            self._fsync_directory(directory)
+        elif self._policy == DatabaseConfig.FSYNC_INTERVAL:
+            self._add_pending(directory)
+
+    def append(self, path, content):
+        """
+        append content to the end of a file, used by logs.
+
+        :param path:    file to append to, created if missing
+        :param content: str or bytes
+        """
+        is_new = not os.path.exists(path)
+        with open(path, 'ab' if isinstance(content, bytes) else 'a') as file:
+            file.write(content)
+            file.flush()
+            if self._policy == DatabaseConfig.FSYNC_ALWAYS:
+                self._fsync(file.fileno())
+
+        directory = os.path.dirname(path) or "."
+        if self._policy == DatabaseConfig.FSYNC_ALWAYS:
+            if is_new:
+                self._fsync_directory(directory)
+        elif self._policy == DatabaseConfig.FSYNC_INTERVAL:
+            self._add_pending(path, directory)
+
+    def truncate(self, path, size):
+        # cut a file off after size bytes, e.g. the invalid tail of a log, durable like an append
+        with open(path, 'r+b') as file:
+            file.truncate(size)
+            file.flush()
+            if self._policy == DatabaseConfig.FSYNC_ALWAYS:
+                self._fsync(file.fileno())
+        if self._policy == DatabaseConfig.FSYNC_INTERVAL:
+            self._add_pending(path)
+
+    @staticmethod
+    def discard(temp_path):
+        # remove a temp file of @write_temp that is not installed
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    def flush(self):
+        # group commit: one fsync per file written since the last flush
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for path in pending:
+            if os.path.isdir(path):
+                self._fsync_directory(path)
+                continue
+            # opened without O_CREAT, a file deleted since it was written is not created again
+            try:
+                fd = os.open(path, os.O_WRONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                self._fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _add_pending(self, *paths):
+        with self._lock:
+            self._pending.update(paths)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="file-sync", daemon=True)
+                self._flusher.start()
+                # pending files of the last interval are synced on normal exit
+                atexit.register(self.flush)
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self._interval)
+            self.flush()
+
+    def _fsync(self, fd):
+        os.fsync(fd)
+        # the flusher thread and writers count concurrently
+        with self._lock:
+            self._sync_count += 1
+
+    def _fsync_directory(self, directory):
+        # not supported on Windows, where a rename is durable once the file handles are closed
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            self._fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
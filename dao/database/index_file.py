@@ -0,0 +1,189 @@
+import bisect
+import itertools
+import operator
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+
+class IndexFile:
+    """
+    persisted lookup indexes of a JSON data file, "<data file>.idx" next to it.
+    a cold process answers keyed lookups by reading only the matching rows, instead of parsing the whole data file.
+
+    Layout, little endian:
+        header      MAGIC, VERSION u16, generation of the data file (mtime_ns i64, size i64, inode u64),
+                    crc32 u32 of generation and body, index count u16
+        directory   per index: name (u16 length + UTF-8), entry count u32, offset u64 of its entries in the file
+        entries     per index, sorted by key hash: hashes u64[n], row offsets u64[n], row lengths u32[n]
+    the generation ties the file to one version of the data file, any other version is a mismatch.
+
+    Fields:
+        _index_file_path    sidecar index file
+        _file_sync          FileSync that writes the index file
+        _content            content of the index file, read on first lookup after it changed
+        _fingerprint        stat fingerprint of the index file _content was read from
+        _generation         data file generation stored in _content
+        _directory          index name -> (entry count, entries offset)
+        _hashes             index name -> sorted hash array, built on first lookup of the index
+    Methods:
+        find:       locations (offset, length) of the rows with a key, None if the file does not match
+        write:      replace the index file
+        delete:     remove the index file
+        key_hashes: stable 64-bit hashes of keys
+    """
+
+    MAGIC = b"UNIAPPIX"
+    VERSION = 1
+    HEADER = struct.Struct("<8sHqqQIH")
+    GENERATION = struct.Struct("<qqQ")
+    DIRECTORY_ENTRY = struct.Struct("<IQ")
+
+    def __init__(self, index_file_path, file_sync):
+        self._index_file_path = index_file_path
+        self._file_sync = file_sync
+        self._content = None
+        self._fingerprint = None
+        self._generation = None
+        self._directory = {}
+        self._hashes = {}
+
+    def get_index_file_path(self):
+        # getter for _index_file_path
+        return self._index_file_path
+
+    def find(self, generation, name, key):
+        """
+        :param generation:  (mtime_ns, size, inode) of the current data file
+        :param name:        index name, see TableFile
+        :param key:         normalized key
+        :return: list of (offset, length) of candidate rows, callers check the key of each row,
+                 None if the file is missing, corrupt, of another generation or without this index
+        """
+        if not self._open() or self._generation != tuple(generation) or name not in self._directory:
+            return None
+
+        hashes = self._hashes.get(name)
+        count, offset = self._directory[name]
+        if hashes is None:
+            hashes = self._array("Q", offset, count)
+            self._hashes[name] = hashes
+
+        key_hash = self.key_hash(key)
+        low = bisect.bisect_left(hashes, key_hash)
+        locations = []
+        while low < count and hashes[low] == key_hash:
+            row_offset, = struct.unpack_from("<Q", self._content, offset + 8 * count + 8 * low)
+            row_length, = struct.unpack_from("<I", self._content, offset + 16 * count + 4 * low)
+            locations.append((row_offset, row_length))
+            low += 1
+        return locations
+
+    def write(self, generation, indexes):
+        """
+        :param generation:  (mtime_ns, size, inode) of the data file the locations belong to
+        :param indexes:     dict of index name -> (keys, row offsets, row lengths), one entry per row
+        """
+        names = list(indexes)
+        directory_size = sum(2 + len(name.encode("utf-8")) + self.DIRECTORY_ENTRY.size for name in names)
+        offset = self.HEADER.size + directory_size
+
+        directory, blocks = [], []
+        for name in names:
+            keys, row_offsets, row_lengths = indexes[name]
+            hashes = self.key_hashes(keys)
+            # stable, so rows with equal hashes stay in table order
+            order = sorted(range(len(hashes)), key=hashes.__getitem__)
+            columns = (array("Q", map(hashes.__getitem__, order)), array("Q", map(row_offsets.__getitem__, order)),
+                       array("I", map(row_lengths.__getitem__, order)))
+            if sys.byteorder == "big":
+                for column in columns:
+                    column.byteswap()
+            encoded = name.encode("utf-8")
+            directory.append(struct.pack("<H", len(encoded)) + encoded
+                             + self.DIRECTORY_ENTRY.pack(len(hashes), offset))
+            block = b"".join(column.tobytes() for column in columns)
+            blocks.append(block)
+            offset += len(block)
+
+        body = b"".join(directory) + b"".join(blocks)
+        checksum = zlib.crc32(body, zlib.crc32(self.GENERATION.pack(*generation)))
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, *generation, checksum, len(names))
+        self._file_sync.write_atomic(self._index_file_path, header + body)
+
+    def delete(self):
+        if os.path.exists(self._index_file_path):
+            os.remove(self._index_file_path)
+        self._content = None
+        self._fingerprint = None
+
+    @classmethod
+    def key_hash(cls, key):
+        return cls.key_hashes([key])[0]
+
+    @staticmethod
+    def key_hashes(keys):
+        """
+        64-bit hashes of keys, crc32 and adler32 of the UTF-8 key side by side, computed in C for all keys.
+        keys are str or tuples of str, other values are hashed by their str form.
+
+        :param keys:    list of keys
+        :return: list of int
+        """
+        try:
+            texts = list(map("\x1f".join, keys)) if keys and isinstance(keys[0], tuple) else keys
+            encoded = list(map(str.encode, texts))
+        except TypeError:
+            encoded = [("\x1f".join(map(str, key)) if isinstance(key, tuple) else str(key)).encode("utf-8")
+                       for key in keys]
+        return list(map(operator.or_, map(operator.lshift, map(zlib.crc32, encoded), itertools.repeat(32)),
+                        map(zlib.adler32, encoded)))
+
+    def _open(self):
+        # read the index file again if it was replaced, and check magic, version and checksum
+        try:
+            stat = os.stat(self._index_file_path)
+        except FileNotFoundError:
+            self._content = None
+            return False
+        fingerprint = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if fingerprint == self._fingerprint:
+            return self._content is not None
+
+        self._fingerprint = fingerprint
+        self._content = None
+        self._hashes = {}
+        with open(self._index_file_path, 'rb') as file:
+            content = file.read()
+        if len(content) < self.HEADER.size:
+            return False
+        magic, version, mtime_ns, size, inode, checksum, count = self.HEADER.unpack_from(content)
+        generation = (mtime_ns, size, inode)
+        if magic != self.MAGIC or version != self.VERSION:
+            return False
+        body = memoryview(content)[self.HEADER.size:]
+        if zlib.crc32(body, zlib.crc32(self.GENERATION.pack(*generation))) != checksum:
+            return False
+
+        directory = {}
+        position = self.HEADER.size
+        for _ in range(count):
+            length, = struct.unpack_from("<H", content, position)
+            name = content[position + 2:position + 2 + length].decode("utf-8")
+            position += 2 + length
+            directory[name] = self.DIRECTORY_ENTRY.unpack_from(content, position)
+            position += self.DIRECTORY_ENTRY.size
+
+        self._content = content
+        self._generation = generation
+        self._directory = directory
+        return True
+
+    def _array(self, typecode, offset, count):
+        values = array(typecode)
+        values.frombytes(self._content[offset:offset + values.itemsize * count])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
@@ -0,0 +1,150 @@
+import json
+import zlib
+
+from util.exception import CorruptDataException
+
+
+class JsonFormat:
+    """
+    JSON encoding of the tables of a data file, with a CRC32 per row.
+
+    layout:
+        {
+            "_format": 2,
+            "students": [
+                {"id": "...", "name": "...", "email": "...", "password": "...", "category": null, "_crc": 123},
+                ...
+            ],
+            "admins": []
+        }
+
+    every table of the file is written, also when it is empty, and each row is one line. a row is checked against
+    its CRC32 when it is read, so damaged bytes raise CorruptDataException instead of becoming wrong rows, and
+    @salvage can still read every row that is intact, line by line, when the file as a whole cannot be parsed.
+    files without "_format" are of version 1, written before the checksums, and are still read.
+
+    Methods:
+        encode:     tables of row tuples -> JSON string
+        decode:     JSON content -> tables of row tuples, checked
+        row_of:     one parsed row object -> row tuple, checked
+        check_file: verify the version of a parsed file and that none of its tables is missing
+        salvage:    the intact rows of a damaged file
+        checksum:   CRC32 of a row tuple
+    """
+
+    VERSION = 2
+    # the member of the file with its version, and the member of a row with its CRC32
+    VERSION_KEY = "_format"
+    CHECKSUM_KEY = "_crc"
+
+    @classmethod
+    def encode(cls, tables, table_columns):
+        """
+        :param tables:          dict of table name -> list of row tuples
+        :param table_columns:   dict of table name -> column names, in row tuple order
+        :return: str
+        """
+        members = [f'    "{cls.VERSION_KEY}": {cls.VERSION}']
+        for table, rows in tables.items():
+            columns = table_columns[table]
+            # compact rows are encoded in C, an indent would make json use its Python encoder
+            row_lines = [json.dumps({**dict(zip(columns, row)), cls.CHECKSUM_KEY: cls.checksum(row)})
+                         for row in rows]
+            if row_lines:
+                members.append(f'    "{table}": [\n        ' + ",\n        ".join(row_lines) + "\n    ]")
+            else:
+                members.append(f'    "{table}": []')
+        return "{\n" + ",\n".join(members) + "\n}"
+
+    @classmethod
+    def decode(cls, content, table_columns):
+        """
+        :param content:         bytes of a JSON data file, empty for no rows
+        :param table_columns:   dict of table name -> column names, in row tuple order
+        :return: dict of table name -> list of row tuples
+        """
+        try:
+            data = json.loads(content) if content else {}
+        except ValueError as e:
+            raise CorruptDataException(f"invalid JSON: {e}") from e
+        checked = cls.check_file(data, table_columns)
+        return {table: [cls.row_of(item, columns, checked) for item in data.get(table, [])]
+                for table, columns in table_columns.items()}
+
+    @classmethod
+    def check_file(cls, data, table_columns):
+        """
+        :param data:            parsed JSON data file
+        :param table_columns:   dict of table name -> column names, the tables the file holds
+        :return: True if the rows carry checksums, False for version 1
+        """
+        if not isinstance(data, dict):
+            raise CorruptDataException("a data file is a JSON object")
+        version = data.get(cls.VERSION_KEY)
+        if version is None:
+            return False
+        if version != cls.VERSION:
+            raise CorruptDataException(f"unsupported JSON format version: {version}")
+        missing = [table for table in table_columns if not isinstance(data.get(table), list)]
+        if missing:
+            raise CorruptDataException(f"tables missing: {', '.join(missing)}")
+        return True
+
+    @classmethod
+    def row_of(cls, item, columns, checked):
+        """
+        :param item:    parsed row object
+        :param columns: column names in row tuple order
+        :param checked: True if the file has checksums, then every row has one
+        :return: row tuple
+        """
+        if not isinstance(item, dict):
+            raise CorruptDataException(f"a row is a JSON object, not {type(item).__name__}")
+        row = tuple([item.get(column) for column in columns])
+        crc = item.get(cls.CHECKSUM_KEY)
+        if not checked:
+            # a row with a checksum in a file without version means a damaged version member
+            if crc is not None:
+                raise CorruptDataException("row with checksum in a file of version 1")
+            return row
+        if crc != cls.checksum(row):
+            raise CorruptDataException(f"checksum mismatch of the row {json.dumps(row)[:80]}")
+        return row
+
+    @classmethod
+    def salvage(cls, content, table_columns):
+        """
+        read the rows of a damaged file line by line, each line with a row object that passes its checksum is kept.
+        a row belongs to the table whose columns it has, so a damaged table name loses no rows.
+
+        :param content:         bytes of a JSON data file of this version
+        :param table_columns:   dict of table name -> column names, in row tuple order
+        :return: (dict of table name -> list of row tuples, number of row lines dropped),
+                 None if the file has no checksums, so an intact row cannot be told apart
+        """
+        if cls.CHECKSUM_KEY.encode() not in content:
+            return None
+        tables = {table: [] for table in table_columns}
+        tables_by_keys = {frozenset(columns) | {cls.CHECKSUM_KEY}: table for table, columns in table_columns.items()}
+        dropped = 0
+        for line in content.splitlines():
+            text = line.strip().rstrip(b",")
+            # row lines start with "{", a damaged one may still be told by its checksum member
+            if text == b"{" or not text.startswith(b"{") and cls.CHECKSUM_KEY.encode() not in text:
+                continue
+            try:
+                item = json.loads(text)
+                table = tables_by_keys.get(frozenset(item)) if isinstance(item, dict) else None
+                if table is None:
+                    raise CorruptDataException("no table has the columns of the row")
+                row = cls.row_of(item, table_columns[table], True)
+            except (ValueError, CorruptDataException):
+                dropped += 1
+                continue
+            tables[table].append(row)
+        return tables, dropped
+
+    @staticmethod
+    def checksum(row):
+        # CRC32 of the repr of the row tuple, a value of another type is another row, repr escapes lone surrogates
+        return zlib.crc32(repr(row).encode("utf-8"))
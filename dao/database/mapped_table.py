@@ -0,0 +1,83 @@
+from dao.database.binary_format import BinaryFormat
+
+
+class MappedTable:
+    """
+    read-only view of one table of a memory-mapped binary data file.
+    a column is decoded on first use, a row tuple is only built for a row that is accessed,
+    so point lookups and counts never create tuples or entities for non-matching rows.
+
+    Fields:
+        _content            mmap of the data file
+        _row_count          number of rows
+        _column_offsets     column name -> (kind, payload offset, payload length, CRC32), from BinaryFormat.index
+        _columns            column names in row tuple order
+        _decoded            column name -> decoded values, filled on first use
+        _positions          (column name, normalize) -> value -> position of its first row, built on the first find
+        _groups             column name -> value -> positions of all its rows, built on the first find_all or count
+    Methods:
+        get_row_count:  number of rows, no column is decoded
+        column:         all values of one column
+        row:            one row tuple
+        rows:           all row tuples
+        find:           first row with a column value, or None, a hash lookup after the first call
+        find_all:       all rows with a column value, a hash lookup after the first call
+        count:          number of rows with a column value, a hash lookup after the first call
+    """
+
+    def __init__(self, content, row_count, column_offsets, columns):
+        self._content = content
+        self._row_count = row_count
+        self._column_offsets = column_offsets
+        self._columns = columns
+        self._decoded = {}
+        self._positions = {}
+        self._groups = {}
+
+    def get_row_count(self):
+        # getter for _row_count
+        return self._row_count
+
+    def column(self, name):
+        values = self._decoded.get(name)
+        if values is None:
+            if name in self._column_offsets:
+                values = BinaryFormat.decode_column(self._content, self._column_offsets[name], self._row_count)
+            else:
+                values = [None] * self._row_count
+            self._decoded[name] = values
+        return values
+
+    def row(self, index):
+        return tuple(self.column(name)[index] for name in self._columns)
+
+    def rows(self):
+        if not self._row_count:
+            return []
+        return list(zip(*(self.column(name) for name in self._columns)))
+
+    def find(self, name, value, normalize=None):
+        positions = self._positions.get((name, normalize))
+        if positions is None:
+            # reversed, so the first row of equal values is kept
+            values = self.column(name)
+            keys = reversed(values) if normalize is None else map(normalize, reversed(values))
+            positions = dict(zip(keys, range(len(values) - 1, -1, -1)))
+            self._positions[(name, normalize)] = positions
+        index = positions.get(value if normalize is None else normalize(value))
+        return self.row(index) if index is not None else None
+
+    def find_all(self, name, value):
+        return [self.row(index) for index in self._group(name).get(value, ())]
+
+    def count(self, name, value):
+        return len(self._group(name).get(value, ()))
+
+    def _group(self, name):
+        groups = self._groups.get(name)
+        if groups is None:
+            groups = {}
+            for index, value in enumerate(self.column(name)):
+                groups.setdefault(value, []).append(index)
+            self._groups[name] = groups
+        return groups
@@ -0,0 +1,76 @@
+from dao.database.binary_format import BinaryFormat
+from dao.database.table_stream import TableStream
+
+
+class PinnedFile:
+    """
+    one generation of a data file without log, pinned by Database.snapshot as a mapping of the file instead of
+    its decoded rows. data files are only ever replaced by a rename, so the mapping keeps this generation however
+    often the file is written meanwhile. a report streams its tables in chunks like TableFile.iter_rows does, so
+    memory stays bounded by the chunk. a query of a whole table or a keyed lookup decodes the file once, on first
+    use, and is answered from the same TableVersion after that.
+    the mapping is released once the snapshot and every generator streaming from it are gone.
+
+    Fields:
+        _mapping        mmap of the data file, None for an empty file
+        _table_columns  table -> column names in row tuple order
+        _decode         function of the file content -> TableVersion, see TableFile.pin_file
+        _version        TableVersion decoded on first use, None before
+    Methods:
+        iter_rows:      rows of one table in chunks, streamed from the mapping
+        get_rows, find_indexed, count_rows:
+                        same as TableVersion
+    """
+
+    def __init__(self, mapping, table_columns, decode):
+        self._mapping = mapping
+        self._table_columns = table_columns
+        self._decode = decode
+        self._version = None
+
+    def iter_rows(self, table, chunk_size):
+        # rows decoded already are served from memory
+        if self._version is not None:
+            yield from self._version.iter_rows(table, chunk_size)
+            return
+        if self._mapping is None:
+            return
+        columns = self._table_columns[table]
+        if BinaryFormat.is_binary(self._mapping):
+            yield from TableStream.iter_binary_table(self._mapping, table, columns, chunk_size)
+        else:
+            yield from TableStream.iter_json_table(MappingStream(self._mapping), table, columns, chunk_size)
+
+    def get_rows(self, table):
+        return self._decoded().get_rows(table)
+
+    def find_indexed(self, table, columns, key):
+        return self._decoded().find_indexed(table, columns, key)
+
+    def count_rows(self, table, column, value):
+        return self._decoded().count_rows(table, column, value)
+
+    def _decoded(self):
+        if self._version is None:
+            self._version = self._decode(self._mapping[:] if self._mapping is not None else b"")
+        return self._version
+
+
+class MappingStream:
+    """
+    read(size) over a mapping with a position of its own, so several tables of one PinnedFile are streamed at once.
+
+    Fields:
+        _mapping    mmap of a data file
+        _position   offset of the next read
+    """
+
+    def __init__(self, mapping):
+        self._mapping = mapping
+        self._position = 0
+
+    def read(self, size=-1):
+        end = len(self._mapping) if size < 0 else self._position + size
+        content = self._mapping[self._position:end]
+        self._position += len(content)
+        return content
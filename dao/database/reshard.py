@@ -0,0 +1,27 @@
+"""
+offline resharding of a database in sharded layout, see Database.reshard.
+no other process may use the database meanwhile.
+
+usage: python -m dao.database.reshard --shards 8 [--data-file ../unidemo/student.data]
+"""
+import argparse
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, required=True, help="new number of shards")
+    parser.add_argument("--data-file", default=None, help="database file, the default one if omitted")
+    args = parser.parse_args(argv)
+
+    # a database in single layout is migrated to the sharded layout first
+    database = Database(args.data_file, layout=DatabaseConfig.LAYOUT_SHARDED, shard_count=args.shards)
+    before = database.get_shard_count()
+    database.reshard(args.shards)
+    print(f"{database.get_data_file_path()}: {before} -> {database.get_shard_count()} shards")
+
+
+if __name__ == '__main__':
+    main()
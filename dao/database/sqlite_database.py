@@ -0,0 +1,521 @@
+import contextlib
+import os
+import sqlite3
+import threading
+
+from dao.database.change_events import ChangeEvent, ChangeEventBus
+from dao.database.compactor import Compactor
+from dao.database.config import DatabaseConfig
+from dao.entity.admin import Admin
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from util.exception import (CorruptDataException, DataAccessException, LockTimeoutException,
+                            PrimaryKeyDuplicationException, UniqueKeyDuplicationException)
+
+
+class SqliteDatabase:
+    """
+    sqlite3 storage engine with the same read/write methods as Database, plus keyed queries on indexed columns.
+    Tables:
+        students    primary key id, unique index on email, or on email COLLATE NOCASE if emails ignore case
+        admins      primary key id
+        subjects    primary key (student_id, subject_id), which also serves lookups by student_id
+    rows are returned in insertion order (rowid), an updated row is deleted and inserted again like in Database,
+    unless only columns changed by the setters of the entity are set, see @_patch.
+
+    Fields:
+        _db_file_path       sqlite database file
+        _synchronous        sqlite synchronous level of the connections, from the fsync policy
+        _session            thread local, each thread has its own sqlite3 connection in WAL journal mode and its own
+                            transaction state, so a transaction or snapshot block never takes in the calls of other
+                            threads, sqlite isolates them like the connections of other processes:
+                                connection      sqlite3 connection of the thread, opened on first use
+                                in_transaction  True while a transaction() or snapshot() block of the thread is open
+                                events          ChangeEvents of the open block, published once it is committed
+        _connections        (thread, connection) of every open connection, for close, the connection of a thread
+                            that has ended is closed when the next one is opened
+        _lock               guards _connections
+        _email_collation    collation of email lookups, NOCASE if emails ignore case
+        _compactor          Compactor of this engine, its background thread runs only in the shared engine
+        _event_bus          ChangeEventBus of the subscribers of this engine
+    Methods:
+        read_*/write_*                      same as Database
+        iter_students, iter_subjects:       same as Database, rows are fetched from a cursor in chunks
+        insert_*/update_*/delete_*          same as Database, key violations raise DataAccessException subclasses
+        insert_students, insert_subjects:   same as Database, all rows in one transaction
+        email_key:                          same as Database, NOCASE only folds ASCII letters
+        transaction:                        same as Database, one sqlite transaction for the whole block
+        run_transaction:                    same as Database, the write lock of the transaction excludes conflicts
+        snapshot:                           same as Database, one sqlite read transaction for the whole block
+        compact:                            same as Database, a truncating checkpoint of the sqlite WAL
+        recover:                            same as Database, sqlite recovers its WAL itself on open, so this only
+                                            runs its integrity check
+        start_compaction, get_compaction_stats:
+                                            same as Database
+        subscribe, unsubscribe, get_event_bus:
+                                            same as Database
+        find_student_by_id, find_student_by_email, find_subject,
+        find_subjects_by_student_id, count_subjects_by_student_id:
+                                            keyed queries, answered by the indexes
+        import_from:                        copy all tables of another engine, used to migrate from JSON files
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS students (
+            id TEXT PRIMARY KEY, name TEXT, email TEXT NOT NULL, password TEXT, category TEXT);
+        CREATE UNIQUE INDEX IF NOT EXISTS students_email ON students (email);
+        CREATE TABLE IF NOT EXISTS admins (
+            id TEXT PRIMARY KEY, name TEXT, email TEXT);
+        CREATE TABLE IF NOT EXISTS subjects (
+            student_id TEXT NOT NULL, subject_id TEXT NOT NULL, mark INTEGER, grade TEXT,
+            PRIMARY KEY (student_id, subject_id));
+    """
+
+    STUDENT_COLUMNS = "id, name, email, password, category"
+    ADMIN_COLUMNS = "id, name, email"
+    SUBJECT_COLUMNS = "student_id, subject_id, mark, grade"
+
+    # primary key columns, an update that changes one of them writes the whole row
+    PRIMARY_KEYS = {"students": ("id",), "subjects": ("student_id", "subject_id")}
+
+    # fsync policy to sqlite synchronous level, in WAL mode NORMAL only syncs on checkpoint
+    SYNCHRONOUS = {DatabaseConfig.FSYNC_ALWAYS: "FULL", DatabaseConfig.FSYNC_INTERVAL: "NORMAL",
+                   DatabaseConfig.FSYNC_NEVER: "OFF"}
+
+    # case insensitive unique email index, NOCASE only folds ASCII letters
+    NOCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+    NOCASE_EMAIL_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS students_email_nocase ON students (email COLLATE NOCASE)"
+
+    def __init__(self, db_file_path, fsync_policy=DatabaseConfig.FSYNC_ALWAYS,
+                 email_case=DatabaseConfig.EMAIL_CASE_SENSITIVE):
+        self._db_file_path = db_file_path
+        self._synchronous = self.SYNCHRONOUS[fsync_policy]
+        self._session = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._email_collation = "COLLATE NOCASE" if email_case == DatabaseConfig.EMAIL_CASE_INSENSITIVE else ""
+        self._compactor = Compactor(self)
+        self._event_bus = ChangeEventBus()
+        os.makedirs(os.path.dirname(os.path.abspath(db_file_path)), exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(self.SCHEMA)
+        if self._email_collation:
+            try:
+                connection.execute(self.NOCASE_EMAIL_INDEX)
+            except sqlite3.IntegrityError as e:
+                raise self._to_dao_exception(e)
+
+    def get_data_file_path(self):
+        # getter for _db_file_path
+        return self._db_file_path
+
+    def read_students(self):
+        rows = self._connection().execute(f"SELECT {self.STUDENT_COLUMNS} FROM students ORDER BY rowid")
+        return [Student.from_row(row) for row in rows]
+
+    def read_admins(self):
+        rows = self._connection().execute(f"SELECT {self.ADMIN_COLUMNS} FROM admins ORDER BY rowid")
+        return [Admin.from_row(row) for row in rows]
+
+    def read_subjects(self):
+        rows = self._connection().execute(f"SELECT {self.SUBJECT_COLUMNS} FROM subjects ORDER BY rowid")
+        return [Subject.from_row(row) for row in rows]
+
+    def iter_students(self, chunk_size=None):
+        for row in self._iter_rows(f"SELECT {self.STUDENT_COLUMNS} FROM students ORDER BY rowid", chunk_size):
+            yield Student.from_row(row)
+
+    def iter_subjects(self, chunk_size=None):
+        for row in self._iter_rows(f"SELECT {self.SUBJECT_COLUMNS} FROM subjects ORDER BY rowid", chunk_size):
+            yield Subject.from_row(row)
+
+    def write_students(self, students):
+        self._replace_table("students", self.STUDENT_COLUMNS, [self._student_values(item) for item in students])
+        self._publish([ChangeEvent.replaced("students")])
+
+    def write_admins(self, admins):
+        values = [(admin.get_staff_id(), admin.get_staff_name(), admin.get_staff_email()) for admin in admins]
+        self._replace_table("admins", self.ADMIN_COLUMNS, values)
+
+    def write_subjects(self, subjects):
+        self._replace_table("subjects", self.SUBJECT_COLUMNS, [self._subject_values(item) for item in subjects])
+        self._publish([ChangeEvent.replaced("subjects")])
+
+    def insert_student(self, student):
+        self._execute(f"INSERT INTO students ({self.STUDENT_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                      self._student_values(student))
+        self._publish_rows("students", "insert", [student])
+
+    def insert_students(self, students):
+        self._execute_many(f"INSERT INTO students ({self.STUDENT_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                           [self._student_values(student) for student in students])
+        self._publish_rows("students", "insert", students)
+
+    def update_student(self, student):
+        # only the changed columns of a student changed by its setters, see @_patch, otherwise
+        # delete first add after, so the email index is checked against the other students only
+        if not self._patch("students", student):
+            self._execute_all([("DELETE FROM students WHERE id = ?", (student.get_student_id(),)),
+                               (f"INSERT INTO students ({self.STUDENT_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                                self._student_values(student))])
+            self._publish_rows("students", "update", [student])
+        student.mark_clean()
+
+    def delete_students(self, student_id):
+        if self._execute("DELETE FROM students WHERE id = ?", (student_id,)):
+            self._publish_delete("students", {"id": student_id})
+
+    def insert_subject(self, subject):
+        self._execute(f"INSERT INTO subjects ({self.SUBJECT_COLUMNS}) VALUES (?, ?, ?, ?)",
+                      self._subject_values(subject))
+        self._publish_rows("subjects", "insert", [subject])
+
+    def insert_subjects(self, subjects):
+        self._execute_many(f"INSERT INTO subjects ({self.SUBJECT_COLUMNS}) VALUES (?, ?, ?, ?)",
+                           [self._subject_values(subject) for subject in subjects])
+        self._publish_rows("subjects", "insert", subjects)
+
+    def update_subject(self, subject):
+        if not self._patch("subjects", subject):
+            self._execute(f"INSERT OR REPLACE INTO subjects ({self.SUBJECT_COLUMNS}) VALUES (?, ?, ?, ?)",
+                          self._subject_values(subject))
+            self._publish_rows("subjects", "update", [subject])
+        subject.mark_clean()
+
+    def delete_subjects(self, student_id, subject_id=None):
+        # delete one enrollment of a student, or all of them if subject_id is None
+        if subject_id is None:
+            deleted = self._execute("DELETE FROM subjects WHERE student_id = ?", (student_id,))
+            where = {"student_id": student_id}
+        else:
+            deleted = self._execute("DELETE FROM subjects WHERE student_id = ? AND subject_id = ?",
+                                    (student_id, subject_id))
+            where = {"student_id": student_id, "subject_id": subject_id}
+        if deleted:
+            self._publish_delete("subjects", where)
+
+    def email_key(self, email):
+        if self._email_collation and isinstance(email, str):
+            return email.translate(self.NOCASE)
+        return email
+
+    def find_student_by_id(self, student_id):
+        row = self._connection().execute(f"SELECT {self.STUDENT_COLUMNS} FROM students WHERE id = ?",
+                                       (student_id,)).fetchone()
+        return Student.from_row(row) if row else None
+
+    def find_student_by_email(self, email):
+        row = self._connection().execute(f"SELECT {self.STUDENT_COLUMNS} FROM students "
+                                       f"WHERE email = ? {self._email_collation}", (email,)).fetchone()
+        return Student.from_row(row) if row else None
+
+    def find_subject(self, student_id, subject_id):
+        row = self._connection().execute(f"SELECT {self.SUBJECT_COLUMNS} FROM subjects "
+                                       f"WHERE student_id = ? AND subject_id = ?", (student_id, subject_id)).fetchone()
+        return Subject.from_row(row) if row else None
+
+    def find_subjects_by_student_id(self, student_id):
+        rows = self._connection().execute(f"SELECT {self.SUBJECT_COLUMNS} FROM subjects "
+                                        f"WHERE student_id = ? ORDER BY rowid", (student_id,))
+        return [Subject.from_row(row) for row in rows]
+
+    def count_subjects_by_student_id(self, student_id):
+        return self._connection().execute("SELECT COUNT(*) FROM subjects WHERE student_id = ?",
+                                        (student_id,)).fetchone()[0]
+
+    def checkpoint(self):
+        # fold the sqlite WAL into the database file
+        self._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact(self, min_log_bytes=None, budget=None):
+        """
+        fold the sqlite WAL into the database file and truncate it, once it has grown to min_log_bytes.
+        sqlite writes the pages itself, so budget does not apply, and a checkpoint that finds readers or writers
+        still using the WAL is skipped. the report has the keys of Database.compact.
+        """
+        min_log_bytes = min_log_bytes if min_log_bytes is not None else DatabaseConfig.COMPACTION_MIN_LOG_BYTES
+        report = {"compacted": 0, "skipped": 0, "bytes_written": 0, "bytes_before": 0, "bytes_after": 0,
+                  "reclaimed_bytes": 0}
+        if self._file_size(self._db_file_path + "-wal") < max(min_log_bytes, 1):
+            return report
+
+        bytes_before = self._file_size(self._db_file_path) + self._file_size(self._db_file_path + "-wal")
+        busy, _, checkpointed = self._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        bytes_after = self._file_size(self._db_file_path) + self._file_size(self._db_file_path + "-wal")
+        report.update(compacted=0 if busy else 1, skipped=1 if busy else 0, bytes_before=bytes_before,
+                      bytes_after=bytes_after, reclaimed_bytes=bytes_before - bytes_after,
+                      bytes_written=max(checkpointed, 0) * self._connection().execute("PRAGMA page_size").fetchone()[0])
+        return report
+
+    def recover(self):
+        # see Database.recover, the report has its keys
+        result = self._connection().execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise CorruptDataException(f"corrupt database file {self._db_file_path}: {result}")
+        return {"repaired": 0, "dropped_bytes": 0, "dropped_rows": 0}
+
+    def start_compaction(self):
+        # see Database.start_compaction
+        self._compactor.start()
+
+    def get_compaction_stats(self):
+        # see Database.get_compaction_stats
+        return self._compactor.get_stats()
+
+    def subscribe(self, callback, kinds=None, queued=False):
+        # see Database.subscribe
+        return self._event_bus.subscribe(callback, kinds, queued)
+
+    def unsubscribe(self, callback):
+        self._event_bus.unsubscribe(callback)
+
+    def get_event_bus(self):
+        # getter for _event_bus
+        return self._event_bus
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        all statements of the block are committed together at the end, or rolled back if it raises.
+        a failed call inside only undoes its own statements, a nested transaction joins the outer one.
+        the write lock is taken at the start, so reads inside see no change of another process until commit.
+        only the calls of the thread that opened the block are part of it, a writing call of another thread
+        waits for the write lock until the block is committed or rolled back, see _session.
+        """
+        session = self._current_session()
+        if session.in_transaction:
+            yield self
+            return
+
+        try:
+            session.connection.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            raise LockTimeoutException(f"database is locked: {e}")
+        session.in_transaction = True
+        session.events = []
+        try:
+            yield self
+        except BaseException:
+            session.connection.rollback()
+            raise
+        else:
+            session.connection.commit()
+        finally:
+            session.in_transaction = False
+            events, session.events = session.events, None
+        self._event_bus.publish(events)
+
+    def run_transaction(self, operation, retries=None):
+        # sqlite holds its write lock from BEGIN IMMEDIATE to commit, so no retries are needed
+        with self.transaction():
+            return operation()
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """
+        all reads of the block see one version of the database, in WAL journal mode other connections write meanwhile.
+        the read transaction is on the connection of the calling thread, so the writes of other threads are neither
+        seen by the block nor rolled back with it, see _session.
+        a write inside takes the write lock and is committed with the block. inside a transaction it joins that.
+        """
+        session = self._current_session()
+        if session.in_transaction:
+            yield self
+            return
+
+        session.connection.execute("BEGIN DEFERRED")
+        session.in_transaction = True
+        session.events = []
+        try:
+            # the first read of the transaction pins the version
+            session.connection.execute("SELECT 1 FROM students LIMIT 1").fetchall()
+            yield self
+        except BaseException:
+            session.connection.rollback()
+            raise
+        else:
+            session.connection.commit()
+        finally:
+            session.in_transaction = False
+            events, session.events = session.events, None
+        self._event_bus.publish(events)
+
+    def import_from(self, database):
+        """
+        copy all tables of another engine into this one, replacing the current rows.
+
+        :param database:    source engine, e.g. Database of the JSON data file
+        """
+        self.write_students(database.read_students())
+        self.write_admins(database.read_admins())
+        self.write_subjects(database.read_subjects())
+
+    def delete_data_file(self):
+        # keep the file and its schema, only the rows are removed
+        self._execute_all([("DELETE FROM subjects", ()), ("DELETE FROM students", ()), ("DELETE FROM admins", ())])
+        self._publish([ChangeEvent.replaced("students"), ChangeEvent.replaced("subjects")])
+
+    def close(self):
+        # close the connections of all threads
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for _, connection in connections:
+            connection.close()
+
+    def _connection(self):
+        # sqlite3 connection of the calling thread
+        return self._current_session().connection
+
+    def _current_session(self):
+        """
+        the session of the calling thread, its connection is opened on first use.
+        check_same_thread is off only so that close and the cleanup of ended threads may close it.
+        other connections holding the write lock are waited for up to the lock timeout.
+        """
+        session = self._session
+        if getattr(session, "connection", None) is None:
+            connection = sqlite3.connect(self._db_file_path, timeout=DatabaseConfig.LOCK_TIMEOUT_MS / 1000,
+                                         check_same_thread=False)
+            connection.execute(f"PRAGMA synchronous={self._synchronous}")
+            with self._lock:
+                ended = [entry for entry in self._connections if not entry[0].is_alive()]
+                self._connections = [entry for entry in self._connections if entry[0].is_alive()]
+                self._connections.append((threading.current_thread(), connection))
+            for _, other in ended:
+                other.close()
+            session.connection = connection
+            session.in_transaction = False
+            session.events = None
+        return session
+
+    @staticmethod
+    def _file_size(path):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _patch(self, table, entity):
+        """
+        UPDATE only the columns changed by the setters of an entity, like the patch records of Database.
+        the row keeps its rowid, and a missing row stays missing.
+
+        :return: False if nothing was written, because the entity was created by the caller, no change is tracked
+                 or a primary key column changed
+        """
+        columns = sorted(entity.get_dirty_fields())
+        key_columns = self.PRIMARY_KEYS[table]
+        if not entity.is_loaded() or not columns or any(column in key_columns for column in columns):
+            return False
+        row = entity.to_dict()
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        conditions = " AND ".join(f"{column} = ?" for column in key_columns)
+        key = [row[column] for column in key_columns]
+        if self._execute(f"UPDATE {table} SET {assignments} WHERE {conditions}",
+                         [row[column] for column in columns] + key):
+            # the other columns as stored, the entity may hold older values of them
+            all_columns = self.STUDENT_COLUMNS if table == "students" else self.SUBJECT_COLUMNS
+            stored = self._connection().execute(f"SELECT {all_columns} FROM {table} WHERE {conditions}", key).fetchone()
+            self._publish([ChangeEvent.from_record({"op": "patch", "table": table, "where": row},
+                                                   dict(zip(all_columns.split(", "), stored)))])
+        return True
+
+    def _publish_rows(self, table, op, entities):
+        # ChangeEvents of the rows written by one call, see @_publish
+        rows = [entity.to_dict() for entity in entities]
+        self._publish([ChangeEvent.from_record({"op": op, "table": table, "row": row}, row) for row in rows])
+
+    def _publish_delete(self, table, where):
+        self._publish([ChangeEvent.from_record({"op": "delete", "table": table, "where": where})])
+
+    def _publish(self, events):
+        # published at once after a call of its own, or when the open transaction of the thread is committed
+        session = self._current_session()
+        if session.in_transaction:
+            session.events.extend(events)
+        else:
+            self._event_bus.publish(events)
+
+    @staticmethod
+    def _student_values(student):
+        return (student.get_student_id(), student.get_student_name(), student.get_student_email(),
+                student.get_student_password(), student.get_student_category())
+
+    @staticmethod
+    def _subject_values(subject):
+        return (subject.get_student_id(), subject.get_subject_id(),
+                subject.get_subject_mark(), subject.get_subject_grade())
+
+    def _iter_rows(self, sql, chunk_size=None):
+        # rows of a query, at most chunk_size of them are fetched at a time
+        chunk_size = chunk_size if chunk_size is not None else DatabaseConfig.STREAM_CHUNK_ROWS
+        if chunk_size < 1:
+            raise DataAccessException(f"invalid chunk size: {chunk_size}")
+        cursor = self._connection().execute(sql)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def _replace_table(self, table, columns, values):
+        placeholders = ", ".join("?" for _ in columns.split(","))
+        with self._writing():
+            self._connection().execute(f"DELETE FROM {table}")
+            self._connection().executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", values)
+
+    def _execute(self, sql, params):
+        # :return: number of rows changed
+        return self._execute_all([(sql, params)])
+
+    def _execute_many(self, sql, values):
+        # one statement for many rows in one transaction
+        with self._writing():
+            self._connection().executemany(sql, values)
+
+    def _execute_all(self, statements):
+        # run statements in one transaction, :return: number of rows changed by the last one
+        with self._writing():
+            for sql, params in statements:
+                cursor = self._connection().execute(sql, params)
+        return cursor.rowcount
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        statements of one call, in a transaction of their own or in a savepoint of the open transaction of the thread,
+        so a failed call never leaves half of its statements applied. constraint violations become dao exceptions,
+        and a write lock not acquired within the lock timeout a LockTimeoutException.
+        """
+        session = self._current_session()
+        try:
+            if not session.in_transaction:
+                with session.connection:
+                    yield
+                return
+
+            session.connection.execute("SAVEPOINT call")
+            try:
+                yield
+            except BaseException:
+                session.connection.execute("ROLLBACK TO call")
+                raise
+            finally:
+                session.connection.execute("RELEASE call")
+        except sqlite3.IntegrityError as e:
+            raise self._to_dao_exception(e)
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            raise LockTimeoutException(f"database is locked: {e}")
+
+    @staticmethod
+    def _to_dao_exception(error):
+        message = str(error)
+        if "students.email" in message:
+            return UniqueKeyDuplicationException(f"Student email already exists: {message}")
+        if "UNIQUE" in message:
+            return PrimaryKeyDuplicationException(f"Primary key already exists: {message}")
+        return DataAccessException(message)
@@ -0,0 +1,666 @@
+import json
+import mmap
+import operator
+import os
+
+from dao.database.binary_format import BinaryFormat
+from dao.database.config import DatabaseConfig
+from dao.database.index_file import IndexFile
+from dao.database.json_format import JsonFormat
+from dao.database.mapped_table import MappedTable
+from dao.database.pinned_file import PinnedFile
+from dao.database.table_replay import TableReplay
+from dao.database.table_stream import TableStream
+from dao.database.table_version import TableVersion
+from dao.database.wal import WriteAheadLog
+from util.exception import CorruptDataException, DataAccessException
+
+
+class TableFile:
+    """
+    one data file and its write-ahead log, holding the rows of one or more tables.
+    the data file is either a JSON object with one array per table, e.g. {"students": [...], "admins": [...]},
+    see JsonFormat, or the same tables in BinaryFormat. the format is detected on read.
+
+    Fields:
+        _file_path          data file, also the checkpoint of the log
+        _table_names        tables stored in this file
+        _version            TableVersion with the rows of each table as tuples in TABLE_COLUMNS order, parsed from
+                            data file and log, or a MappedTable in mmap read mode until the rows are needed,
+                            and the TableIndex of the primary, unique and secondary keys of each table,
+                            built on first use and maintained by apply, dropped when the rows are replaced
+        _published          last TableVersion published in snapshot threading mode, never changed, None otherwise
+        _threading_mode     DatabaseConfig.THREADING_SERIALIZED or THREADING_SNAPSHOT
+        _wal                write-ahead log next to the data file
+        _wal_offset         byte offset of the log up to which records are applied to _version, the end of its last
+                            valid record
+        _fingerprint        stat fingerprints (mtime_ns, size, inode) of data file and log the rows were parsed from
+        _file_sync          FileSync that writes data file and log according to the fsync policy
+        _file_format        DatabaseConfig.FORMAT_JSON or FORMAT_BINARY, used for writing
+        _read_mode          DatabaseConfig.READ_EAGER or READ_MMAP, mmap only applies to binary data files
+        _mapping            mmap of the data file in mmap read mode
+        _normalizers        (table, column) -> function applied to the values of a unique key, e.g. case folding
+        _index_file         sidecar IndexFile of a JSON data file, None if DatabaseConfig.INDEX_FILES is off
+        _rebuild_index      set when the index file did not match the data file, the next load rebuilds it
+    Methods:
+        load:           load rows from data file and log, skipped if the fingerprints are unchanged
+        get_rows:       rows of one table
+        find_indexed, count_rows:
+                        rows with a key of one or more columns, without building other rows of a MappedTable,
+                        on an indexed column set they are hash lookups
+        find_persisted: rows with a key from the sidecar index file, before the rows are loaded
+        iter_rows:      rows of one table in chunks, streamed from the data file unless they are in memory
+        set_rows:       replace rows of one table in memory
+        apply:          apply change records to the rows in memory
+        patchable:      whether changed columns can be written as a patch record of only those columns
+        append:         append applied change records to the log
+        recover:        cut off an invalid log tail, e.g. of a crash, after the last valid record
+        salvage:        rewrite a damaged JSON data file with its intact rows
+        overwrite:      write all rows to the data file atomically and drop the log
+        write_checkpoint, install_checkpoint:
+                        overwrite in two steps, a pinned version is written to a temp file without lock,
+                        the rename and the removal of the log are done later under the lock
+        get_file_sizes: sizes of data file and log
+        invalidate:     drop changes applied in memory but not persisted, the next load reads the files again
+        get_snapshot:   published version of the current files, for queries without lock in snapshot threading mode
+        pin:            current version for Database.snapshot, it is never changed again
+        pin_file:       current generation of the data file for Database.snapshot, without decoding it
+        delete:         remove data file and log
+        to_row:         convert a dict (entity to_dict or log record row) to a row tuple
+    """
+
+    # columns of each table, same order as the parameters of the entity constructors
+    # the emails table is the global email index of the sharded layout, email as compared by Database.email_key
+    TABLE_COLUMNS = {"students": ("id", "name", "email", "password", "category"),
+                     "admins": ("id", "name", "email"),
+                     "subjects": ("student_id", "subject_id", "mark", "grade"),
+                     "emails": ("email", "student_id")}
+
+    # primary key fields of each table, a changed row replaces the row with the same key
+    TABLE_KEYS = {"students": ("id",), "admins": ("id",), "subjects": ("student_id", "subject_id"),
+                  "emails": ("email",)}
+
+    # unique keys besides the primary key, each one has a TableIndex as well
+    TABLE_UNIQUE_KEYS = {"students": (("email",),), "admins": (), "subjects": (), "emails": ()}
+
+    # non-unique keys with a TableIndex, e.g. the enrollments of one student
+    TABLE_SECONDARY_KEYS = {"students": (), "admins": (), "subjects": (("student_id",),), "emails": (("student_id",),)}
+
+    # a replay of more records than this is applied by TableReplay, fewer are applied one by one
+    BULK_REPLAY_RECORDS = 64
+
+    def __init__(self, file_path, table_names, file_sync, file_format=None, read_mode=None, email_case=None,
+                 index_files=None, threading_mode=None):
+        self._file_path = file_path
+        self._table_names = tuple(table_names)
+        self._file_sync = file_sync
+        self._file_format = file_format if file_format is not None else DatabaseConfig.FILE_FORMAT
+        if self._file_format not in (DatabaseConfig.FORMAT_JSON, DatabaseConfig.FORMAT_BINARY):
+            raise DataAccessException(f"unknown file format: {self._file_format}")
+        self._read_mode = read_mode if read_mode is not None else DatabaseConfig.READ_MODE
+        if self._read_mode not in (DatabaseConfig.READ_EAGER, DatabaseConfig.READ_MMAP):
+            raise DataAccessException(f"unknown read mode: {self._read_mode}")
+        self._mapping = None
+        email_case = email_case if email_case is not None else DatabaseConfig.EMAIL_CASE
+        if email_case not in (DatabaseConfig.EMAIL_CASE_SENSITIVE, DatabaseConfig.EMAIL_CASE_INSENSITIVE):
+            raise DataAccessException(f"unknown email case: {email_case}")
+        self._normalizers = {}
+        if email_case == DatabaseConfig.EMAIL_CASE_INSENSITIVE:
+            self._normalizers[("students", "email")] = self.fold_case
+        self._version = self._new_version({table: [] for table in self._table_names})
+        self._published = None
+        self._threading_mode = threading_mode if threading_mode is not None else DatabaseConfig.THREADING
+        if self._threading_mode not in (DatabaseConfig.THREADING_SERIALIZED, DatabaseConfig.THREADING_SNAPSHOT):
+            raise DataAccessException(f"unknown threading mode: {self._threading_mode}")
+        index_files = index_files if index_files is not None else DatabaseConfig.INDEX_FILES
+        if index_files not in (DatabaseConfig.INDEX_FILES_ON, DatabaseConfig.INDEX_FILES_OFF):
+            raise DataAccessException(f"unknown index files setting: {index_files}")
+        self._index_file = IndexFile(file_path + ".idx", file_sync) \
+            if index_files == DatabaseConfig.INDEX_FILES_ON else None
+        self._rebuild_index = False
+        self._wal = WriteAheadLog(file_path + ".wal", file_sync)
+        self._wal_offset = 0
+        self._fingerprint = None
+
+    def get_file_path(self):
+        # getter for _file_path
+        return self._file_path
+
+    def get_table_names(self):
+        # getter for _table_names
+        return self._table_names
+
+    def init_file(self):
+        # Check if the file exists, if not, create it with its directory
+        if not os.path.exists(self._file_path):
+            os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+            with open(self._file_path, 'w') as file:
+                file.write('')
+
+    def get_rows(self, table):
+        return self._version.get_rows(table)
+
+    def find_indexed(self, table, columns, key):
+        # rows whose columns equal key, in table order, see TableVersion.find_indexed
+        return self._version.find_indexed(table, columns, key)
+
+    def find_persisted(self, table, columns, key):
+        """
+        rows with a key, read through the sidecar IndexFile while the rows of this file are not loaded,
+        so a cold process does not parse the whole data file for a keyed lookup.
+        only the data file is indexed, a log with changes needs the rows in memory.
+
+        :param table:   table name
+        :param columns: an indexed column set, see @find_indexed
+        :param key:     value of a single column, or tuple of values in the order of columns
+        :return: list of row tuples in table order, None if the rows are loaded already or the index file
+                 cannot answer, in that case the next load rebuilds the index file
+        """
+        if self._index_file is None or self._fingerprint is not None or columns not in self._index_keys(table):
+            return None
+        self.init_file()
+        if self._wal.fingerprint() is not None:
+            return None
+
+        normalize = self._normalizers.get((table, columns[0])) if len(columns) == 1 else None
+        key = normalize(key) if normalize is not None else key
+        positions = [self.column_index(table, column) for column in columns]
+        with open(self._file_path, 'rb') as file:
+            # the generation of the open file, it stays the same even if the path is replaced meanwhile
+            locations = self._index_file.find(self._fingerprint_of(os.fstat(file.fileno())),
+                                              self._index_name(table, columns), key)
+            if locations is None:
+                self._rebuild_index = True
+                return None
+
+            rows = []
+            for offset, length in locations:
+                file.seek(offset)
+                try:
+                    # the version of the data file is not at hand here, a row with a checksum is checked
+                    item = json.loads(file.read(length))
+                    row = JsonFormat.row_of(item, self.TABLE_COLUMNS[table],
+                                            isinstance(item, dict) and JsonFormat.CHECKSUM_KEY in item)
+                except (ValueError, CorruptDataException):
+                    self._rebuild_index = True
+                    return None
+                row_key = TableVersion.key_of(row, positions)
+                # a hash collision is a row with another key
+                if (normalize(row_key) if normalize is not None else row_key) == key:
+                    rows.append(row)
+        return rows
+
+    def count_rows(self, table, column, value):
+        # number of rows whose column equals value
+        return self._version.count_rows(table, column, value)
+
+    def iter_rows(self, table, chunk_size):
+        """
+        the rows of one table in chunks of chunk_size row tuples, as they are when this is called.
+        the rows are served from memory if they are parsed already, otherwise the data file is mapped and streamed
+        with TableStream, nothing is cached then, so memory stays bounded by the chunk.
+        ** Note ** the caller holds the lock during the call, so no write or open transaction of another thread is
+        half way done. the generator returned is consumed without the lock: a later write builds a new row list and
+        replaces the data file by a rename, so neither the list nor the mapping of this version change.
+        a log with changes is loaded first, because its records can only be applied to the whole table.
+
+        :return: generator of lists of row tuples
+        """
+        self.init_file()
+
+        # step 1: changes in the log need the rows in memory
+        fingerprint = (self._stat_fingerprint(), self._wal.fingerprint())
+        if fingerprint != self._fingerprint and fingerprint[1] is not None:
+            self.load()
+            fingerprint = self._fingerprint
+
+        # step 2: rows parsed already, with the changes of an open transaction of the calling thread
+        if fingerprint == self._fingerprint and not self._version.is_mapped(table):
+            return TableStream.iter_list(self._version.get_rows(table), chunk_size)
+
+        # step 3: stream the data file
+        return self._map_file().iter_rows(table, chunk_size)
+
+    def set_rows(self, table, rows):
+        self._version.set_rows(table, rows)
+
+    @classmethod
+    def to_row(cls, table, data):
+        return tuple(data.get(column) for column in cls.TABLE_COLUMNS[table])
+
+    @classmethod
+    def column_index(cls, table, column):
+        return cls.TABLE_COLUMNS[table].index(column)
+
+    @classmethod
+    def _unique_keys(cls, table):
+        # primary key and unique keys of a table
+        return (cls.TABLE_KEYS[table],) + cls.TABLE_UNIQUE_KEYS[table]
+
+    @classmethod
+    def _index_keys(cls, table):
+        # all column sets of a table with a TableIndex
+        return cls._unique_keys(table) + cls.TABLE_SECONDARY_KEYS[table]
+
+    @staticmethod
+    def fold_case(value):
+        # normalizer of case insensitive keys
+        return value.casefold() if isinstance(value, str) else value
+
+    def load(self):
+        """
+        load the rows, unless data file and log are unchanged since the last load or write.
+        ** Note ** stat before read, so a concurrent change is seen as a new fingerprint next time.
+
+        :return: False if the rows in memory were up to date (cache hit), True if files were read
+        """
+        self.init_file()
+
+        fingerprint = (self._stat_fingerprint(), self._wal.fingerprint())
+        if fingerprint == self._fingerprint:
+            return False
+
+        # step 1: if only the log has grown, the tail is applied to the rows in memory
+        if not self._is_log_growth(fingerprint):
+            self._read_checkpoint()
+            self._wal_offset = 0
+
+        # step 2: replay the changes that are not yet in the data file
+        with TableReplay.paused_gc():
+            records, self._wal_offset = self._wal.replay(self._wal_offset)
+            self._replay(records)
+
+        self._fingerprint = fingerprint
+        self._publish()
+        return True
+
+    def apply(self, records):
+        """
+        apply change records to the rows in memory.
+        insert and update both replace a row with the same primary key, so replaying a record twice is harmless.
+        a patch sets columns of the row with its primary key, a missing row stays missing.
+
+        :param records: list of change records, see @WriteAheadLog
+        :return: records that have changed a table, e.g. deleting a missing row changes nothing
+        """
+        applied = []
+        for record in records:
+            table = record["table"]
+            if record["op"] == "delete":
+                changed = self._version.delete_rows(table, record["where"])
+            elif record["op"] == "patch":
+                changed = self._patch_row(table, record["where"], record["set"])
+            else:
+                # add_row replaces the row with the same primary key
+                self._version.add_row(table, self.to_row(table, record["row"]))
+                changed = True
+
+            if changed:
+                applied.append(record)
+        return applied
+
+    @classmethod
+    def patchable(cls, table, columns):
+        # a patch leaves the keys alone, a changed key column needs the whole row, e.g. for the email index
+        return not any(column in key for key in cls._index_keys(table) for column in columns)
+
+    def append(self, records):
+        # persist records that are already applied in memory, after the last valid record of the log
+        self.recover()
+        self._wal.append(records)
+        log_fingerprint = self._wal.fingerprint()
+        self._wal_offset = log_fingerprint[1]
+        self._fingerprint = (self._fingerprint[0], log_fingerprint)
+        self._publish()
+
+    def recover(self):
+        """
+        cut the log off after the last valid record, so the next append is not hidden behind a torn or damaged line.
+        the records before it are applied already, everything after it is dropped.
+        ** Note ** the caller holds the exclusive lock and has loaded the rows.
+
+        :return: number of bytes dropped
+        """
+        log_fingerprint = self._fingerprint[1] if self._fingerprint is not None else None
+        if log_fingerprint is None or log_fingerprint[1] <= self._wal_offset:
+            return 0
+        self._wal.truncate(self._wal_offset)
+        self._fingerprint = (self._fingerprint[0], self._wal.fingerprint())
+        self._publish()
+        return log_fingerprint[1] - self._wal_offset
+
+    def salvage(self):
+        """
+        rewrite a damaged JSON data file with the rows that pass their checksums, see JsonFormat.salvage.
+        an intact file, a binary one and one without checksums are left alone, a load still fails on the latter two.
+        ** Note ** the caller holds the exclusive lock, the rows are loaded again from the new file.
+
+        :return: number of damaged rows dropped
+        """
+        self.init_file()
+        with open(self._file_path, 'rb') as file:
+            content = file.read()
+        if not content or BinaryFormat.is_binary(content):
+            return 0
+        table_columns = {table: self.TABLE_COLUMNS[table] for table in self._table_names}
+        try:
+            JsonFormat.decode(content, table_columns)
+            return 0
+        except CorruptDataException:
+            salvaged = JsonFormat.salvage(content, table_columns)
+        if salvaged is None:
+            return 0
+
+        tables, dropped = salvaged
+        self._release_mapping()
+        # a new generation, the index file of the old one is rebuilt on the next lookup
+        self._file_sync.write_atomic(self._file_path, JsonFormat.encode(tables, self.TABLE_COLUMNS))
+        self.invalidate()
+        return dropped
+
+    def overwrite(self):
+        # step 1: format rows to json string or binary
+        self.init_file()
+        content = self._encode(self._version)
+
+        # a mapped file cannot be replaced on every platform, all rows are in memory now
+        self._release_mapping()
+
+        # step 2: replace the data file, a crash leaves either the old or the new version
+        self._file_sync.write_atomic(self._file_path, content)
+
+        # step 3: the data file now includes every logged change
+        self._wal.delete()
+        self._wal_offset = 0
+
+        # step 4: memory already holds what was written, remember the new file version
+        self._fingerprint = (self._stat_fingerprint(), None)
+        self._publish()
+
+    def write_checkpoint(self, version, budget=None):
+        """
+        write the rows of a version, e.g. of @pin, to a temp file next to the data file.
+
+        :param version: TableVersion that is not changed meanwhile
+        :param budget:  IoBudget throttling the writes, None for no throttling
+        :return: temp file path for @install_checkpoint
+        """
+        return self._file_sync.write_temp(self._file_path, self._encode(version), budget)
+
+    def install_checkpoint(self, temp_path):
+        """
+        replace the data file with a temp file of @write_checkpoint and drop the log.
+        ** Note ** the caller makes sure that the files have not changed since the version was pinned,
+        so the rows in memory are still those of the new data file.
+        """
+        self._release_mapping()
+        self._file_sync.install(temp_path, self._file_path)
+        self._wal.delete()
+        self._wal_offset = 0
+        self._fingerprint = (self._stat_fingerprint(), None)
+        self._publish()
+
+    def get_file_sizes(self):
+        # (data file bytes, log bytes), 0 for a missing file
+        sizes = []
+        for path in (self._file_path, self._wal.get_log_file_path()):
+            try:
+                sizes.append(os.stat(path).st_size)
+            except FileNotFoundError:
+                sizes.append(0)
+        return tuple(sizes)
+
+    def invalidate(self):
+        self._wal_offset = 0
+        self._fingerprint = None
+
+    def get_snapshot(self):
+        """
+        the published version, if data file and log are unchanged since it was published.
+        it is queried without lock, while the writer works on a copy and publishes the next version after its write.
+
+        :return: TableVersion, None in serialized threading mode or if the files have changed
+        """
+        version = self._published
+        if version is None:
+            return None
+        try:
+            fingerprint = (self._stat_fingerprint(), self._wal.fingerprint())
+        except FileNotFoundError:
+            return None
+        return version if version.get_fingerprint() == fingerprint else None
+
+    def delete(self):
+        self._release_mapping()
+        if os.path.exists(self._file_path):
+            os.remove(self._file_path)
+        self._wal.delete()
+        if self._index_file is not None:
+            self._index_file.delete()
+        self._wal_offset = 0
+        self._fingerprint = None
+
+    def pin(self):
+        """
+        hand out the current version, the next changes are made on a copy of it.
+        its rows are decoded, because a mapped version would not survive the mapping being closed on the next write.
+
+        :return: TableVersion
+        """
+        version = self._version
+        for table in self._table_names:
+            version.get_rows(table)
+        self._version = version.copy()
+        return version
+
+    def pin_file(self):
+        """
+        pin the data file as it is now, for a snapshot that streams its tables instead of holding their rows.
+        ** Note ** the caller holds the lock, so no write is half way done.
+
+        :return: PinnedFile, None if @pin is used instead: the log has records, which can only be applied to
+                 the rows in memory, the rows are in memory already, or on Windows, where a mapped file
+                 cannot be replaced, so a snapshot would make every write fail
+        """
+        if os.name == "nt":
+            return None
+        self.init_file()
+        log_fingerprint = self._wal.fingerprint()
+        if log_fingerprint is not None and log_fingerprint[1] > 0:
+            return None
+        if self._fingerprint == (self._stat_fingerprint(), log_fingerprint) and \
+                not any(self._version.is_mapped(table) for table in self._table_names):
+            return None
+
+        return self._map_file()
+
+    def _map_file(self):
+        # PinnedFile of the current generation of the data file
+        with open(self._file_path, 'rb') as file:
+            # an empty file cannot be mapped
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) \
+                if os.fstat(file.fileno()).st_size else None
+        table_columns = {table: self.TABLE_COLUMNS[table] for table in self._table_names}
+        return PinnedFile(mapping, table_columns, self._decode_version)
+
+    def _encode(self, version):
+        # content of the data file with the rows of a version, json string or binary
+        tables = {table: version.get_rows(table) for table in self._table_names}
+        if self._file_format == DatabaseConfig.FORMAT_BINARY:
+            return BinaryFormat.encode(tables, self.TABLE_COLUMNS)
+        return JsonFormat.encode(tables, self.TABLE_COLUMNS)
+
+    def _replay(self, records):
+        # a long log is applied table by table in one pass, with the same result as @apply
+        if len(records) <= self.BULK_REPLAY_RECORDS:
+            self.apply(records)
+            return
+
+        replays = {}
+        for record in records:
+            table = record["table"]
+            replay = replays.get(table)
+            if replay is None:
+                normalizers = {column: normalize for (name, column), normalize in self._normalizers.items()
+                               if name == table}
+                replay = TableReplay(self.TABLE_COLUMNS[table], self.TABLE_KEYS[table], normalizers,
+                                     self._version.get_rows(table))
+                replays[table] = replay
+            replay.apply(record)
+        for table, replay in replays.items():
+            self._version.set_rows(table, replay.get_rows())
+
+    def _patch_row(self, table, where, values):
+        # replace the row with the primary key of where by a copy with the values set, False if there is none
+        key_columns = self.TABLE_KEYS[table]
+        key = where[key_columns[0]] if len(key_columns) == 1 else tuple(where[column] for column in key_columns)
+        rows = self._version.find_indexed(table, key_columns, key)
+        if not rows:
+            return False
+        row = tuple(values.get(column, value) for column, value in zip(self.TABLE_COLUMNS[table], rows[0]))
+        self._version.add_row(table, row)
+        return True
+
+    def _table_indexes(self, table):
+        # indexes of the primary, unique and secondary keys of a table, see TableVersion.table_indexes
+        return self._version.table_indexes(table)
+
+    def _new_version(self, tables):
+        # TableVersion of the tables of this file, with their key columns and normalizers
+        table_columns = {table: self.TABLE_COLUMNS[table] for table in self._table_names}
+        unique_keys = {table: self._unique_keys(table) for table in self._table_names}
+        index_specs = {table: tuple((columns, self._normalizers.get((table, columns[0])) if len(columns) == 1
+                                     else None, columns in unique_keys[table]) for columns in self._index_keys(table))
+                       for table in self._table_names}
+        return TableVersion(tables, table_columns, index_specs)
+
+    def _publish(self):
+        """
+        snapshot threading mode: the rows in memory, which are now those of the files, become the published version,
+        and the next changes are made on a copy of it.
+        """
+        if self._threading_mode != DatabaseConfig.THREADING_SNAPSHOT:
+            return
+        self._version.set_fingerprint(self._fingerprint)
+        self._published = self._version
+        self._version = self._version.copy()
+
+    def _stat_fingerprint(self):
+        # mtime_ns, size and inode together identify one version of the data file
+        return self._fingerprint_of(os.stat(self._file_path))
+
+    @staticmethod
+    def _fingerprint_of(stat):
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _index_name(self, table, columns):
+        # name of an index in the index file, a normalized index has another name than a plain one
+        name = f"{table}:{','.join(columns)}"
+        if len(columns) == 1 and (table, columns[0]) in self._normalizers:
+            name += ":normalized"
+        return name
+
+    def _write_index_file(self, generation, scanned):
+        """
+        write the index file of the data file version that was just parsed.
+        a failure only costs the next cold start a full parse, so it does not fail the load.
+
+        :param generation:  fingerprint of the parsed data file
+        :param scanned:     result of TableStream.scan_json
+        """
+        indexes = {}
+        for table, (rows, offsets, lengths) in scanned.items():
+            for columns in self._index_keys(table):
+                keys = list(map(operator.itemgetter(*[self.column_index(table, column) for column in columns]), rows))
+                normalize = self._normalizers.get((table, columns[0])) if len(columns) == 1 else None
+                if normalize is not None:
+                    keys = list(map(normalize, keys))
+                indexes[self._index_name(table, columns)] = (keys, offsets, lengths)
+        try:
+            self._index_file.write(generation, indexes)
+        except OSError:
+            pass
+
+    def _is_log_growth(self, fingerprint):
+        # data file unchanged, and log is the same file as before with more bytes appended
+        if self._fingerprint is None or fingerprint[0] != self._fingerprint[0]:
+            return False
+        old_log, new_log = self._fingerprint[1], fingerprint[1]
+        if old_log is None:
+            return True
+        return new_log is not None and new_log[2] == old_log[2] and new_log[1] >= old_log[1]
+
+    def _release_mapping(self):
+        # rows still backed by the mapping are decoded first
+        if self._mapping is None:
+            return
+        for table in self._table_names:
+            self.get_rows(table)
+        # a published version may still be mapped, it is unmapped once no MappedTable uses it any more
+        if self._threading_mode != DatabaseConfig.THREADING_SNAPSHOT:
+            self._mapping.close()
+        self._mapping = None
+
+    def _read_mapped(self):
+        """
+        map a binary data file and index its column blocks, nothing is decoded yet.
+
+        :return: False if the file is not a binary data file
+        """
+        with open(self._file_path, 'rb') as file:
+            if not BinaryFormat.is_binary(file.read(len(BinaryFormat.MAGIC))):
+                return False
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # the previous mapping is unmapped once no MappedTable uses it any more
+        self._mapping = mapping
+        offsets = BinaryFormat.index(mapping)
+        tables = {}
+        for table in self._table_names:
+            row_count, column_offsets = offsets.get(table, (0, {}))
+            tables[table] = MappedTable(mapping, row_count, column_offsets, self.TABLE_COLUMNS[table])
+        self._version = self._new_version(tables)
+        return True
+
+    def _read_checkpoint(self):
+        # step 0: mmap read mode decodes binary data files lazily
+        if self._read_mode == DatabaseConfig.READ_MMAP and self._read_mapped():
+            return
+
+        # step 1: load all data from the data file
+        with open(self._file_path, 'rb') as file:
+            content = file.read()
+            generation = self._fingerprint_of(os.fstat(file.fileno()))
+
+        # step 2: a lookup found the index file outdated, rebuild it while parsing
+        table_columns = {table: self.TABLE_COLUMNS[table] for table in self._table_names}
+        if self._rebuild_index and content and not BinaryFormat.is_binary(content):
+            self._rebuild_index = False
+            try:
+                scanned = TableStream.scan_json(content, table_columns)
+            except CorruptDataException as e:
+                raise self._corrupt(e) from e
+            if scanned is not None:
+                self._version = self._new_version({table: rows for table, (rows, _, _) in scanned.items()})
+                self._write_index_file(generation, scanned)
+                return
+
+        # step 3: parse binary or json content to row tuples
+        # ** Note ** rows are immutable tuples, entities are created on read, so callers never modify the cache.
+        self._version = self._decode_version(content)
+
+    def _corrupt(self, error):
+        # CorruptDataException of a damaged JSON data file, naming the file and how to read it again
+        return CorruptDataException(f"corrupt data file {self._file_path}: {error}, "
+                                    f"Database.recover keeps the rows that pass their checksums")
+
+    def _decode_version(self, content):
+        # TableVersion of the whole content of a data file, binary or json
+        table_columns = {table: self.TABLE_COLUMNS[table] for table in self._table_names}
+        if BinaryFormat.is_binary(content):
+            return self._new_version(BinaryFormat.decode(content, table_columns))
+
+        try:
+            return self._new_version(JsonFormat.decode(content, table_columns))
+        except CorruptDataException as e:
+            raise self._corrupt(e) from e
@@ -0,0 +1,110 @@
+import operator
+
+
+class TableIndex:
+    """
+    hash index of one table on one or more columns.
+    the key of a single column index is the column value, otherwise the tuple of the column values.
+    a unique index maps a key to its row, a non-unique index maps a key to its rows in table order.
+    the rows of a key are replaced, never changed, so a copy of the index can share them.
+
+    Fields:
+        _key_of         function from a row tuple to its key
+        _normalize      function applied to single column keys, e.g. case folding, or None
+        _unique         True for primary and unique keys
+        _entries        key -> row tuple if unique, otherwise key -> dict of row tuples used as ordered set
+    Methods:
+        build:      index all rows of a table
+        key_of:     key of a row
+        get:        row with a key, or None, unique index only
+        get_all:    rows with a key, in table order
+        count:      number of rows with a key
+        add:        index a row, in a unique index replacing the row with the same key
+        remove:     drop a row
+        copy:       index with the same entries, changes of one do not affect the other
+    """
+
+    def __init__(self, positions, normalize=None, unique=True):
+        getter = operator.itemgetter(*positions)
+        self._key_of = getter if normalize is None else lambda row: normalize(getter(row))
+        self._normalize = normalize
+        self._unique = unique
+        self._entries = {}
+
+    @classmethod
+    def build(cls, positions, rows, normalize=None, unique=True):
+        """
+        :param positions:   positions of the indexed columns in the row tuples
+        :param rows:        rows of the table, for equal keys of a unique index the last row wins
+        :param normalize:   function applied to the keys, only for single column indexes
+        :param unique:      False to index several rows per key
+        :return: TableIndex
+        """
+        index = cls(positions, normalize, unique)
+        if unique:
+            index._entries = dict(zip(map(index._key_of, rows), rows))
+        else:
+            entries = index._entries
+            for row in rows:
+                entries.setdefault(index._key_of(row), {})[row] = None
+        return index
+
+    def is_unique(self):
+        # getter for _unique
+        return self._unique
+
+    def key_of(self, row):
+        return self._key_of(row)
+
+    def get(self, key):
+        return self._entries.get(self._normalized(key))
+
+    def get_all(self, key):
+        entry = self._entries.get(self._normalized(key))
+        if entry is None:
+            return []
+        return [entry] if self._unique else list(entry)
+
+    def count(self, key):
+        entry = self._entries.get(self._normalized(key))
+        if entry is None:
+            return 0
+        return 1 if self._unique else len(entry)
+
+    def add(self, row):
+        key = self._key_of(row)
+        if self._unique:
+            self._entries[key] = row
+        else:
+            entry = dict(self._entries.get(key, ()))
+            entry[row] = None
+            self._entries[key] = entry
+
+    def remove(self, row):
+        # in a unique index only if the key still refers to this row, another row with an equal key stays indexed
+        key = self._key_of(row)
+        entry = self._entries.get(key)
+        if self._unique:
+            if entry is row:
+                del self._entries[key]
+        elif entry is not None and row in entry:
+            if len(entry) == 1:
+                del self._entries[key]
+            else:
+                entry = dict(entry)
+                del entry[row]
+                self._entries[key] = entry
+
+    def copy(self):
+        index = TableIndex.__new__(TableIndex)
+        index._key_of = self._key_of
+        index._normalize = self._normalize
+        index._unique = self._unique
+        index._entries = dict(self._entries)
+        return index
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _normalized(self, key):
+        return key if self._normalize is None else self._normalize(key)
@@ -0,0 +1,155 @@
+import contextlib
+import gc
+import operator
+import threading
+
+
+class TableReplay:
+    """
+    applies a long run of change records, e.g. a log replayed on load, to the rows of one table in O(1) per record.
+    TableVersion also keys the rows of a changed table by primary key, but a delete by other columns without an
+    index scans the table. here those deletes are hash lookups in groups of the rows by the where columns,
+    a changed row moves to the end like TableFile.apply does, and the row list is built once.
+        replay = TableReplay(columns, key_columns, normalizers, rows)
+        for record in records:
+            replay.apply(record)
+        rows = replay.get_rows()
+
+    Fields:
+        _columns        column names in row tuple order
+        _key_of         function of a row tuple -> its primary key, the value of a single key column or a tuple
+        _where_key      function of the where dict of a record -> the primary key it names
+        _key_columns    primary key column names
+        _positions      column name -> position in the row tuple
+        _normalizers    column name -> function applied to the values of a single column key, e.g. case folding
+        _rows           primary key -> row tuple, in table order
+        _groups         tuple of where columns -> (function of a row tuple -> their values,
+                        {their values -> dict of primary keys}), built by the first delete by those columns
+    Methods:
+        apply:      apply one change record, see WriteAheadLog
+        get_rows:   the rows after all records, as list of tuples
+        paused_gc:  context manager for parsing and replaying a log without cyclic garbage collection
+    """
+
+    def __init__(self, columns, key_columns, normalizers, rows):
+        self._columns = columns
+        self._key_columns = key_columns
+        self._positions = {column: position for position, column in enumerate(columns)}
+        self._key_of = self._getter(key_columns)
+        self._where_key = operator.itemgetter(*key_columns)
+        self._normalizers = normalizers
+        self._rows = {self._key_of(row): row for row in rows}
+        self._groups = {}
+
+    def get_rows(self):
+        return list(self._rows.values())
+
+    # replays of the shards run on several threads, the collector is paused by the first and resumed by the last
+    _gc_lock = threading.Lock()
+    _gc_pauses = 0
+    _gc_was_enabled = False
+
+    @classmethod
+    @contextlib.contextmanager
+    def paused_gc(cls):
+        """
+        a replay creates millions of records and rows without reference cycles, and every collection scans them all
+        again, which more than doubles the time of a large replay. the collector is paused for the whole process
+        meanwhile and resumed when the last concurrent replay ends, unless it was paused before the first one.
+        """
+        with cls._gc_lock:
+            if cls._gc_pauses == 0:
+                cls._gc_was_enabled = gc.isenabled()
+                gc.disable()
+            cls._gc_pauses += 1
+        try:
+            yield
+        finally:
+            with cls._gc_lock:
+                cls._gc_pauses -= 1
+                if cls._gc_pauses == 0 and cls._gc_was_enabled:
+                    gc.enable()
+
+    def apply(self, record):
+        """
+        :param record:  change record of this table
+        :return: False if it changed nothing, e.g. deleting a missing row
+        """
+        op = record["op"]
+        if op == "delete":
+            return self._delete(record["where"])
+
+        rows = self._rows
+        if op == "patch":
+            key = self._where_key(record["where"])
+            old_row = rows.get(key)
+            if old_row is None:
+                return False
+            row = list(old_row)
+            for column, value in record["set"].items():
+                row[self._positions[column]] = value
+            row = tuple(row)
+        else:
+            values = record["row"]
+            row = tuple([values.get(column) for column in self._columns])
+            key = self._key_of(row)
+
+        # insert, update and patch replace the row with the same primary key, and move it to the end
+        if not self._groups:
+            rows.pop(key, None)
+            rows[key] = row
+            return True
+        if key in rows:
+            self._remove(key)
+        self._add(key, row)
+        return True
+
+    def _delete(self, where):
+        columns = tuple(where)
+        if set(columns) == set(self._key_columns):
+            key = self._where_key(where)
+            if key not in self._rows:
+                return False
+            self._remove(key)
+            return True
+
+        keys = self._group(columns).get(self._normalize(columns, operator.itemgetter(*columns)(where)))
+        if not keys:
+            return False
+        for key in list(keys):
+            self._remove(key)
+        return True
+
+    def _group(self, columns):
+        # rows by the values of the where columns, built on first use
+        entry = self._groups.get(columns)
+        if entry is None:
+            values_of = self._getter(columns)
+            entry = (values_of, {})
+            for key, row in self._rows.items():
+                entry[1].setdefault(self._normalize(columns, values_of(row)), {})[key] = None
+            self._groups[columns] = entry
+        return entry[1]
+
+    def _add(self, key, row):
+        self._rows[key] = row
+        for columns, (values_of, group) in self._groups.items():
+            group.setdefault(self._normalize(columns, values_of(row)), {})[key] = None
+
+    def _remove(self, key):
+        row = self._rows.pop(key)
+        for columns, (values_of, group) in self._groups.items():
+            values = self._normalize(columns, values_of(row))
+            keys = group[values]
+            del keys[key]
+            if not keys:
+                del group[values]
+
+    def _normalize(self, columns, values):
+        # a single column key with a normalizer is compared like its TableIndex does
+        normalize = self._normalizers.get(columns[0]) if len(columns) == 1 else None
+        return normalize(values) if normalize is not None else values
+
+    def _getter(self, columns):
+        # function of a row tuple -> value of a single column, tuple of the values of several columns
+        return operator.itemgetter(*[self._positions[column] for column in columns])
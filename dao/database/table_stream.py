@@ -0,0 +1,261 @@
+import codecs
+import itertools
+import json
+import re
+import sys
+from array import array
+
+from dao.database.binary_format import BinaryFormat
+from dao.database.json_format import JsonFormat
+from util.exception import CorruptDataException, DataAccessException
+
+
+class JsonStreamReader:
+    """
+    incremental reader of a JSON document from a binary stream, only the current value is kept in memory.
+
+    Fields:
+        _stream         object with read(size) returning bytes
+        _buffer         decoded text that has been read but not consumed
+        _position       position of the next unconsumed character in _buffer
+        _eof            True once the stream is exhausted
+    Methods:
+        next_char:      skip whitespace and peek the next character, None at the end
+        consume:        consume one expected character
+        read_value:     parse and consume one JSON value
+        iter_array:     parse and consume an array, yielding one element at a time
+    """
+
+    BLOCK_SIZE = 1 << 16
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+        # keeps incomplete multi-byte characters at the end of a block
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def next_char(self):
+        while True:
+            self._position = self.WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return None
+
+    def consume(self, expected):
+        char = self.next_char()
+        if char != expected:
+            raise CorruptDataException(f"invalid JSON: expected '{expected}', got '{char}'")
+        self._position += 1
+
+    def read_value(self):
+        while True:
+            self.next_char()
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+                # a value that ends with the buffer may be cut, e.g. a number, unless the stream is exhausted
+                if end < len(self._buffer) or self._eof:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise CorruptDataException(f"invalid JSON: {e}")
+            self._fill()
+
+    def iter_array(self):
+        self.consume("[")
+        if self.next_char() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self.read_value()
+            char = self.next_char()
+            self._position += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise CorruptDataException(f"invalid JSON array: unexpected '{char}'")
+
+    def _fill(self):
+        data = self._stream.read(self.BLOCK_SIZE)
+        if not data:
+            self._eof = True
+            return False
+        # drop the consumed text, so the buffer stays about one block large
+        self._buffer = self._buffer[self._position:] + self._utf8.decode(data)
+        self._position = 0
+        return True
+
+
+class MappedRegion:
+    """
+    file-like read access to a part of an mmap, without copying the whole part.
+    """
+
+    def __init__(self, content, start, end):
+        self._content = content
+        self._position = start
+        self._end = end
+
+    def read(self, size):
+        data = self._content[self._position:min(self._position + size, self._end)]
+        self._position += len(data)
+        return data
+
+
+class TableStream:
+    """
+    incremental parsers that yield the rows of one table in chunks, for JSON and binary data files.
+    the memory used is one chunk plus a read block, whatever the size of the table.
+
+    Methods:
+        iter_json_table:    row chunks of a table of a JSON data file
+        iter_binary_table:  row chunks of a table of a binary data file (bytes or mmap)
+        iter_list:          row chunks of rows that are already in memory
+        scan_json:          all rows of a JSON data file with the byte location of each row, for IndexFile
+    """
+
+    BLOCK_SIZE = 1 << 16
+    OPEN_BRACE = re.compile(rb"\{")
+    CLOSE_BRACE = re.compile(rb"\}")
+
+    @classmethod
+    def iter_json_table(cls, stream, table, columns, chunk_size):
+        """
+        :param stream:      binary file of a JSON data file, positioned at the start
+        :param table:       table name
+        :param columns:     column names in row tuple order
+        :param chunk_size:  rows per chunk
+        """
+        reader = JsonStreamReader(stream)
+        if reader.next_char() is None:
+            return
+        reader.consume("{")
+        if reader.next_char() == "}":
+            return
+
+        # the version comes first, rows of a file with checksums are checked, see JsonFormat
+        checked = False
+        while True:
+            key = reader.read_value()
+            reader.consume(":")
+            if key == table:
+                rows = (JsonFormat.row_of(item, columns, checked) for item in reader.iter_array())
+                yield from cls.iter_chunks(rows, chunk_size)
+                return
+
+            # other tables are skipped element by element
+            if reader.next_char() == "[":
+                for _ in reader.iter_array():
+                    pass
+            elif key == JsonFormat.VERSION_KEY:
+                checked = JsonFormat.check_file({key: reader.read_value()}, {})
+            else:
+                reader.read_value()
+
+            char = reader.next_char()
+            reader.consume(char)
+            if char == "}":
+                if checked:
+                    raise CorruptDataException(f"tables missing: {table}")
+                return
+            if char != ",":
+                raise CorruptDataException(f"invalid JSON object: unexpected '{char}'")
+
+    @classmethod
+    def iter_binary_table(cls, content, table, columns, chunk_size):
+        """
+        :param content:     bytes or mmap of a binary data file
+        :param table:       table name
+        :param columns:     column names in row tuple order
+        :param chunk_size:  rows per chunk
+        """
+        row_count, column_offsets = BinaryFormat.index(content).get(table, (0, {}))
+        if not row_count:
+            return
+        values = [cls._iter_column(content, column_offsets[column]) if column in column_offsets
+                  else itertools.repeat(None, row_count) for column in columns]
+        yield from cls.iter_chunks(zip(*values), chunk_size)
+
+    @classmethod
+    def scan_json(cls, content, table_columns):
+        """
+        parse a whole JSON data file and keep where each row is, so a single row can be read back later.
+        rows are flat objects, so if every brace of the file belongs to a row or to the top-level object,
+        the i-th row is between the i-th "{" and the i-th "}" after the top-level ones.
+
+        :param content:         bytes of a JSON data file
+        :param table_columns:   dict of table name -> column names in row tuple order
+        :return: dict of table name -> (row tuples, byte offsets, byte lengths) of the tables in table_columns,
+                 None if a brace is part of a value, e.g. a name with "{"
+        """
+        try:
+            data = json.loads(content) if content else {}
+        except ValueError as e:
+            raise CorruptDataException(f"invalid JSON: {e}") from e
+        checked = JsonFormat.check_file(data, table_columns)
+        row_count = sum(len(value) for value in data.values() if isinstance(value, list))
+        if content.count(b"{") != row_count + 1 or content.count(b"}") != row_count + 1:
+            return None
+        starts = [match.start() for match in cls.OPEN_BRACE.finditer(content)][1:]
+        ends = [match.end() for match in cls.CLOSE_BRACE.finditer(content)][:-1]
+
+        tables = {table: ([], [], []) for table in table_columns}
+        position = 0
+        for table, value in data.items():
+            if not isinstance(value, list):
+                continue
+            if table in table_columns:
+                columns = table_columns[table]
+                offsets = starts[position:position + len(value)]
+                tables[table] = ([JsonFormat.row_of(item, columns, checked) for item in value], offsets,
+                                 [end - start for start, end in zip(offsets, ends[position:position + len(value)])])
+            position += len(value)
+        return tables
+
+    @staticmethod
+    def iter_list(rows, chunk_size):
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    @staticmethod
+    def iter_chunks(rows, chunk_size):
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @classmethod
+    def _iter_column(cls, content, column_offset):
+        # values of one column block, read one block at a time after its checksum is verified
+        BinaryFormat.check_column(content, column_offset)
+        kind, offset, length, _ = column_offset
+        end = offset + length
+
+        if kind == BinaryFormat.KIND_INT:
+            step = cls.BLOCK_SIZE
+            for start in range(offset, end, step):
+                numbers = array("q")
+                numbers.frombytes(content[start:min(start + step, end)])
+                if sys.byteorder == "big":
+                    numbers.byteswap()
+                yield from numbers.tolist()
+        elif kind == BinaryFormat.KIND_STR:
+            # the separator byte never occurs inside a multi-byte UTF-8 character
+            separator = BinaryFormat.SEPARATOR.encode("utf-8")
+            rest = b""
+            for start in range(offset, end, cls.BLOCK_SIZE):
+                pieces = (rest + content[start:min(start + cls.BLOCK_SIZE, end)]).split(separator)
+                rest = pieces.pop()
+                for piece in pieces:
+                    yield piece.decode("utf-8")
+            yield rest.decode("utf-8")
+        elif kind == BinaryFormat.KIND_JSON:
+            yield from JsonStreamReader(MappedRegion(content, offset, end)).iter_array()
+        else:
+            raise DataAccessException(f"unknown column kind: {kind}")
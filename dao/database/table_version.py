@@ -0,0 +1,212 @@
+from dao.database.mapped_table import MappedTable
+from dao.database.table_index import TableIndex
+from dao.database.table_stream import TableStream
+
+
+class TableVersion:
+    """
+    rows and indexes of the tables of one TableFile at one version of its files.
+    in snapshot threading mode TableFile publishes a version after every load and commit, a published version is
+    never changed again, so threads query it without lock. the writer works on a copy of it, which shares the rows
+    and indexes of each table until its first change of that table.
+    a change of a table is O(1): the first one keys its rows by primary key in a dict in table order, changes are
+    made to the dict and its indexes, and the row list is built again by the next get_rows.
+
+    Fields:
+        _table_columns  table -> column names in row tuple order
+        _index_specs    table -> tuple of (key columns, normalize function or None, unique) of its TableIndexes
+        _tables         table -> list of row tuples, or MappedTable until the rows are needed,
+                        None if the table changed since the list was built from _keyed
+        _keyed          table -> dict of primary key -> row tuple in table order, built on first change
+        _indexes        table -> dict of key columns -> TableIndex, built on first use
+        _owned          tables whose rows and indexes belong to this version only, the others may be shared
+        _fingerprint    stat fingerprints of data file and log this version was published for
+    Methods:
+        get_rows, iter_rows, find_indexed, count_rows, table_indexes:
+                        queries, also on a published version, they only fill caches of equal content
+        copy:           unpublished version sharing all rows and indexes
+        set_rows, add_row, delete_rows:
+                        changes, the keyed rows and indexes of the table are copied first if they are shared
+    """
+
+    def __init__(self, tables, table_columns, index_specs):
+        self._table_columns = table_columns
+        self._index_specs = index_specs
+        self._tables = tables
+        self._indexes = {}
+        self._keyed = {}
+        self._owned = set(tables)
+        self._fingerprint = None
+
+    def get_fingerprint(self):
+        # getter for _fingerprint
+        return self._fingerprint
+
+    def set_fingerprint(self, fingerprint):
+        # setter for _fingerprint
+        self._fingerprint = fingerprint
+
+    def get_rows(self, table):
+        rows = self._tables[table]
+        if rows is None:
+            # a new list, so a list handed out before, e.g. to iter_rows, stays unchanged
+            rows = list(self._keyed[table].values())
+            self._tables[table] = rows
+        elif isinstance(rows, MappedTable):
+            rows = rows.rows()
+            self._tables[table] = rows
+        return rows
+
+    def iter_rows(self, table, chunk_size):
+        # rows of one table in chunks of the list, see TableFile.iter_rows
+        return TableStream.iter_list(self.get_rows(table), chunk_size)
+
+    def is_mapped(self, table):
+        return isinstance(self._tables[table], MappedTable)
+
+    def find_indexed(self, table, columns, key):
+        """
+        rows whose columns equal key, in table order.
+
+        :param table:   table name
+        :param columns: tuple of column names, e.g. a primary, unique or secondary key of TableFile
+        :param key:     value of a single column, or tuple of values in the order of columns
+        :return: list of row tuples
+        """
+        rows = self._tables[table]
+        if isinstance(rows, MappedTable):
+            spec = self._spec(table, columns)
+            if spec is not None and len(columns) == 1 and (spec[1] is not None or spec[2]):
+                row = rows.find(columns[0], key, spec[1])
+                return [row] if row is not None else []
+            # rows of the first column, then the other columns
+            first_key = key if len(columns) == 1 else key[0]
+            positions = self._positions(table, columns)
+            return [row for row in rows.find_all(columns[0], first_key) if self.key_of(row, positions) == key]
+
+        index = self.table_indexes(table).get(columns)
+        if index is not None:
+            return index.get_all(key)
+        positions = self._positions(table, columns)
+        return [row for row in self.get_rows(table) if self.key_of(row, positions) == key]
+
+    def count_rows(self, table, column, value):
+        # number of rows whose column equals value
+        rows = self._tables[table]
+        if isinstance(rows, MappedTable):
+            return rows.count(column, value)
+        index = self.table_indexes(table).get((column,))
+        if index is not None:
+            return index.count(value)
+        position = self._table_columns[table].index(column)
+        return sum(1 for row in self.get_rows(table) if row[position] == value)
+
+    def table_indexes(self, table):
+        """
+        indexes of the primary, unique and secondary keys of a table, the rows are decoded if they are still mapped.
+
+        :return: dict of key columns -> TableIndex
+        """
+        indexes = self._indexes.get(table)
+        if indexes is None:
+            rows = self.get_rows(table)
+            indexes = {columns: TableIndex.build(self._positions(table, columns), rows, normalize, unique)
+                       for columns, normalize, unique in self._index_specs[table]}
+            self._indexes[table] = indexes
+        return indexes
+
+    def copy(self):
+        version = TableVersion(dict(self._tables), self._table_columns, self._index_specs)
+        version._indexes = dict(self._indexes)
+        version._keyed = dict(self._keyed)
+        version._owned = set()
+        return version
+
+    def set_rows(self, table, rows):
+        self._tables[table] = rows
+        self._indexes.pop(table, None)
+        self._keyed.pop(table, None)
+        self._owned.add(table)
+
+    def add_row(self, table, row):
+        # a row with the same primary key is replaced, the row moves to the end like on delete and add
+        keyed = self._keyed_rows(table)
+        indexes = self._indexes[table]
+        key = self._primary_index(table).key_of(row)
+        old_row = keyed.pop(key, None)
+        for index in indexes.values():
+            if old_row is not None:
+                index.remove(old_row)
+            index.add(row)
+        keyed[key] = row
+        self._tables[table] = None
+
+    def delete_rows(self, table, where):
+        """
+        remove the rows that match all columns of where, a where on the columns of an index is a hash lookup.
+
+        :param table:   table name
+        :param where:   dict of column name -> value
+        :return: True if any row was removed
+        """
+        indexes = self.table_indexes(table)
+        columns = next((columns for columns in indexes if set(columns) == set(where)), None)
+        if columns is not None:
+            key = where[columns[0]] if len(columns) == 1 else tuple(where[column] for column in columns)
+            matched = indexes[columns].get_all(key)
+        else:
+            conditions = [(self._table_columns[table].index(column), value) for column, value in where.items()]
+            matched = [row for row in self.get_rows(table)
+                       if all(row[position] == value for position, value in conditions)]
+        if not matched:
+            return False
+
+        keyed = self._keyed_rows(table)
+        key_of = self._primary_index(table).key_of
+        for row in matched:
+            key = key_of(row)
+            if keyed.get(key) is row:
+                del keyed[key]
+            for index in self._indexes[table].values():
+                index.remove(row)
+        self._tables[table] = None
+        return True
+
+    @staticmethod
+    def key_of(row, positions):
+        # value of a single column key, or tuple of values
+        if len(positions) == 1:
+            return row[positions[0]]
+        return tuple(row[position] for position in positions)
+
+    def _keyed_rows(self, table):
+        # rows of a table by primary key, owned by this version, its indexes are built and owned as well
+        self._own(table)
+        indexes = self.table_indexes(table)
+        keyed = self._keyed.get(table)
+        if keyed is None:
+            key_of = indexes[self._index_specs[table][0][0]].key_of
+            keyed = {key_of(row): row for row in self.get_rows(table)}
+            self._keyed[table] = keyed
+        return keyed
+
+    def _own(self, table):
+        # copy keyed rows and indexes of a table that may be shared with a published version, the row list is
+        # never changed, so it stays shared
+        if table in self._owned:
+            return
+        if table in self._keyed:
+            self._keyed[table] = dict(self._keyed[table])
+        if table in self._indexes:
+            self._indexes[table] = {columns: index.copy() for columns, index in self._indexes[table].items()}
+        self._owned.add(table)
+
+    def _primary_index(self, table):
+        # the primary key comes first in the index specs, see TableFile._unique_keys
+        return self.table_indexes(table)[self._index_specs[table][0][0]]
+
+    def _spec(self, table, columns):
+        return next((spec for spec in self._index_specs[table] if spec[0] == columns), None)
+
+    def _positions(self, table, columns):
+        return [self._table_columns[table].index(column) for column in columns]
@@ -0,0 +1,144 @@
+import json
+import os
+import zlib
+
+
+class WriteAheadLog:
+    """
+    append-only change log that sits next to the data file.
+    each line is the CRC32 of a record as 8 hex digits, a space, and the record as compact JSON, e.g. for a single
+    insert, update or delete:
+        {"op": "insert", "table": "students", "row": {...}}
+        {"op": "update", "table": "subjects", "row": {...}}
+        {"op": "delete", "table": "subjects", "where": {"student_id": "..."}}
+        {"op": "patch", "table": "subjects", "where": {"student_id": "...", "subject_id": "..."}, "set": {"mark": 80}}
+    records written together are one batch line, a torn batch is ignored as a whole:
+        {"op": "batch", "records": [...]}
+    replay stops at the first line that is no complete record with a matching checksum, e.g. the torn tail of a
+    crash or bytes damaged on disk, and the next append cuts the log off there, see TableFile.recover.
+    lines of older logs start with "{" and have no checksum, they are still replayed.
+
+    Fields:
+        _log_file_path      log file, by default the data file path with ".wal" suffix
+        _file_sync          FileSync that appends to the log according to the fsync policy
+    Methods:
+        append:         append records to the end of the log
+        replay:         read valid records starting from a byte offset
+        truncate:       cut the log off after the last valid record
+        encode:         line of one record
+        fingerprint:    stat fingerprint (mtime_ns, size, inode) of the log, None if it does not exist
+        delete:         remove the log file, called after a checkpoint has been written
+    """
+
+    def __init__(self, log_file_path, file_sync):
+        self._log_file_path = log_file_path
+        self._file_sync = file_sync
+
+    def get_log_file_path(self):
+        # getter for _log_file_path
+        return self._log_file_path
+
+    def append(self, records):
+        """
+        append records to the log, the cost only depends on the size of the records.
+        several records are one batch line, so replay sees either all of them or none.
+
+        :param records: list of change records
+        """
+        if len(records) > 1:
+            records = [{"op": "batch", "records": records}]
+        lines = "".join(map(self.encode, records))
+        self._file_sync.append(self._log_file_path, lines)
+
+    def replay(self, offset=0):
+        """
+        read all valid records after offset.
+        a trailing line without newline is a torn append from a crash, it is ignored and not consumed.
+        a line with a wrong checksum or no complete record ends the replay, it and all lines after it are not consumed.
+
+        :param offset:  byte offset of the first unread record
+        :return: (records, new offset), the offset is the end of the last valid record
+        """
+        if not os.path.exists(self._log_file_path):
+            return [], 0
+
+        with open(self._log_file_path, 'rb') as file:
+            file.seek(offset)
+            content = file.read()
+
+        # step 1: the checksums, line by line
+        crc32 = zlib.crc32
+        end = content.rfind(b"\n") + 1
+        payloads, ends = [], []
+        position = 0
+        for line in content[:end].split(b"\n")[:-1]:
+            position += len(line) + 1
+            if not line:
+                continue
+            if line[:1] == b"{":
+                # no checksum in older logs
+                payloads.append(line)
+            elif line[8:9] == b" " and self._checksum(line) == crc32(line[9:]):
+                payloads.append(line[9:])
+            else:
+                break
+            ends.append(position)
+
+        # step 2: the records of all valid lines at once
+        parsed = self._parse(payloads)
+        records = []
+        for record in parsed:
+            if record["op"] == "batch":
+                records.extend(record["records"])
+            else:
+                records.append(record)
+        return records, offset + (ends[len(parsed) - 1] if parsed else 0)
+
+    def truncate(self, offset):
+        # drop everything after offset, the end of the last valid record from @replay
+        self._file_sync.truncate(self._log_file_path, offset)
+
+    def fingerprint(self):
+        if not os.path.exists(self._log_file_path):
+            return None
+        stat = os.stat(self._log_file_path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def delete(self):
+        if os.path.exists(self._log_file_path):
+            os.remove(self._log_file_path)
+
+    @staticmethod
+    def encode(record):
+        # one line of the log with its checksum
+        payload = json.dumps(record, separators=(',', ':'))
+        return f"{zlib.crc32(payload.encode('utf-8')):08x} {payload}\n"
+
+    @staticmethod
+    def _checksum(line):
+        # checksum written at the start of a line, None if it is no hex number
+        try:
+            return int(line[:8], 16)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parse(payloads):
+        # records of the payloads up to the first one that is no complete record, one json.loads for all of them
+        try:
+            records = json.loads(b"[" + b",".join(payloads) + b"]")
+            if len(records) == len(payloads) and all(type(record) is dict and "op" in record for record in records):
+                return records
+        except ValueError:
+            pass
+
+        records = []
+        for payload in payloads:
+            try:
+                record = json.loads(payload)
+            except ValueError:
+                break
+            if not isinstance(record, dict) or "op" not in record:
+                break
+            records.append(record)
+        return records
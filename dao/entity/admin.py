@@ -7,6 +7,8 @@ class Admin:
         _staff_id
         _staff_name
         _staff_email
+        _dirty_fields
+        _loaded
     Methods:
         1. must override following 4 methods.
             __init__    for definition a full parameters constructor
@@ -24,6 +26,11 @@ class Admin:
         3. must include two special method for JSON transmission
             to_dict
             from_dict
+        4. dirty tracking, each setter marks its column of to_dict as changed.
+            from_row            creates an entity from a row read by the database, its changes are tracked
+            is_loaded           whether the setters are tracked against a stored row, see from_row
+            get_dirty_fields    columns changed since the entity was loaded or last saved
+            mark_clean          forget the changes once they are saved
     """
 
     def __init__(self, staff_id, staff_name, staff_email):
@@ -34,6 +41,13 @@ class Admin:
         # _staff_email is the staff formal email
         self._staff_email = staff_email
 
+        # _dirty_fields are the to_dict columns changed by setters since the entity was loaded or last saved
+        self._dirty_fields = set()
+
+        # _loaded is set for an entity read from the database or saved whole, only then the columns not in
+        # _dirty_fields are those of its stored row, a new entity is always saved whole
+        self._loaded = False
+
     def get_staff_id(self):
         # getter for staff_id
         return self._staff_id
@@ -41,6 +55,7 @@ class Admin:
     def set_staff_id(self, staff_id):
         # setter for staff_id
         self._staff_id = staff_id
+        self._dirty_fields.add("id")
 
     def get_staff_name(self):
         # getter of staff_name
@@ -49,6 +64,7 @@ class Admin:
     def set_staff_name(self, staff_name):
         # setter of staff_name
         self._staff_name = staff_name
+        self._dirty_fields.add("name")
 
     def get_staff_email(self):
         # getter of staff_email
@@ -57,6 +73,20 @@ class Admin:
     def set_staff_email(self, staff_email):
         # setter of staff_email
         self._staff_email = staff_email
+        self._dirty_fields.add("email")
+
+    def is_loaded(self):
+        # getter for _loaded
+        return self._loaded
+
+    def get_dirty_fields(self):
+        # columns of to_dict changed by the setters since the entity was loaded or last saved
+        return set(self._dirty_fields)
+
+    def mark_clean(self):
+        # called once the changes are saved, the entity now equals its stored row
+        self._dirty_fields.clear()
+        self._loaded = True
 
     def __eq__(self, other):
         """
@@ -89,7 +119,9 @@ class Admin:
     def from_dict(cls, dict_data):
         return cls(dict_data['id'], dict_data['name'], dict_data['email'])
 
-
-
-
-
+    @classmethod
+    def from_row(cls, row):
+        # Admin of a row tuple read by the database, in constructor parameter order, its setters are tracked
+        entity = cls(*row)
+        entity._loaded = True
+        return entity
@@ -8,6 +8,8 @@ class Student:
         _student_name
         _student_email
         _student_password
+        _dirty_fields
+        _loaded
     Methods:
         1. must override following 4 methods.
             __init__    for definition a full parameters constructor
@@ -27,6 +29,13 @@ class Student:
         3. must include two method to convert between json string to object
             to_dict     Converts the Student object to a dictionary representation, for json conversion
             from_dict   Creates a Student object from a dictionary representation, for json conversion
+
+        4. dirty tracking, each setter marks its column of to_dict as changed.
+            from_row            creates an entity from a row read by the database, its changes are tracked
+            is_loaded           whether the setters are tracked against a stored row, see from_row
+            get_dirty_fields    columns changed since the entity was loaded or last saved,
+                                e.g. Database.update_student only writes those of a loaded entity
+            mark_clean          forget the changes once they are saved
     """
 
     def __init__(self, student_id, student_name, student_email, student_password,
@@ -58,6 +67,13 @@ class Student:
         # ** Note ** default value is empty array.
         self._subject_list = subject_list
 
+        # _dirty_fields are the to_dict columns changed by setters since the entity was loaded or last saved
+        self._dirty_fields = set()
+
+        # _loaded is set for an entity read from the database or saved whole, only then the columns not in
+        # _dirty_fields are those of its stored row, a new entity is always saved whole
+        self._loaded = False
+
     def get_student_id(self):
         # getter for _student_id
         return self._student_id
@@ -65,6 +81,7 @@ class Student:
     def set_student_id(self, student_id):
         # setter for _student_id
         self._student_id = student_id
+        self._dirty_fields.add("id")
 
     def get_student_name(self):
         # getter for _student_name
@@ -73,6 +90,7 @@ class Student:
     def set_student_name(self, student_name):
         # setter for _student_name
         self._student_name = student_name
+        self._dirty_fields.add("name")
 
     def get_student_email(self):
         # getter for _student_email
@@ -81,6 +99,7 @@ class Student:
     def set_student_email(self, student_email):
         # setter for _student_email
         self._student_email = student_email
+        self._dirty_fields.add("email")
 
     def get_student_password(self):
         # getter for _student_password
@@ -89,6 +108,7 @@ class Student:
     def set_student_password(self, student_password):
         # setter for _student_password
         self._student_password = student_password
+        self._dirty_fields.add("password")
 
     def get_student_category(self):
         # getter for _student_category
@@ -97,6 +117,20 @@ class Student:
     def set_student_category(self, student_category):
         # setter for _student_category
         self._student_category = student_category
+        self._dirty_fields.add("category")
+
+    def is_loaded(self):
+        # getter for _loaded
+        return self._loaded
+
+    def get_dirty_fields(self):
+        # columns of to_dict changed by the setters since the entity was loaded or last saved
+        return set(self._dirty_fields)
+
+    def mark_clean(self):
+        # called once the changes are saved, the entity now equals its stored row
+        self._dirty_fields.clear()
+        self._loaded = True
 
     def __eq__(self, other):
         """
@@ -158,3 +192,10 @@ class Student:
             dict_data['password'],
             dict_data['category']
         )
+
+    @classmethod
+    def from_row(cls, row):
+        # Student of a row tuple read by the database, in constructor parameter order, its setters are tracked
+        entity = cls(*row)
+        entity._loaded = True
+        return entity
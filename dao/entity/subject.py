@@ -8,6 +8,8 @@ class Subject:
         _subject_id
         _subject_grade
         _subject_mark
+        _dirty_fields
+        _loaded
 
     Methods:
         1. must override following 4 methods.
@@ -26,6 +28,12 @@ class Subject:
         3. must include two method to convert between json string to object
             to_dict     Converts the Student object to a dictionary representation, for json conversion
             from_dict   Creates a Student object from a dictionary representation, for json conversion
+        4. dirty tracking, each setter marks its column of to_dict as changed.
+            from_row            creates an entity from a row read by the database, its changes are tracked
+            is_loaded           whether the setters are tracked against a stored row, see from_row
+            get_dirty_fields    columns changed since the entity was loaded or last saved,
+                                e.g. Database.update_subject only writes those of a loaded entity
+            mark_clean          forget the changes once they are saved
     """
 
     def __init__(self, student_id, subject_id, subject_mark=None, subject_grade=None):
@@ -47,6 +55,13 @@ class Subject:
         # mark >= 85        -> HD
         self._subject_grade = subject_grade
 
+        # _dirty_fields are the to_dict columns changed by setters since the entity was loaded or last saved
+        self._dirty_fields = set()
+
+        # _loaded is set for an entity read from the database or saved whole, only then the columns not in
+        # _dirty_fields are those of its stored row, a new entity is always saved whole
+        self._loaded = False
+
     def get_student_id(self):
         # getter for _student_id
         return self._student_id
@@ -54,6 +69,7 @@ class Subject:
     def set_student_id(self, student_id):
         # setter of student_id
         self._student_id = student_id
+        self._dirty_fields.add("student_id")
 
     def get_subject_id(self):
         # getter of _subject_id
@@ -62,6 +78,7 @@ class Subject:
     def set_subject_id(self, subject_id):
         # setter of _subject_id
         self._subject_id = subject_id
+        self._dirty_fields.add("subject_id")
 
     def get_subject_mark(self):
         # getter of _subject_mark
@@ -70,6 +87,7 @@ class Subject:
     def set_subject_mark(self, subject_mark):
         # setter of _subject_mark
         self._subject_mark = subject_mark
+        self._dirty_fields.add("mark")
 
     def get_subject_grade(self):
         # getter of _subject_grade
@@ -78,6 +96,20 @@ class Subject:
     def set_subject_grade(self, subject_grade):
         # setter of _subject_grade
         self._subject_grade = subject_grade
+        self._dirty_fields.add("grade")
+
+    def is_loaded(self):
+        # getter for _loaded
+        return self._loaded
+
+    def get_dirty_fields(self):
+        # columns of to_dict changed by the setters since the entity was loaded or last saved
+        return set(self._dirty_fields)
+
+    def mark_clean(self):
+        # called once the changes are saved, the entity now equals its stored row
+        self._dirty_fields.clear()
+        self._loaded = True
 
     def __eq__(self, other):
         """
@@ -113,3 +145,10 @@ class Subject:
     @classmethod
     def from_dict(cls, dict_data):
         return cls(dict_data['student_id'], dict_data['subject_id'], dict_data['mark'], dict_data['grade'])
+
+    @classmethod
+    def from_row(cls, row):
+        # Subject of a row tuple read by the database, in constructor parameter order, its setters are tracked
+        entity = cls(*row)
+        entity._loaded = True
+        return entity
@@ -1,19 +1,58 @@
+import functools
+
 from dao.database.database import Database
 from util.exception import DataAccessException
 from util.validation import Validation
 
 
+def transactional(method):
+    """
+    decorator of DAO methods whose checks and writes are one transaction, so no other process changes the rows
+    in between. after a write conflict of optimistic concurrency the whole method runs again on the new rows.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.run_in_transaction(lambda: method(self, *args, **kwargs))
+    return wrapper
+
+
 class AbsDao:
     """
     Define an abstract class as super class to all other dao class.
     Providing a common field: _database that includes all data file operations.
+        the engine can be injected by constructor, otherwise the process-wide shared engine is used.
     Providing some basic method:
         raise_exception_if_any_empty    if any param is empty，raise data access exception
         raise_exception_if_all_empty    if all params are empty，raise data access exception
+        check_batch                     check every item of a batch, collecting or raising the failures
+        transaction                     unit of work of the engine, DAOs sharing the engine write their changes once
+        run_in_transaction              run a function in a transaction, again after a write conflict
+        snapshot                        point-in-time reads of the engine, DAOs sharing the engine read one version
+        subscribe, unsubscribe          ChangeEvents of the students and enrollments written through the engine
+    Providing the decorator transactional for DAO methods that check and write in one transaction.
     """
 
-    def __init__(self):
-        self._database = Database()
+    def __init__(self, database=None):
+        self._database = database if database is not None else Database.get_instance()
+
+    def transaction(self):
+        # with dao.transaction(): ... see Database.transaction
+        return self._database.transaction()
+
+    def run_in_transaction(self, operation):
+        # see Database.run_transaction
+        return self._database.run_transaction(operation)
+
+    def snapshot(self):
+        # with dao.snapshot(): ... see Database.snapshot
+        return self._database.snapshot()
+
+    def subscribe(self, callback, kinds=None, queued=False):
+        # see Database.subscribe, the events of all DAOs sharing the engine
+        return self._database.subscribe(callback, kinds, queued)
+
+    def unsubscribe(self, callback):
+        self._database.unsubscribe(callback)
 
     @staticmethod
     def raise_dao_exception_if_any_empty(**params):
@@ -27,3 +66,25 @@ class AbsDao:
         """if all params are empty，raise data access exception，and show them all"""
         if all(Validation.is_empty(value) for value in params.values()):
             raise DataAccessException(f"all params are empty: {', '.join(params.keys())}, please check and try again.")
+
+    @staticmethod
+    def check_batch(items, check, report_failures=False):
+        """
+        run check on every item of a batch before anything is written.
+
+        :param items:           items of the batch
+        :param check:           function that raises DataAccessException for an invalid item
+        :param report_failures: False: the first failure is raised, True: invalid items are collected and skipped
+        :return: (valid items, list of (position in the batch, DataAccessException))
+        """
+        valid_items, failures = [], []
+        for position, item in enumerate(items):
+            try:
+                check(item)
+            except DataAccessException as e:
+                if not report_failures:
+                    raise
+                failures.append((position, e))
+            else:
+                valid_items.append(item)
+        return valid_items, failures
@@ -13,8 +13,8 @@ class AdminDao(AbsDao):
         query_admin_by_staff_name
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, database=None):
+        super().__init__(database)
 
     def query_admin_by_staff_id(self, staff_id) -> Admin:
         """
@@ -1,7 +1,7 @@
-from typing import List
+from typing import Iterator, List
 
 from dao.entity.student import Student
-from dao.impl.abs_dao import AbsDao
+from dao.impl.abs_dao import AbsDao, transactional
 from util.exception import PrimaryKeyDuplicationException, UniqueKeyDuplicationException
 
 
@@ -10,8 +10,10 @@ class StudentDao(AbsDao):
     Student Data Access Object
     providing CRUD operations of student information
         add_student:                add a new student into database
+        add_students:               add a batch of new students with a single write
         query_student_info_by_id:   get a specific student by using student_id
         query_student_list:         get a student list which includes all student information
+        iter_students:              stream all students without loading the whole table
         query_student_by_email:     get a specific student by using student_email
         update_student:             update a student's information and save to the database
         delete_student_by_id:       delete a student and all enrollments by student_id
@@ -21,10 +23,11 @@ class StudentDao(AbsDao):
         ->  Dao layer just for CURD. don't check any data integrity
     """
 
-    def __init__(self):
+    def __init__(self, database=None):
         # init database instance
-        super().__init__()
+        super().__init__(database)
 
+    @transactional
     def add_student(self, student):
         """
         Add a new student information to database
@@ -38,19 +41,47 @@ class StudentDao(AbsDao):
                                               student_name=student.get_student_name(),
                                               student_email=student.get_student_email())
 
-        # 1: query students list
-        students = self._database.read_students()
+        # 1: check duplicate entity by keyed lookups
+        self.raise_dao_exception_if_repeated(student)
+
+        # 2: saving data to file
+        self._database.insert_student(student)
+
+    @transactional
+    def add_students(self, students, report_failures=False):
+        """
+        Add a batch of new students to database, each one is checked against the database and the batch itself,
+        then all valid students are saved with one write.
 
-        # 2: check for none and duplicate entity
-        if students:
-            # check duplicate entity
-            self.raise_dao_exception_if_repeated(students, student)
-            students.append(student)
-        else:
-            students = [student]
+        :param      students:           list of students, like add_student
+        :param      report_failures:    False: any invalid student raises and nothing is saved,
+                                        True: invalid students are skipped and reported, the others are saved
+        :return:    list of (position in students, DataAccessException) of skipped students
+        """
+        ids, email_keys = set(), set()
+
+        def check(student):
+            # 0: check primary key and non-nullable keys
+            self.raise_dao_exception_if_any_empty(student_id=student.get_student_id(),
+                                                  student_name=student.get_student_name(),
+                                                  student_email=student.get_student_email())
+            # 1: check duplicate entity in database, then in the students accepted before
+            self.raise_dao_exception_if_repeated(student)
+            if student.get_student_id() in ids:
+                raise PrimaryKeyDuplicationException("Student id (" + student.get_student_id() + ") already exists.")
+            email_key = self._database.email_key(student.get_student_email())
+            if email_key in email_keys:
+                raise UniqueKeyDuplicationException(
+                    "Student email (" + student.get_student_email() + ") already exists.")
+            ids.add(student.get_student_id())
+            email_keys.add(email_key)
 
-        # 3: saving data to file
-        self._database.write_students(students)
+        valid_students, failures = self.check_batch(students, check, report_failures)
+
+        # 2: saving all valid students with one write
+        if valid_students:
+            self._database.insert_students(valid_students)
+        return failures
 
     def query_student_info_by_id(self, student_id) -> Student | None:
         """
@@ -62,16 +93,8 @@ class StudentDao(AbsDao):
         # 0: check param
         self.raise_dao_exception_if_any_empty(student_id=student_id)
 
-        # 1: query all student
-        students = self._database.read_students()
-        # check if students list is empty
-        if not students:
-            return None
-
-        # 2: filter student
-        matching_students = [student for student in students if student.get_student_id() == student_id]
-
-        return matching_students[0] if matching_students else None
+        # 1: query student by primary key
+        return self._database.find_student_by_id(student_id)
 
     def query_student_by_email(self, email) -> Student | None:
         """
@@ -83,16 +106,8 @@ class StudentDao(AbsDao):
         # 0: check param
         self.raise_dao_exception_if_any_empty(email=email)
 
-        # 1: query all student
-        students = self._database.read_students()
-        # check if students list is empty
-        if not students:
-            return None
-
-        # 2: filter student
-        matching_students = [student for student in students if student.get_student_email() == email]
-
-        return matching_students[0] if matching_students else None
+        # 1: query student by unique key
+        return self._database.find_student_by_email(email)
 
     def query_student_list(self) -> List[Student]:
         """
@@ -102,6 +117,15 @@ class StudentDao(AbsDao):
         students = self._database.read_students()
         return students if students else []
 
+    def iter_students(self, chunk_size=None) -> Iterator[Student]:
+        """
+        stream all students, only one chunk of rows is parsed at a time
+        :param chunk_size: rows per chunk, DatabaseConfig.STREAM_CHUNK_ROWS by default
+        :return: Iterator[Student]
+        """
+        return self._database.iter_students(chunk_size)
+
+    @transactional
     def update_student(self, student):
         """
         update a student information by given student from parameter
@@ -115,20 +139,11 @@ class StudentDao(AbsDao):
                                               student_name=student.get_student_name(),
                                               student_email=student.get_student_email())
 
-        # 1: query student
-        students = self._database.read_students()
-
-        # 2: remove student that should be deleted
-        remain_students = [item for item in students if item.get_student_id() != student.get_student_id()]
-
-        # 3: check duplication
-        self.raise_dao_exception_if_repeated(remain_students, student)
-
-        # 4: add new student that should be added
-        remain_students.append(student)
+        # 1: check duplication against the other students, the student itself is replaced
+        self.raise_dao_exception_if_repeated(student, is_update=True)
 
-        # 5: saving data to database
-        self._database.write_students(remain_students)
+        # 2: saving data to database, the student with the same id is replaced
+        self._database.update_student(student)
 
     def delete_student_by_id(self, student_id):
         """
@@ -140,23 +155,21 @@ class StudentDao(AbsDao):
         # 0: check param
         self.raise_dao_exception_if_any_empty(student_id=student_id)
 
-        # 1: query all student
-        students = self._database.read_students()
-        # check if students list is empty
-        if not students:
-            return
-
-        # 2: filter student to deleting the data that needs to be deleted
-        remain_students = [student for student in students if student.get_student_id() != student_id]
+        # 1: delete student from database, nothing is written if the student does not exist
+        self._database.delete_students(student_id)
 
-        # 3: saving remain students to database
-        self._database.write_students(remain_students)
+    def raise_dao_exception_if_repeated(self, student, is_update=False):
+        """
+        check primary key and unique key of a student against the database, the primary key is a hash lookup.
 
-    @staticmethod
-    def raise_dao_exception_if_repeated(students, student):
-        for item in students:
-            if item.get_student_id() == student.get_student_id():
-                raise PrimaryKeyDuplicationException("Student id (" + student.get_student_id() + ") already exists.")
-            if item.get_student_email() == student.get_student_email():
-                raise UniqueKeyDuplicationException(
-                    "Student email (" + student.get_student_email() + ") already exists.")
+        :param student:     student to be added or updated
+        :param is_update:   True if the student replaces the stored student with the same id
+        """
+        # 1: primary key, only a new student may not exist yet
+        if not is_update and self._database.find_student_by_id(student.get_student_id()) is not None:
+            raise PrimaryKeyDuplicationException("Student id (" + student.get_student_id() + ") already exists.")
+
+        # 2: unique key, may only belong to the student itself
+        item = self._database.find_student_by_email(student.get_student_email())
+        if item is not None and item.get_student_id() != student.get_student_id():
+            raise UniqueKeyDuplicationException("Student email (" + student.get_student_email() + ") already exists.")
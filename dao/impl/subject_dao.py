@@ -1,7 +1,7 @@
-from typing import List
+from typing import Iterator, List
 
 from dao.entity.subject import Subject
-from dao.impl.abs_dao import AbsDao
+from dao.impl.abs_dao import AbsDao, transactional
 from util.exception import PrimaryKeyDuplicationException
 
 
@@ -10,7 +10,9 @@ class SubjectDao(AbsDao):
     Subject Data Access Object
     providing CRUD operations of subject information
         add_subject:                            add a new subject enrollment into database
+        add_subjects:                           add a batch of new subject enrollments with a single write
         query_subject_list_by_student_id:       get a student's all subjects by using student id
+        iter_subjects:                          stream all subject enrollments without loading the whole table
         query_subject_by_student_and_subject:   get a subject enrollment by using student id and subject id
         delete_subject_by_student_and_subject:  delete a specific subject enrollment by using student id and subject id
         delete_subject_list_by_student_id:      delete a student's all subject by using student id
@@ -21,9 +23,10 @@ class SubjectDao(AbsDao):
     ->  Dao layer just for CURD. don't check any data integrity
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, database=None):
+        super().__init__(database)
 
+    @transactional
     def add_subject(self, subject):
         """
         Add a new subject enrollment information to database
@@ -34,24 +37,51 @@ class SubjectDao(AbsDao):
         self.raise_dao_exception_if_any_empty(student_id=subject.get_student_id(),
                                               subject_id=subject.get_subject_id())
 
-        # 1: query subjects list
-        subjects = self._database.read_subjects()
+        # 1: check duplication by the composite key
+        self.raise_dao_exception_if_repeated(subject)
+
+        # 2: saving data to file
+        self._database.insert_subject(subject)
 
-        # 2: check for none and duplicate entity
-        if subjects:
-            # check duplication
-            self.raise_dao_exception_if_repeated(subjects, subject)
+    @transactional
+    def add_subjects(self, subjects, report_failures=False):
+        """
+        Add a batch of new subject enrollments to database, each one is checked against the database and the batch
+        itself, then all valid enrollments are saved with one write.
+
+        :param      subjects:           list of subject enrollments, like add_subject
+        :param      report_failures:    False: any invalid enrollment raises and nothing is saved,
+                                        True: invalid enrollments are skipped and reported, the others are saved
+        :return:    list of (position in subjects, DataAccessException) of skipped enrollments
+        """
+        keys = set()
+
+        def check(subject):
+            # 0: check primary key and non-nullable keys
+            self.raise_dao_exception_if_any_empty(student_id=subject.get_student_id(),
+                                                  subject_id=subject.get_subject_id())
+            # 1: check duplication in database, then in the enrollments accepted before
+            self.raise_dao_exception_if_repeated(subject)
+            key = (subject.get_student_id(), subject.get_subject_id())
+            if key in keys:
+                raise PrimaryKeyDuplicationException(
+                    "Student id (" + subject.get_student_id() + ") and subject id ("
+                    + subject.get_subject_id() + ") already exists.")
+            keys.add(key)
 
-            subjects.append(subject)
-        else:
-            subjects = [subject]
+        valid_subjects, failures = self.check_batch(subjects, check, report_failures)
 
-        # 3: saving data to file
-        self._database.write_subjects(subjects)
+        # 2: saving all valid enrollments with one write
+        if valid_subjects:
+            self._database.insert_subjects(valid_subjects)
+        return failures
 
     def query_subject_count_by_student_id(self, student_id) -> int:
-        subjects = self.query_subject_list_by_student_id(student_id)
-        return len(subjects) if subjects else 0
+        # 0: check non-nullable params
+        self.raise_dao_exception_if_any_empty(student_id=student_id)
+
+        # 1: count subjects without loading them
+        return self._database.count_subjects_by_student_id(student_id)
 
     def query_all_subjects(self):
         # 1: query all subject list
@@ -59,6 +89,14 @@ class SubjectDao(AbsDao):
         # check if subjects list is empty
         return subjects if subjects else []
 
+    def iter_subjects(self, chunk_size=None) -> Iterator[Subject]:
+        """
+        stream all subject enrollments, only one chunk of rows is parsed at a time
+        :param chunk_size: rows per chunk, DatabaseConfig.STREAM_CHUNK_ROWS by default
+        :return: Iterator[Subject]
+        """
+        return self._database.iter_subjects(chunk_size)
+
     def query_subject_list_by_student_id(self, student_id) -> List[Subject]:
         """
         query all subject list of one particular student by using student id
@@ -69,16 +107,8 @@ class SubjectDao(AbsDao):
         # 0: check non-nullable params
         self.raise_dao_exception_if_any_empty(student_id=student_id)
 
-        # 1: query all subject list
-        subjects = self._database.read_subjects()
-        # check if subjects list is empty
-        if not subjects:
-            return []
-
-        # 2: filter subject
-        matching_subjects = [subject for subject in subjects if subject.get_student_id() == student_id]
-
-        return matching_subjects if matching_subjects else []
+        # 1: query subject list of the student
+        return self._database.find_subjects_by_student_id(student_id)
 
     def query_subject_by_student_and_subject(self, student_id, subject_id) -> Subject | None:
         """
@@ -91,17 +121,8 @@ class SubjectDao(AbsDao):
         # 0: check non-nullable params
         self.raise_dao_exception_if_any_empty(student_id=student_id, subject_id=subject_id)
 
-        # 1: query all subject list
-        subjects = self._database.read_subjects()
-        # check if subjects list is empty
-        if not subjects:
-            return None
-
-        # 2: filter subject
-        matching_subjects = [subject for subject in subjects if (subject.get_student_id() == student_id
-                                                                 and subject.get_subject_id() == subject_id)]
-
-        return matching_subjects[0] if matching_subjects else None
+        # 1: query subject by composite primary key
+        return self._database.find_subject(student_id, subject_id)
 
     def delete_subject_by_student_and_subject(self, student_id, subject_id):
         """
@@ -113,18 +134,8 @@ class SubjectDao(AbsDao):
         # 0: check non-nullable params
         self.raise_dao_exception_if_any_empty(student_id=student_id, subject_id=subject_id)
 
-        # 1: query all subjects
-        subjects = self._database.read_subjects()
-        # check if students list is empty
-        if not subjects:
-            return
-
-        # 2: filter subjects to deleting the data that needs to be deleted
-        remain_subjects = [subject for subject in subjects if (subject.get_student_id() != student_id
-                                                               or subject.get_subject_id() != subject_id)]
-
-        # 3: saving remain students to database
-        self._database.write_subjects(remain_subjects)
+        # 1: delete subject from database, nothing is written if the enrollment does not exist
+        self._database.delete_subjects(student_id, subject_id)
 
     def delete_subject_list_by_student_id(self, student_id):
         """
@@ -135,17 +146,8 @@ class SubjectDao(AbsDao):
         # 0: check non-nullable params
         self.raise_dao_exception_if_any_empty(student_id=student_id)
 
-        # 1: query all subjects
-        subjects = self._database.read_subjects()
-        # check if students list is empty
-        if not subjects:
-            return
-
-        # 2: filter subjects to deleting the data that needs to be deleted
-        remain_subjects = [subject for subject in subjects if (subject.get_student_id() != student_id)]
-
-        # 3: saving remain subjects to database
-        self._database.write_subjects(remain_subjects)
+        # 1: delete all subjects of the student from database, nothing is written if there is none
+        self._database.delete_subjects(student_id)
 
     def update_subject(self, subject):
         """
@@ -158,23 +160,12 @@ class SubjectDao(AbsDao):
         self.raise_dao_exception_if_any_empty(subject=subject)
         self.raise_dao_exception_if_any_empty(subject_id=subject.get_subject_id(), student_id=subject.get_student_id())
 
-        # 1: query subjects
-        subjects = self._database.read_subjects()
-
-        # 2: remove subjects that should be deleted
-        remain_subjects = [item for item in subjects if (item.get_student_id() != subject.get_student_id()
-                                                         or item.get_subject_id() != subject.get_subject_id())]
-
-        # 3: add new subject that should be added
-        remain_subjects.append(subject)
+        # 1: saving data to database, the enrollment with the same student id and subject id is replaced
+        self._database.update_subject(subject)
 
-        # 4: saving data to database
-        self._database.write_subjects(remain_subjects)
-
-    @staticmethod
-    def raise_dao_exception_if_repeated(subjects, subject):
-        for item in subjects:
-            if item.get_student_id() == subject.get_student_id() and item.get_subject_id() == subject.get_subject_id():
-                raise PrimaryKeyDuplicationException(
-                    "Student id (" + subject.get_student_id() + ") and subject id ("
-                    + subject.get_subject_id() + ") already exists.")
+    def raise_dao_exception_if_repeated(self, subject):
+        # the composite primary key (student_id, subject_id) is a hash lookup
+        if self._database.find_subject(subject.get_student_id(), subject.get_subject_id()) is not None:
+            raise PrimaryKeyDuplicationException(
+                "Student id (" + subject.get_student_id() + ") and subject id ("
+                + subject.get_subject_id() + ") already exists.")
@@ -1,3 +1,4 @@
+import itertools
 from typing import List
 
 from dao.entity.student import Student
@@ -16,17 +17,20 @@ class AdminService:
             Note: excluding student's enrollment information
 
     Methods:
-        _init:              public default constructor, init _subject_dao object
+        _init:              public default constructor, init the DAOs on the given engine,
+                            the process-wide shared engine by default
 
         enroll_subject      public method for enrollment student's subject
         remove subject      public method for removing one student's subject
         show_subjects       public method for show all subjects enrolled.
+        group_students, partition_students
+                            public methods for the grade reports, subjects and students are read from one snapshot
     """
 
-    def __init__(self):
-        self._admin_dao = AdminDao()
-        self._student_dao = StudentDao()
-        self._subject_dao = SubjectDao()
+    def __init__(self, database=None):
+        self._admin_dao = AdminDao(database)
+        self._student_dao = StudentDao(database)
+        self._subject_dao = SubjectDao(database)
 
     def clear_database(self):
         """
@@ -35,46 +39,51 @@ class AdminService:
         self._admin_dao.delete_all_students_and_subjects()
 
     def group_students(self) -> List[str]:
-        # 1: query all subjects
-        subjects = self._subject_dao.query_all_subjects()
-        if not subjects:
+        # subjects and students of one version, an enrollment or deletion meanwhile is not seen half way
+        with self._subject_dao.snapshot():
+            return self._group_students()
+
+    def _group_students(self):
+        # 1: stream all subjects, students are only read if there is any subject
+        subjects = self._subject_dao.iter_subjects()
+        first_subject = next(subjects, None)
+        if first_subject is None:
             return []
 
-        # 2: get all student information and convert to map format
-        # each Student object has 'student_id' and 'student_name' attributes
-        students = self._student_dao.query_student_list()
-        # Create a dictionary where the key is student_id and the value is student_name
-        students_map = {student.get_student_id(): student.get_student_name() for student in students}
-
-        # 3: Sort by _subject_grade (primary), _student_id (secondary), and _subject_mark (tertiary)
-        sorted_subjects = sorted(subjects, key=lambda subj: (subj.get_subject_grade(), subj.get_student_id(),
-                                                             subj.get_subject_mark()))
-
-        # 4: format desc for each subject
-        subject_desc_list = []
-        for subject in sorted_subjects:
-            subject_desc_list.append("{}\t-->[{}\t:: {} --> GRADE: {} - MARK: {}]"
-                                     .format(subject.get_subject_grade(),
-                                             students_map.get(subject.get_student_id()), subject.get_student_id(),
-                                             subject.get_subject_grade(), subject.get_subject_mark()))
-        return subject_desc_list
+        # 2: get all student names, keyed by student_id
+        students_map = self._query_student_names()
+
+        # 3: keep only the sort key and the formatted desc of each subject, not the entities
+        # Sort by _subject_grade (primary), _student_id (secondary), and _subject_mark (tertiary)
+        keyed_desc_list = []
+        for subject in itertools.chain((first_subject,), subjects):
+            keyed_desc_list.append(((subject.get_subject_grade(), subject.get_student_id(), subject.get_subject_mark()),
+                                    "{}\t-->[{}\t:: {} --> GRADE: {} - MARK: {}]"
+                                    .format(subject.get_subject_grade(),
+                                            students_map.get(subject.get_student_id()), subject.get_student_id(),
+                                            subject.get_subject_grade(), subject.get_subject_mark())))
+        keyed_desc_list.sort(key=lambda keyed_desc: keyed_desc[0])
+        return [desc for _, desc in keyed_desc_list]
 
     def partition_students(self):
-        # 1: query all subjects
-        subjects = self._subject_dao.query_all_subjects()
-        if not subjects:
+        # subjects and students of one version, see @group_students
+        with self._subject_dao.snapshot():
+            return self._partition_students()
+
+    def _partition_students(self):
+        # 1: stream all subjects, students are only read if there is any subject
+        subjects = self._subject_dao.iter_subjects()
+        first_subject = next(subjects, None)
+        if first_subject is None:
             return [], []
 
-        # 2: get all student information and convert to map format
-        # each Student object has 'student_id' and 'student_name' attributes
-        students = self._student_dao.query_student_list()
-        # Create a dictionary where the key is student_id and the value is student_name
-        students_map = {student.get_student_id(): student.get_student_name() for student in students}
+        # 2: get all student names, keyed by student_id
+        students_map = self._query_student_names()
 
-        # 4: format desc for each subject
+        # 3: format desc for each subject, one chunk of subjects is in memory at a time
         subject_desc_list_pass = []
         subject_desc_list_fail = []
-        for subject in subjects:
+        for subject in itertools.chain((first_subject,), subjects):
             temp_desc = ("{} :: {} --> GRADE: {} - MARK: {}"
                          .format(students_map.get(subject.get_student_id()), subject.get_student_id(),
                                  subject.get_subject_grade(), subject.get_subject_mark()))
@@ -94,11 +103,17 @@ class AdminService:
         if not student:
             raise BusinessException("Student " + student_id + " does not exist.")
 
-        # 2: delete student's all subjects from database file
-        self._subject_dao.delete_subject_list_by_student_id(student_id)
+        # 2: delete student's all subjects and information in one transaction, both DAOs share the engine
+        def delete_student():
+            self._subject_dao.delete_subject_list_by_student_id(student_id)
+
+            # 3: delete student's information from database file
+            self._student_dao.delete_student_by_id(student_id)
+        self._student_dao.run_in_transaction(delete_student)
 
-        # 3: delete student's information from database file
-        self._student_dao.delete_student_by_id(student_id)
+    def _query_student_names(self):
+        # student_id -> student_name of all students, streamed so no Student list is kept
+        return {student.get_student_id(): student.get_student_name() for student in self._student_dao.iter_students()}
 
     def show_all_students(self) -> List[Student]:
         students = self._student_dao.query_student_list()
@@ -0,0 +1,48 @@
+from typing import List
+
+from dao.database.async_database import AsyncDatabase
+from dao.entity.student import Student
+from service.admin_service import AdminService
+
+
+class AsyncAdminService:
+    """
+    asyncio variant of AdminService:
+        pass_list, fail_list = await async_admin_service.partition_students()
+    the reports are reads of all students and subjects, concurrent requests of one report are one read.
+
+    Fields:
+        _database   AsyncDatabase whose executor runs the blocking operations
+        _service    AdminService on the engine of _database
+
+    Methods:
+        __init__:           public default constructor, the async front of the shared engine by default
+        clear_database:     same as AdminService
+        group_students, partition_students, show_all_students:
+                            same as AdminService, coalesced
+        remove_student:     same as AdminService
+    """
+
+    def __init__(self, async_database=None):
+        self._database = async_database if async_database is not None else AsyncDatabase.get_instance()
+        self._service = AdminService(self._database.get_database())
+
+    async def clear_database(self):
+        # see AdminService.clear_database
+        await self._database.run(self._service.clear_database)
+
+    async def group_students(self) -> List[str]:
+        # see AdminService.group_students
+        return await self._database.read(("group_students",), self._service.group_students)
+
+    async def partition_students(self):
+        # see AdminService.partition_students
+        return await self._database.read(("partition_students",), self._service.partition_students)
+
+    async def remove_student(self, student_id):
+        # see AdminService.remove_student
+        await self._database.run(self._service.remove_student, student_id)
+
+    async def show_all_students(self) -> List[Student]:
+        # see AdminService.show_all_students
+        return await self._database.read(("students",), self._service.show_all_students)
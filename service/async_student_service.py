@@ -0,0 +1,51 @@
+import hashlib
+
+from dao.database.async_database import AsyncDatabase
+from dao.entity.student import Student
+from service.student_service import StudentService
+
+
+class AsyncStudentService:
+    """
+    asyncio variant of StudentService for one session, e.g. one connected user of a server:
+        student = await async_student_service.login(email, password)
+
+    Fields:
+        _database   AsyncDatabase whose executor runs the blocking operations
+        _service    StudentService of the session on the engine of _database, it holds the logged in student
+
+    Methods:
+        __init__:           public default constructor, the async front of the shared engine by default
+        login:              same as StudentService, concurrent logins with the same credentials are one read
+        register:           same as StudentService
+        change_password:    same as StudentService
+        set_student, get_student, check_register_params:
+                            same as StudentService, they do no I/O
+    """
+
+    def __init__(self, async_database=None):
+        self._database = async_database if async_database is not None else AsyncDatabase.get_instance()
+        self._service = StudentService(self._database.get_database())
+
+    def set_student(self, student: Student | None):
+        self._service.set_student(student)
+
+    def get_student(self) -> Student:
+        return self._service.get_student()
+
+    async def login(self, email, password) -> Student | None:
+        # see StudentService.login, the key of the read holds a digest, never the plaintext password
+        password_digest = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        return await self._database.read(("login", email, password_digest), self._service.login, email, password)
+
+    async def register(self, email, password, name):
+        # see StudentService.register
+        await self._database.run(self._service.register, email, password, name)
+
+    async def change_password(self, new_password):
+        # see StudentService.change_password
+        await self._database.run(self._service.change_password, new_password)
+
+    @staticmethod
+    def check_register_params(email, password) -> bool:
+        return StudentService.check_register_params(email, password)
@@ -0,0 +1,52 @@
+from typing import List
+
+from dao.database.async_database import AsyncDatabase
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from service.subject_service import SubjectService
+from util.constant import Constant
+from util.exception import BusinessException
+
+
+class AsyncSubjectService:
+    """
+    asyncio variant of SubjectService for one session:
+        result = await async_subject_service.enroll_subject()
+
+    Fields:
+        _database   AsyncDatabase whose executor runs the blocking operations
+        _service    SubjectService of the session on the engine of _database, it holds the logged in student
+
+    Methods:
+        __init__:           public default constructor, the async front of the shared engine by default
+        enroll_subject:     same as SubjectService
+        remove_subject:     same as SubjectService
+        query_subjects:     same as SubjectService, concurrent queries of one student are one read
+        set_student, get_student:
+                            same as SubjectService
+    """
+
+    def __init__(self, async_database=None):
+        self._database = async_database if async_database is not None else AsyncDatabase.get_instance()
+        self._service = SubjectService(self._database.get_database())
+
+    def set_student(self, student: Student | None):
+        self._service.set_student(student)
+
+    def get_student(self) -> Student:
+        return self._service.get_student()
+
+    async def enroll_subject(self) -> dict[Constant, str | int]:
+        # see SubjectService.enroll_subject
+        return await self._database.run(self._service.enroll_subject)
+
+    async def remove_subject(self, subject_id) -> dict[Constant, str | int]:
+        # see SubjectService.remove_subject
+        return await self._database.run(self._service.remove_subject, subject_id)
+
+    async def query_subjects(self) -> List[Subject]:
+        # see SubjectService.query_subjects, the student is checked before the key needs its id
+        if not self.get_student():
+            raise BusinessException("Please login in first.")
+        student_id = self.get_student().get_student_id()
+        return await self._database.read(("subjects", student_id), self._service.query_subjects)
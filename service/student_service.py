@@ -14,7 +14,8 @@ class StudentService:
         _student_dao refers to the student data access, it provides CRUD operations with Student Basic information
 
     Methods:
-        _init:              public default constructor, init _student_dao object
+        _init:              public default constructor, init _student_dao object on the given engine,
+                            the process-wide shared engine by default
 
         login:              public method for login (get login info from keyboard)
         register:           public method for register new student (get key information from keyboard)
@@ -22,9 +23,9 @@ class StudentService:
 
     """
 
-    def __init__(self):
+    def __init__(self, database=None):
         # init _student_dao by using default constructor of StudentDao
-        self._student_dao = StudentDao()
+        self._student_dao = StudentDao(database)
         self._student = None
 
     def set_student(self, student: Student | None):
@@ -103,10 +104,12 @@ class StudentService:
         #    call @Encryption.encode_md5 to get encrypted string
         new_password_encryption = Encryption.encode_md5(new_password)
 
-        # 2: update data to database file
-        student = self._student_dao.query_student_info_by_id(self.get_student().get_student_id())
-        student.set_student_password(new_password_encryption)
-        self._student_dao.update_student(student)
+        # 2: update data to database file, read and write are one transaction so no concurrent change is lost
+        def update_password():
+            student = self._student_dao.query_student_info_by_id(self.get_student().get_student_id())
+            student.set_student_password(new_password_encryption)
+            self._student_dao.update_student(student)
+        self._student_dao.run_in_transaction(update_password)
 
     @staticmethod
     def check_register_params(email, password) -> bool:
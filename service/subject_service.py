@@ -17,16 +17,18 @@ class SubjectService:
         _subject_dao: refers to the subject data access, providing CRUD operations with Subject enrollment information.
 
     Methods:
-        __init__:              Public default constructor; initializes _subject_dao object.
+        __init__:              Public default constructor; initializes _subject_dao object on the given engine,
+                               the process-wide shared engine by default.
 
         enroll_subject:        Public method for enrolling a student's subject.
+        _enroll_subject:       Private method for the checks and writes of one enrollment, run in a transaction.
         remove_subject:        Public method for removing one student's subject.
         query_subjects:       Public method for showing all subjects enrolled.
     """
 
-    def __init__(self):
+    def __init__(self, database=None):
         # Initializes the SubjectDao for database operations and sets the student to None.
-        self._subject_dao = SubjectDao()  # Create an instance of SubjectDao
+        self._subject_dao = SubjectDao(database)  # Create an instance of SubjectDao on the engine
         self._student = None  # Initialize student to None
 
     def set_student(self, student: Student | None):
@@ -50,6 +52,10 @@ class SubjectService:
         if not self._student:
             raise BusinessException("Please login in first.")  # Raise exception if no student is set
 
+        # Steps 2-6 are one transaction: one write, and no other terminal enrolls this student in between.
+        return self._subject_dao.run_in_transaction(self._enroll_subject)  # Run again if another terminal won
+
+    def _enroll_subject(self) -> dict[Constant, str | int]:
         # 2: Check total number of enrolled subjects.
         count = self._subject_dao.query_subject_count_by_student_id(self.get_student().get_student_id())
         if count >= 4:
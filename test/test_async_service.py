@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dao.database.async_database import AsyncDatabase
+from dao.database.database import Database
+from dao.entity.student import Student
+from service.async_admin_service import AsyncAdminService
+from service.async_student_service import AsyncStudentService
+from service.async_subject_service import AsyncSubjectService
+from util.constant import Constant
+from util.exception import BusinessException
+
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.temp_dir.name, 'student.data'))
+        self.database.insert_students([Student(f"student_id{i}", f"name{i}", f"email{i}", "pass") for i in range(3)])
+        self.async_database = AsyncDatabase(self.database, max_workers=2)
+
+    def tearDown(self):
+        self.async_database.close()
+        self.temp_dir.cleanup()
+
+    async def test_concurrent_reads_are_coalesced(self):
+        gate, calls = threading.Event(), []
+
+        def slow_read():
+            calls.append(threading.current_thread().name)
+            gate.wait(5)
+            return self.database.read_students()
+
+        tasks = [asyncio.ensure_future(self.async_database.read(("students",), slow_read)) for _ in range(10)]
+        await asyncio.sleep(0.05)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(calls[0].startswith("dao-async"))
+        self.assertTrue(all(result == results[0] for result in results))
+        # no two sessions share an entity
+        self.assertEqual(len({id(result[0]) for result in results}), 10)
+        self.assertEqual(self.async_database.get_stats(), {"reads": 1, "coalesced": 9, "writes": 0})
+
+    async def test_read_after_write_is_not_coalesced(self):
+        gate = threading.Event()
+
+        def slow_read():
+            gate.wait(5)
+            return self.database.read_students()
+
+        before = asyncio.ensure_future(self.async_database.read(("students",), slow_read))
+        await asyncio.sleep(0.05)
+        await self.async_database.run(self.database.delete_students, "student_id0")
+        after = asyncio.ensure_future(self.async_database.read(("students",), self.database.read_students))
+        self.assertEqual(len(await after), 2)
+        gate.set()
+        await before
+        self.assertEqual(self.async_database.get_stats()["coalesced"], 0)
+
+    async def test_executor_is_bounded(self):
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def blocking_call():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        # the event loop keeps running while the calls block their threads
+        ticks = 0
+        calls = asyncio.gather(*(self.async_database.run(blocking_call) for _ in range(6)))
+        while not calls.done():
+            ticks += 1
+            await asyncio.sleep(0.001)
+        self.assertEqual(peak[0], 2)
+        self.assertGreater(ticks, 5)
+
+
+class TestAsyncServices(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.async_database = AsyncDatabase(Database(os.path.join(self.temp_dir.name, 'student.data')))
+
+    def tearDown(self):
+        self.async_database.close()
+        self.temp_dir.cleanup()
+
+    async def test_sessions(self):
+        student_service = AsyncStudentService(self.async_database)
+        await student_service.register("john.smith@university.com", "Helloworld123", "john")
+        student = await student_service.login("john.smith@university.com", "Helloworld123")
+        with self.assertRaises(BusinessException):
+            await student_service.login("john.smith@university.com", "wrong")
+        # the key of a coalesced login holds no plaintext password
+        with mock.patch.object(self.async_database, "read", wraps=self.async_database.read) as read:
+            await student_service.login("john.smith@university.com", "Helloworld123")
+        self.assertNotIn("Helloworld123", read.call_args[0][0])
+
+        # concurrent sessions of the same student
+        sessions = [AsyncSubjectService(self.async_database) for _ in range(2)]
+        for session in sessions:
+            session.set_student(student)
+        with mock.patch("service.subject_service.Serialization.generate_random_subject_id", side_effect=["001", "002"]):
+            results = await asyncio.gather(*(session.enroll_subject() for session in sessions))
+        self.assertEqual(sorted(result[Constant.KEY_COUNT] for result in results), [1, 2])
+        subjects = await asyncio.gather(*(session.query_subjects() for session in sessions))
+        self.assertEqual([[subject.get_subject_id() for subject in one] for one in subjects], [["001", "002"]] * 2)
+        self.assertEqual((await sessions[0].remove_subject("001"))[Constant.KEY_COUNT], 1)
+
+        student_service.set_student(student)
+        await student_service.change_password("Newpassword123")
+        await student_service.login("john.smith@university.com", "Newpassword123")
+
+        admin_service = AsyncAdminService(self.async_database)
+        self.assertEqual(len(await admin_service.group_students()), 1)
+        await admin_service.remove_student(student.get_student_id())
+        self.assertEqual(await admin_service.show_all_students(), [])
+        self.assertEqual(await admin_service.partition_students(), ([], []))
+
+    async def test_login_required(self):
+        with self.assertRaises(BusinessException):
+            await AsyncSubjectService(self.async_database).query_subjects()
+
+
+if __name__ == '__main__':
+    unittest.main()
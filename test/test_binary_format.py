@@ -0,0 +1,96 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from dao.database.binary_format import BinaryFormat
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.table_file import TableFile
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from util.exception import CorruptDataException, DataAccessException
+
+
+class TestBinaryFormat(unittest.TestCase):
+
+    def test_round_trip(self):
+        tables = {
+            "students": [("000001", "name1", "email1", "pass1", None),
+                         ("000002", "na\x1fme2", "email2", "pass2", "PASS")],
+            "admins": [],
+            "subjects": [("000001", "001", 90, "HD"), ("000001", "002", None, None),
+                         ("000002", "003", 2 ** 70, "Z")],
+            "emails": [("email1", "000001")],
+        }
+        content = BinaryFormat.encode(tables, TableFile.TABLE_COLUMNS)
+
+        self.assertTrue(BinaryFormat.is_binary(content))
+        self.assertEqual(BinaryFormat.decode(content, TableFile.TABLE_COLUMNS), tables)
+
+    def test_decode_selected_tables(self):
+        tables = {"students": [("000001", "name1", "email1", "pass1", None)],
+                  "subjects": [("000001", "001", 90, "HD")]}
+        content = BinaryFormat.encode(tables, TableFile.TABLE_COLUMNS)
+
+        decoded = BinaryFormat.decode(content, {"subjects": TableFile.TABLE_COLUMNS["subjects"]})
+        self.assertEqual(decoded, {"subjects": [("000001", "001", 90, "HD")]})
+
+    def test_unknown_version(self):
+        content = bytearray(BinaryFormat.encode({}, TableFile.TABLE_COLUMNS))
+        content[len(BinaryFormat.MAGIC)] = 99
+        with self.assertRaises(DataAccessException):
+            BinaryFormat.decode(bytes(content), TableFile.TABLE_COLUMNS)
+
+    def test_damaged_block_is_detected(self):
+        tables = {"subjects": [("000001", "001", 90, "HD")]}
+        content = bytearray(BinaryFormat.encode(tables, TableFile.TABLE_COLUMNS))
+        content[-1] ^= 0xff
+        with self.assertRaises(CorruptDataException):
+            BinaryFormat.decode(bytes(content), TableFile.TABLE_COLUMNS)
+        # a block ending after the file
+        with self.assertRaises(CorruptDataException):
+            BinaryFormat.decode(bytes(content[:-1]), TableFile.TABLE_COLUMNS)
+
+    def test_version_1_without_checksums(self):
+        name = BinaryFormat._pack_name
+        content = b"".join([BinaryFormat.MAGIC, struct.pack("<BH", 1, 1), name("subjects"), struct.pack("<IH", 1, 1),
+                            name("grade"), struct.pack("<BI", BinaryFormat.KIND_STR, 2), b"HD"])
+        decoded = BinaryFormat.decode(content, {"subjects": TableFile.TABLE_COLUMNS["subjects"]})
+        self.assertEqual(decoded, {"subjects": [(None, None, None, "HD")]})
+
+
+class TestBinaryDataFile(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_database(self, file_format):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                        DatabaseConfig.FSYNC_NEVER, file_format)
+
+    def test_legacy_json_is_read_and_converted(self):
+        json_database = self.open_database(DatabaseConfig.FORMAT_JSON)
+        json_database.write_students([Student("student_id1", "student_name1", "email1", "pass1")])
+        json_database.write_subjects([Subject("student_id1", "subject_id1", 90, "HD")])
+        json_size = os.path.getsize(self.data_file_path)
+
+        binary_database = self.open_database(DatabaseConfig.FORMAT_BINARY)
+        self.assertEqual(len(binary_database.read_students()), 1)
+
+        # the next write uses the binary format, and the JSON engine detects it
+        binary_database.update_subject(Subject("student_id1", "subject_id1", 40, "Z"))
+        with open(self.data_file_path, 'rb') as file:
+            self.assertTrue(BinaryFormat.is_binary(file.read()))
+        self.assertLess(os.path.getsize(self.data_file_path), json_size)
+
+        subjects = self.open_database(DatabaseConfig.FORMAT_JSON).read_subjects()
+        self.assertEqual(subjects[0].get_subject_mark(), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from dao.database.change_events import ChangeEvent, ChangeEventBus
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from dao.impl.student_dao import StudentDao
+from dao.impl.subject_dao import SubjectDao
+from util.exception import PrimaryKeyDuplicationException
+
+
+class TestChangeEventBus(unittest.TestCase):
+
+    def test_kinds_and_errors(self):
+        bus, received = ChangeEventBus(), []
+        bus.subscribe(lambda event: 1 / 0)
+        bus.subscribe(received.append, kinds={ChangeEvent.STUDENT_DELETED})
+        bus.publish([ChangeEvent(ChangeEvent.STUDENT_ADDED, {"id": "1"}, {"id": "1"}),
+                     ChangeEvent(ChangeEvent.STUDENT_DELETED, {"id": "1"}), None])
+        self.assertEqual(received, [ChangeEvent(ChangeEvent.STUDENT_DELETED, {"id": "1"})])
+        self.assertEqual(bus.get_stats(), {"published": 2, "delivered": 1, "errors": 2, "queued": 0})
+
+    def test_queued_delivery(self):
+        bus, received = ChangeEventBus(), []
+        bus.subscribe(lambda event: received.append((event.get_key()["id"], threading.current_thread().name)),
+                      queued=True)
+        bus.publish([ChangeEvent(ChangeEvent.STUDENT_DELETED, {"id": str(i)}) for i in range(100)])
+        bus.flush()
+        self.assertEqual(received, [(str(i), "change-events") for i in range(100)])
+
+
+    def test_stats_of_concurrent_publishers(self):
+        bus = ChangeEventBus()
+        bus.subscribe(lambda event: None)
+        bus.subscribe(lambda event: None, queued=True)
+        events = [ChangeEvent(ChangeEvent.STUDENT_DELETED, {"id": str(i)}) for i in range(1000)]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=lambda: [bus.publish([event]) for event in events]) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            bus.flush()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        # no increment of one thread is lost to another
+        self.assertEqual(bus.get_stats(), {"published": 4000, "delivered": 8000, "errors": 0, "queued": 0})
+
+class TestDatabaseEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.temp_dir.name, 'student.data'))
+        self.student_dao, self.subject_dao = StudentDao(self.database), SubjectDao(self.database)
+        self.events = []
+        self.subject_dao.subscribe(self.events.append)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def kinds(self):
+        return [event.get_kind() for event in self.events]
+
+    def test_dao_writes(self):
+        self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        self.subject_dao.add_subject(Subject("student_id1", "subject_id1", 60, "P"))
+        subject = self.subject_dao.query_subject_by_student_and_subject("student_id1", "subject_id1")
+        subject.set_subject_mark(90)
+        self.subject_dao.update_subject(subject)
+        self.subject_dao.delete_subject_list_by_student_id("student_id1")
+        # nothing is deleted, nothing is published
+        self.student_dao.delete_student_by_id("student_id2")
+
+        self.assertEqual(self.kinds(), [ChangeEvent.STUDENT_ADDED, ChangeEvent.SUBJECT_ADDED,
+                                        ChangeEvent.SUBJECT_UPDATED, ChangeEvent.SUBJECT_DELETED])
+        updated = self.events[2]
+        self.assertEqual(updated.get_key(), {"student_id": "student_id1", "subject_id": "subject_id1"})
+        # the patch only wrote the mark, the event has the whole row
+        self.assertEqual(updated.get_row(), {"student_id": "student_id1", "subject_id": "subject_id1",
+                                             "mark": 90, "grade": "P"})
+        self.assertEqual(updated.get_entity().get_subject_mark(), 90)
+        self.assertEqual(self.events[3].get_key(), {"student_id": "student_id1"})
+
+    def test_published_after_commit(self):
+        with self.database.transaction():
+            self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+            self.assertEqual(self.events, [])
+        self.assertEqual(self.kinds(), [ChangeEvent.STUDENT_ADDED])
+
+        with self.assertRaises(PrimaryKeyDuplicationException):
+            with self.database.transaction():
+                self.student_dao.add_student(Student("student_id2", "student_name2", "email2", "pass2"))
+                self.student_dao.add_student(Student("student_id2", "student_name2", "email3", "pass2"))
+        self.assertEqual(self.kinds(), [ChangeEvent.STUDENT_ADDED])
+
+    def test_subscriber_writes(self):
+        # a synchronous subscriber is called without the file lock held, so it may write itself
+        def cascade(event):
+            self.subject_dao.delete_subject_list_by_student_id(event.get_key()["id"])
+        self.database.subscribe(cascade, kinds={ChangeEvent.STUDENT_DELETED})
+
+        self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        self.subject_dao.add_subject(Subject("student_id1", "subject_id1", 60, "P"))
+        self.student_dao.delete_student_by_id("student_id1")
+        self.assertEqual(self.database.count_subjects_by_student_id("student_id1"), 0)
+        self.assertEqual(self.kinds()[-2:], [ChangeEvent.STUDENT_DELETED, ChangeEvent.SUBJECT_DELETED])
+
+    def test_incremental_aggregate(self):
+        # a total of marks kept by a queued subscriber matches a full scan
+        totals = {"marks": 0}
+        marks = {}
+
+        def aggregate(event):
+            if event.get_kind() == ChangeEvent.SUBJECT_DELETED:
+                for key in [key for key in marks if key[0] == event.get_key()["student_id"]]:
+                    totals["marks"] -= marks.pop(key)
+                return
+            key = (event.get_row()["student_id"], event.get_row()["subject_id"])
+            totals["marks"] += event.get_row()["mark"] - marks.get(key, 0)
+            marks[key] = event.get_row()["mark"]
+        self.database.subscribe(aggregate, kinds={ChangeEvent.SUBJECT_ADDED, ChangeEvent.SUBJECT_UPDATED,
+                                                  ChangeEvent.SUBJECT_DELETED}, queued=True)
+
+        self.subject_dao.add_subjects([Subject(f"student_id{i % 5}", f"subject_id{i}", i, "Z") for i in range(20)])
+        subject = self.subject_dao.query_subject_by_student_and_subject("student_id1", "subject_id1")
+        subject.set_subject_mark(99)
+        self.subject_dao.update_subject(subject)
+        self.subject_dao.delete_subject_list_by_student_id("student_id2")
+        self.database.get_event_bus().flush()
+        self.assertEqual(totals["marks"], sum(subject.get_subject_mark() for subject in self.database.read_subjects()))
+
+    def test_replaced_tables(self):
+        self.database.write_subjects([Subject("student_id1", "subject_id1", 60, "P")])
+        self.database.delete_data_file()
+        self.assertEqual(self.kinds(), [ChangeEvent.SUBJECTS_REPLACED,
+                                        ChangeEvent.STUDENTS_REPLACED, ChangeEvent.SUBJECTS_REPLACED])
+
+    def test_sharded_layout(self):
+        database = Database(os.path.join(self.temp_dir.name, 'sharded.data'), layout=DatabaseConfig.LAYOUT_SHARDED,
+                            shard_count=3)
+        events = []
+        database.subscribe(events.append)
+        database.insert_students([Student(f"student_id{i}", "name", f"email{i}", "pass") for i in range(6)])
+        database.delete_students("student_id3")
+        # the global email index publishes nothing
+        self.assertEqual([event.get_kind() for event in events],
+                         [ChangeEvent.STUDENT_ADDED] * 6 + [ChangeEvent.STUDENT_DELETED])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dao.database.compactor import Compactor, IoBudget
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.sqlite_database import SqliteDatabase
+from dao.database.table_file import TableFile
+from dao.entity.student import Student
+
+
+class TestIoBudget(unittest.TestCase):
+
+    def test_writes_are_throttled(self):
+        budget = IoBudget(1000)
+        with mock.patch("dao.database.compactor.time.sleep") as sleep:
+            budget.consume(500)
+        self.assertAlmostEqual(sleep.call_args[0][0], 0.5, places=2)
+        self.assertAlmostEqual(budget.get_throttled_seconds(), 0.5, places=2)
+
+    def test_no_limit(self):
+        with mock.patch("dao.database.compactor.time.sleep") as sleep:
+            IoBudget(0).consume(1 << 30)
+        sleep.assert_not_called()
+
+
+class TestCompaction(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = self.open()
+        # churn: every student but the last one is removed again
+        for i in range(30):
+            self.database.insert_student(Student(f"student_id{i}", f"student_name{i}", f"email{i}", "pass"))
+            if i < 29:
+                self.database.delete_students(f"student_id{i}")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE)
+
+    def test_log_is_compacted(self):
+        table_file = self.database._table_files["students"]
+        data_bytes, log_bytes = table_file.get_file_sizes()
+
+        report = self.database.compact(min_log_bytes=0)
+        self.assertEqual((report["compacted"], report["skipped"]), (1, 0))
+        self.assertEqual(report["bytes_before"], data_bytes + log_bytes)
+        self.assertGreater(report["reclaimed_bytes"], 0)
+        self.assertEqual(table_file.get_file_sizes()[1], 0)
+        self.assertEqual([student.get_student_id() for student in self.open().read_students()], ["student_id29"])
+
+    def test_small_log_is_kept(self):
+        report = self.database.compact(min_log_bytes=1 << 30)
+        self.assertEqual(report["compacted"], 0)
+        self.assertGreater(self.database._table_files["students"].get_file_sizes()[1], 0)
+
+    def test_foreground_is_not_blocked_and_wins(self):
+        other = self.open()
+        write_checkpoint = TableFile.write_checkpoint
+
+        def write_meanwhile(table_file, version, budget=None):
+            # another engine writes while the checkpoint is written, without waiting for it
+            writer = threading.Thread(target=lambda: other.insert_student(Student("student_id99", "name", "e", "p")))
+            writer.start()
+            writer.join(5)
+            self.assertFalse(writer.is_alive())
+            return write_checkpoint(table_file, version, budget)
+
+        with mock.patch.object(TableFile, "write_checkpoint", write_meanwhile):
+            report = self.database.compact(min_log_bytes=0)
+        self.assertEqual((report["compacted"], report["skipped"]), (0, 1))
+        self.assertEqual(len(self.open().read_students()), 2)
+        self.assertEqual([name for name in os.listdir(self.temp_dir.name) if name.endswith(".tmp")], [])
+
+    def test_background_thread(self):
+        compactor = Compactor(self.database, interval_ms=10, io_budget=0)
+        with mock.patch.object(DatabaseConfig, "COMPACTION_MIN_LOG_BYTES", 1):
+            compactor.start()
+            deadline = time.monotonic() + 5
+            while compactor.get_stats()["compacted"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            compactor.stop()
+        stats = compactor.get_stats()
+        self.assertEqual(stats["compacted"], 1)
+        self.assertGreater(stats["reclaimed_bytes"], 0)
+        self.assertEqual(stats["errors"], 0)
+
+    def test_unexpected_error_is_counted(self):
+        compactor = Compactor(self.database, interval_ms=10, io_budget=0)
+        calls = []
+
+        def compact(min_log_bytes, budget):
+            calls.append(min_log_bytes)
+            if len(calls) == 1:
+                raise KeyError("bug")
+            return {"compacted": 0, "skipped": 0, "bytes_written": 0, "reclaimed_bytes": 0}
+
+        with mock.patch.object(self.database, "compact", compact):
+            compactor.start()
+            deadline = time.monotonic() + 5
+            while compactor.get_stats()["runs"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            compactor.stop()
+        # the thread survived the error and ran again
+        stats = compactor.get_stats()
+        self.assertEqual((stats["errors"], stats["unexpected_errors"]), (1, 1))
+        self.assertGreaterEqual(stats["runs"], 1)
+        self.assertEqual(stats["last_error"], "KeyError('bug')")
+
+    def test_background_compaction_is_opt_in(self):
+        with mock.patch.object(Database, "_instances", {}), \
+                mock.patch.object(DatabaseConfig, "BACKEND", DatabaseConfig.BACKEND_JSON):
+            self.assertIsNone(Database.get_instance(self.data_file_path)._compactor._thread)
+        with mock.patch.object(Database, "_instances", {}), \
+                mock.patch.object(DatabaseConfig, "BACKEND", DatabaseConfig.BACKEND_JSON), \
+                mock.patch.object(DatabaseConfig, "COMPACTION", DatabaseConfig.COMPACTION_ON):
+            database = Database.get_instance(self.data_file_path)
+            self.assertIsNotNone(database._compactor._thread)
+            database._compactor.stop()
+
+    def test_commit_checkpoints_full_log_without_background_thread(self):
+        table_file = self.database._table_files["students"]
+        with mock.patch.object(DatabaseConfig, "COMPACTION_MIN_LOG_BYTES", 1000):
+            for i in range(50):
+                self.database.insert_student(Student(f"student_id{i + 100}", "name", f"email{i + 100}", "pass"))
+                self.database.delete_students(f"student_id{i + 100}")
+                # the commit that finds the log full rewrites the data file and drops the log
+                self.assertLess(table_file.get_file_sizes()[1], 1000 + 200)
+        self.assertEqual([student.get_student_id() for student in self.open().read_students()], ["student_id29"])
+
+    def test_sqlite_wal_is_truncated(self):
+        database = SqliteDatabase(self.data_file_path + ".sqlite")
+        try:
+            database.import_from(self.database)
+            report = database.compact(min_log_bytes=0)
+            self.assertEqual(report["compacted"], 1)
+            self.assertEqual(os.path.getsize(self.data_file_path + ".sqlite-wal"), 0)
+        finally:
+            database.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,23 @@
+import os
+import sys
+import tempfile
+import threading
 import unittest
+import weakref
+from unittest import mock
 
+from dao.database.config import DatabaseConfig
+from dao.database import reshard
 from dao.database.database import Database
+from dao.database.pinned_file import PinnedFile
+from dao.database.table_file import TableFile
 from dao.entity.student import Student
 from dao.entity.subject import Subject
+from dao.impl.admin_dao import AdminDao
+from dao.impl.student_dao import StudentDao
+from dao.impl.subject_dao import SubjectDao
+from service.admin_service import AdminService
+from util.exception import PrimaryKeyDuplicationException, UniqueKeyDuplicationException, WriteConflictException
 
 
 class TestDatabase(unittest.TestCase):
@@ -84,5 +99,736 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(len(get_subjects), 1)
 
 
+class TestDatabaseCache(unittest.TestCase):
+
+    def setUp(self):
+        # use a private data file, so the shared student.data is not touched
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = Database(self.data_file_path, layout=DatabaseConfig.LAYOUT_SINGLE)
+        self.database.write_students([Student("student_id1", "student_name1", "email1", "pass1", "c1")])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_unchanged_file_is_parsed_once(self):
+        # own writes keep the cache warm, so repeated reads are all hits
+        self.database.read_students()
+        self.database.read_subjects()
+        self.database.read_admins()
+        stats = self.database.get_cache_stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_changed_file_is_reloaded(self):
+        # another engine on the same file changes its fingerprint
+        other = Database(self.data_file_path, layout=DatabaseConfig.LAYOUT_SINGLE)
+        other.write_students(other.read_students() + [Student("student_id2", "student_name2", "email2", "pass2")])
+
+        students = self.database.read_students()
+        self.assertEqual(len(students), 2)
+        self.assertEqual(self.database.get_cache_stats()["misses"], 2)
+
+    def test_returned_entities_do_not_alias_cache(self):
+        # modifying a read result must not leak into the next read
+        students = self.database.read_students()
+        students[0].set_student_name("changed")
+        students.clear()
+
+        students = self.database.read_students()
+        self.assertEqual(len(students), 1)
+        self.assertEqual(students[0].get_student_name(), "student_name1")
+
+
+class TestKeyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                                 DatabaseConfig.FSYNC_NEVER)
+        self.student_dao = StudentDao(self.database)
+        self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        self.student_dao.add_student(Student("student_id2", "student_name2", "email2", "pass2"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_index_follows_changes(self):
+        self.student_dao.update_student(Student("student_id1", "renamed", "email1", "pass1"))
+        self.student_dao.delete_student_by_id("student_id2")
+        self.student_dao.add_student(Student("student_id3", "student_name3", "email3", "pass3"))
+
+        self.assertEqual(self.student_dao.query_student_info_by_id("student_id1").get_student_name(), "renamed")
+        self.assertIsNone(self.student_dao.query_student_info_by_id("student_id2"))
+        self.assertIsNotNone(self.student_dao.query_student_info_by_id("student_id3"))
+
+        # the index holds exactly the rows in memory, in the order of the table
+        table_file = self.database._table_files["students"]
+        self.assertEqual(len(table_file._table_indexes("students")[("id",)]), 2)
+        self.assertEqual([student.get_student_id() for student in self.database.read_students()],
+                         ["student_id1", "student_id3"])
+
+        # a new engine replays the log into a fresh index
+        reopened = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                            DatabaseConfig.FSYNC_NEVER)
+        self.assertEqual(reopened.find_student_by_id("student_id1").get_student_name(), "renamed")
+        self.assertIsNone(reopened.find_student_by_id("student_id2"))
+
+    def test_duplicate_check_uses_index(self):
+        with self.assertRaises(PrimaryKeyDuplicationException):
+            self.student_dao.add_student(Student("student_id1", "other", "email9", "pass9"))
+        with self.assertRaises(UniqueKeyDuplicationException):
+            self.student_dao.update_student(Student("student_id1", "student_name1", "email2", "pass1"))
+
+        # the check is answered without building student entities of the whole table
+        with mock.patch.object(Database, "read_students", side_effect=AssertionError):
+            self.student_dao.add_student(Student("student_id4", "student_name4", "email4", "pass4"))
+
+
+class TestEmailIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_database(self, email_case, file_format=DatabaseConfig.FORMAT_JSON,
+                      read_mode=DatabaseConfig.READ_EAGER):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                        DatabaseConfig.FSYNC_NEVER, file_format, read_mode, email_case)
+
+    def test_index_follows_email_change(self):
+        database = self.open_database(DatabaseConfig.EMAIL_CASE_SENSITIVE)
+        student_dao = StudentDao(database)
+        student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        student_dao.update_student(Student("student_id1", "student_name1", "email2", "pass1"))
+
+        self.assertIsNone(student_dao.query_student_by_email("email1"))
+        self.assertEqual(student_dao.query_student_by_email("email2").get_student_id(), "student_id1")
+        self.assertIsNone(student_dao.query_student_by_email("EMAIL2"))
+
+        # the old email is free again
+        student_dao.add_student(Student("student_id2", "student_name2", "email1", "pass2"))
+        student_dao.delete_student_by_id("student_id2")
+        self.assertIsNone(student_dao.query_student_by_email("email1"))
+
+    def test_case_insensitive(self):
+        database = self.open_database(DatabaseConfig.EMAIL_CASE_INSENSITIVE, DatabaseConfig.FORMAT_BINARY)
+        student_dao = StudentDao(database)
+        student_dao.add_student(Student("student_id1", "student_name1", "Email1@Uni.com", "pass1"))
+        self.assertEqual(student_dao.query_student_by_email("email1@uni.com").get_student_id(), "student_id1")
+        with self.assertRaises(UniqueKeyDuplicationException):
+            student_dao.add_student(Student("student_id2", "student_name2", "EMAIL1@uni.com", "pass2"))
+
+        # a mapped binary file is looked up the same way
+        database.checkpoint()
+        mapped = self.open_database(DatabaseConfig.EMAIL_CASE_INSENSITIVE, DatabaseConfig.FORMAT_BINARY,
+                                    DatabaseConfig.READ_MMAP)
+        self.assertEqual(mapped.find_student_by_email("EMAIL1@UNI.COM").get_student_id(), "student_id1")
+
+
+class TestEnrollmentIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                                 DatabaseConfig.FSYNC_NEVER)
+        self.subject_dao = SubjectDao(self.database)
+        for student_id, subject_id in [("s1", "a"), ("s2", "a"), ("s1", "b"), ("s1", "c")]:
+            self.subject_dao.add_subject(Subject(student_id, subject_id, 60, "P"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_index_follows_changes(self):
+        self.subject_dao.update_subject(Subject("s1", "a", 90, "HD"))
+        self.subject_dao.delete_subject_by_student_and_subject("s1", "b")
+
+        # enrollments of a student in table order, an update moves to the end
+        subjects = self.subject_dao.query_subject_list_by_student_id("s1")
+        self.assertEqual([subject.get_subject_id() for subject in subjects], ["c", "a"])
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("s1"), 2)
+        self.assertEqual(self.subject_dao.query_subject_by_student_and_subject("s1", "a").get_subject_mark(), 90)
+        self.assertIsNone(self.subject_dao.query_subject_by_student_and_subject("s1", "b"))
+
+        self.subject_dao.delete_subject_list_by_student_id("s1")
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("s1"), 0)
+        self.assertEqual([subject.get_student_id() for subject in self.database.read_subjects()], ["s2"])
+
+    def test_duplicate_check_uses_index(self):
+        with self.assertRaises(PrimaryKeyDuplicationException):
+            self.subject_dao.add_subject(Subject("s2", "a", 70, "C"))
+        with mock.patch.object(Database, "read_subjects", side_effect=AssertionError):
+            self.subject_dao.add_subject(Subject("s2", "b", 70, "C"))
+
+    def test_mapped_lookups(self):
+        self.database.checkpoint()
+        for file_format in (DatabaseConfig.FORMAT_JSON, DatabaseConfig.FORMAT_BINARY):
+            Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                     DatabaseConfig.FSYNC_NEVER, file_format).checkpoint()
+            mapped = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                              DatabaseConfig.FSYNC_NEVER, file_format, DatabaseConfig.READ_MMAP)
+            self.assertEqual(mapped.count_subjects_by_student_id("s1"), 3)
+            self.assertEqual(mapped.find_subject("s1", "c").get_subject_id(), "c")
+            self.assertIsNone(mapped.find_subject("s2", "c"))
+
+
+class TestDatabaseRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_instance_is_shared_per_file(self):
+        database = Database.get_instance(self.data_file_path)
+        # same file, even through a different spelling of the path, gives the same engine
+        self.assertIs(database, Database.get_instance(os.path.join(self.temp_dir.name, '.', 'student.data')))
+        # another file gives another engine
+        self.assertIsNot(database, Database.get_instance(os.path.join(self.temp_dir.name, 'other.data')))
+
+    def test_default_daos_share_one_engine(self):
+        self.assertIs(StudentDao()._database, SubjectDao()._database)
+        self.assertIs(StudentDao()._database, AdminDao()._database)
+
+    def test_injected_engine_is_used(self):
+        database = Database.get_instance(self.data_file_path)
+        student_dao = StudentDao(database)
+        student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+
+        self.assertEqual(len(database.read_students()), 1)
+        self.assertIsNotNone(StudentDao(database).query_student_info_by_id("student_id1"))
+
+
+class TestSplitLayout(unittest.TestCase):
+
+    def setUp(self):
+        # a single data file with data, to be migrated
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        database = Database(self.data_file_path, layout=DatabaseConfig.LAYOUT_SINGLE)
+        database.write_students([Student("student_id1", "student_name1", "email1", "pass1", "c1")])
+        database.write_subjects([Subject("student_id1", "subject_id1", 89, "D")])
+
+        self.database = Database(self.data_file_path, layout=DatabaseConfig.LAYOUT_SPLIT)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_migration(self):
+        self.assertTrue(os.path.exists(self.data_file_path + ".manifest"))
+        self.assertTrue(os.path.exists(self.data_file_path + ".bak"))
+        self.assertFalse(os.path.exists(self.data_file_path))
+        self.assertEqual(len(self.database.read_students()), 1)
+        self.assertEqual(len(self.database.read_subjects()), 1)
+
+        # the manifest decides the layout, whatever is configured
+        database = Database(self.data_file_path, layout=DatabaseConfig.LAYOUT_SINGLE)
+        self.assertEqual(database.get_layout(), DatabaseConfig.LAYOUT_SPLIT)
+        self.assertEqual(len(database.read_students()), 1)
+
+    def test_subject_write_does_not_touch_students(self):
+        students_file_path = self.data_file_path + ".students"
+        stat = os.stat(students_file_path)
+
+        self.database.write_subjects([Subject("student_id1", "subject_id2", 70, "C")])
+        self.database.update_subject(Subject("student_id1", "subject_id2", 40, "Z"))
+
+        self.assertEqual(os.stat(students_file_path).st_mtime_ns, stat.st_mtime_ns)
+        self.assertEqual(self.database.read_subjects()[0].get_subject_mark(), 40)
+
+    def test_read_students_only_parses_students(self):
+        self.database.read_students()
+        self.database.read_students()
+        self.assertEqual(self.database.get_cache_stats(), {"hits": 1, "misses": 1})
+
+
+class TestTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self, storage_mode):
+        database = Database(self.data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE)
+        student_dao, subject_dao = StudentDao(database), SubjectDao(database)
+        student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        subject_dao.add_subject(Subject("student_id1", "subject_id1", 90, "HD"))
+        return database, student_dao, subject_dao
+
+    def test_changes_are_written_once(self):
+        for storage_mode in (DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.STORAGE_WAL):
+            with self.subTest(storage_mode=storage_mode):
+                database, student_dao, subject_dao = self.open(storage_mode)
+                with mock.patch.object(database._file_sync, "write_atomic",
+                                       wraps=database._file_sync.write_atomic) as write_atomic, \
+                        mock.patch.object(database._file_sync, "append",
+                                          wraps=database._file_sync.append) as append:
+                    with subject_dao.transaction():
+                        subject_dao.add_subject(Subject("student_id1", "subject_id2"))
+                        # reads inside the transaction see its changes
+                        subject_dao.update_subject(Subject("student_id1", "subject_id2", 70, "C"))
+                        student_dao.delete_student_by_id("student_id1")
+                        self.assertEqual(write_atomic.call_count + append.call_count, 0)
+                    self.assertEqual(write_atomic.call_count + append.call_count, 1)
+
+                reopened = Database(self.data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE)
+                self.assertEqual(reopened.read_students(), [])
+                self.assertEqual(reopened.find_subject("student_id1", "subject_id2").get_subject_mark(), 70)
+                database.delete_data_file()
+
+    def test_rollback_on_exception(self):
+        for storage_mode in (DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.STORAGE_WAL):
+            with self.subTest(storage_mode=storage_mode):
+                database, student_dao, subject_dao = self.open(storage_mode)
+                with self.assertRaises(PrimaryKeyDuplicationException):
+                    with database.transaction():
+                        subject_dao.delete_subject_list_by_student_id("student_id1")
+                        student_dao.add_student(Student("student_id2", "student_name2", "email2", "pass2"))
+                        student_dao.add_student(Student("student_id2", "student_name2", "email3", "pass2"))
+
+                # neither the engine nor a new one sees any change of the block
+                for engine in (database, Database(self.data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE)):
+                    self.assertIsNone(engine.find_student_by_id("student_id2"))
+                    self.assertEqual(engine.count_subjects_by_student_id("student_id1"), 1)
+                database.delete_data_file()
+
+
+class TestDirtyWrites(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = self.open()
+        self.database.insert_students([Student(f"student_id{i}", f"name{i}", f"email{i}", "pass") for i in range(50)])
+        self.database.insert_subjects([Subject(f"student_id{i}", "subject_id1", 60, "P") for i in range(50)])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE)
+
+    def test_setters_track_changes(self):
+        subject = self.database.find_subject("student_id1", "subject_id1")
+        self.assertEqual(subject.get_dirty_fields(), set())
+        subject.set_subject_mark(90)
+        subject.set_subject_grade("HD")
+        self.assertEqual(subject.get_dirty_fields(), {"mark", "grade"})
+        SubjectDao(self.database).update_subject(subject)
+        self.assertEqual(subject.get_dirty_fields(), set())
+
+    def test_patch_is_appended_as_delta(self):
+        subject = self.database.find_subject("student_id7", "subject_id1")
+        subject.set_subject_mark(90)
+        student = self.database.find_student_by_id("student_id7")
+        student.set_student_password("new_pass")
+        with mock.patch.object(self.database._file_sync, "write_atomic") as write_atomic, \
+                mock.patch.object(self.database._file_sync, "append",
+                                  wraps=self.database._file_sync.append) as append:
+            SubjectDao(self.database).update_subject(subject)
+            StudentDao(self.database).update_student(student)
+        write_atomic.assert_not_called()
+        # only the changed columns are written
+        self.assertEqual(len(append.call_args_list), 2)
+        self.assertNotIn("email7", append.call_args_list[1][0][1])
+        self.assertIn('"set":{"mark":90}', append.call_args_list[0][0][1])
+
+        reopened = self.open()
+        self.assertEqual(reopened.find_subject("student_id7", "subject_id1").get_subject_mark(), 90)
+        self.assertEqual(reopened.find_student_by_id("student_id7").get_student_password(), "new_pass")
+        self.assertEqual(reopened.find_student_by_email("email7").get_student_name(), "name7")
+
+    def test_whole_rows_are_rewritten(self):
+        # a changed key column, or an entity without tracked changes, replaces the whole row as before
+        student = self.database.find_student_by_id("student_id7")
+        student.set_student_email("new_email7")
+        with mock.patch.object(self.database._file_sync, "write_atomic",
+                               wraps=self.database._file_sync.write_atomic) as write_atomic:
+            StudentDao(self.database).update_student(student)
+            self.database.update_subject(Subject("student_id7", "subject_id1", 80, "D"))
+        self.assertEqual(write_atomic.call_count, 2)
+        self.assertEqual(self.open().find_student_by_email("new_email7").get_student_id(), "student_id7")
+
+    def test_new_entity_is_written_whole(self):
+        # the constructor values of an entity created by the caller are not tracked, so a setter makes no patch
+        student = Student("student_id7", "new_name7", "new_email7", "new_pass", "PASS")
+        student.set_student_category("FAIL")
+        self.assertFalse(student.is_loaded())
+        self.assertEqual(Database._update_record("students", student)["op"], "update")
+        StudentDao(self.database).update_student(student)
+
+        stored = self.open().find_student_by_id("student_id7")
+        self.assertEqual((stored.get_student_name(), stored.get_student_email(), stored.get_student_password(),
+                          stored.get_student_category()), ("new_name7", "new_email7", "new_pass", "FAIL"))
+        # once saved whole, its next changes are tracked
+        self.assertTrue(student.is_loaded())
+        student.set_student_password("newer_pass")
+        self.assertEqual(Database._update_record("students", student)["op"], "patch")
+
+    def test_delta_is_folded_in(self):
+        table_file = self.database._table_files["students"]
+        with mock.patch.object(DatabaseConfig, "DELTA_MAX_BYTES", 300):
+            for mark in range(10):
+                subject = self.database.find_subject("student_id1", "subject_id1")
+                subject.set_subject_mark(mark)
+                self.database.update_subject(subject)
+                self.assertLess(table_file.get_file_sizes()[1], 400)
+        self.assertEqual(self.open().find_subject("student_id1", "subject_id1").get_subject_mark(), 9)
+
+    def test_patch_of_deleted_row(self):
+        subject = self.database.find_subject("student_id1", "subject_id1")
+        self.open().delete_subjects("student_id1")
+        subject.set_subject_mark(90)
+        self.database.update_subject(subject)
+        self.assertIsNone(self.open().find_subject("student_id1", "subject_id1"))
+
+
+class TestOptimisticConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        # two engines of one file behave like two processes
+        self.database, self.other = self.open(), self.open()
+        StudentDao(self.database).add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                        concurrency=DatabaseConfig.CONCURRENCY_OPTIMISTIC)
+
+    def rename(self, database, name):
+        student = database.find_student_by_id("student_id1")
+        student.set_student_name(name)
+        StudentDao(database).update_student(student)
+
+    def test_conflicting_commit_is_not_written(self):
+        with self.assertRaises(WriteConflictException):
+            with self.database.transaction():
+                self.rename(self.database, "mine")
+                self.rename(self.other, "theirs")
+        self.assertEqual(self.database.find_student_by_id("student_id1").get_student_name(), "theirs")
+        self.assertEqual(self.open().find_student_by_id("student_id1").get_student_name(), "theirs")
+
+    def test_conflict_is_retried_on_new_rows(self):
+        attempts = []
+
+        def change_password():
+            student = self.database.find_student_by_id("student_id1")
+            if not attempts:
+                self.rename(self.other, "theirs")
+            attempts.append(student.get_student_name())
+            student.set_student_password("new_pass")
+            self.database.update_student(student)
+
+        self.database.run_transaction(change_password)
+        self.assertEqual(attempts, ["student_name1", "theirs"])
+        student = self.open().find_student_by_id("student_id1")
+        self.assertEqual((student.get_student_name(), student.get_student_password()), ("theirs", "new_pass"))
+        self.assertEqual(self.database.get_lock_stats()["conflicts"], 1)
+
+    def test_retries_are_bounded(self):
+        with self.assertRaises(WriteConflictException):
+            self.database.run_transaction(lambda: (self.rename(self.database, "mine"),
+                                                   self.rename(self.other, "theirs")), retries=2)
+        self.assertEqual(self.database.get_lock_stats()["conflicts"], 3)
+
+    def test_reads_take_no_lock(self):
+        self.rename(self.other, "theirs")
+        stats = self.database.get_lock_stats()
+        self.assertEqual(self.database.find_student_by_id("student_id1").get_student_name(), "theirs")
+        self.assertEqual(len(self.database.read_students()), 1)
+        self.assertEqual(self.database.get_lock_stats()["shared"], stats["shared"])
+
+
+class TestSnapshotThreading(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.temp_dir.name, 'student.data'), DatabaseConfig.STORAGE_WAL,
+                                 DatabaseConfig.LAYOUT_SINGLE, threading_mode=DatabaseConfig.THREADING_SNAPSHOT)
+        self.student_dao = StudentDao(self.database)
+        self.student_dao.add_student(Student("student_id0", "student_name0", "email0", "pass0"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_published_version_is_not_changed(self):
+        snapshot = self.database._table_files["students"].get_snapshot()
+        rows = snapshot.get_rows("students")
+        self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        self.database.delete_students("student_id0")
+
+        self.assertEqual([row[0] for row in rows], ["student_id0"])
+        self.assertEqual(snapshot.find_indexed("students", ("id",), "student_id1"), [])
+        self.assertEqual(len(snapshot.find_indexed("students", ("email",), "email0")), 1)
+        self.assertEqual([student.get_student_id() for student in self.database.read_students()], ["student_id1"])
+
+    def test_reads_take_no_lock(self):
+        stats = self.database.get_lock_stats()
+        self.assertEqual(self.database.find_student_by_email("email0").get_student_id(), "student_id0")
+        self.assertEqual(len(self.database.read_students()), 1)
+        self.assertEqual(self.database.count_subjects_by_student_id("student_id0"), 0)
+        self.assertEqual(self.database.get_lock_stats()["shared"], stats["shared"])
+
+    def test_cache_stats_of_concurrent_readers(self):
+        before = self.database.get_cache_stats()
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=lambda: [self.database.read_students() for _ in range(500)])
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        # no count of one reader is lost to another
+        after = self.database.get_cache_stats()
+        self.assertEqual(after["hits"] + after["misses"] - before["hits"] - before["misses"], 2000)
+
+    def test_transaction_is_not_seen_by_other_threads(self):
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append(self.database.find_student_by_id("student_id1")))
+        with self.database.transaction():
+            self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+            self.assertIsNotNone(self.database.find_student_by_id("student_id1"))
+            reader.start()
+            reader.join()
+        self.assertEqual(seen, [None])
+        self.assertIsNotNone(self.database.find_student_by_id("student_id1"))
+
+    def test_readers_alongside_writer(self):
+        errors = []
+        done = threading.Event()
+
+        def read():
+            # every version a reader sees is complete, and later versions never have fewer students
+            count = 0
+            try:
+                while not done.is_set():
+                    students = self.database.read_students()
+                    self.assertGreaterEqual(len(students), count)
+                    count = len(students)
+                    for student in students:
+                        self.assertIsNotNone(self.database.find_student_by_email(student.get_student_email()))
+            except Exception as exception:
+                errors.append(exception)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for index in range(1, 51):
+            self.student_dao.add_student(Student(f"student_id{index}", "name", f"email{index}", "pass"))
+        done.set()
+        for reader in readers:
+            reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.database.read_students()), 51)
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = self.open(DatabaseConfig.LAYOUT_SPLIT)
+        StudentDao(self.database).add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        SubjectDao(self.database).add_subject(Subject("student_id1", "subject_id1", 90, "HD"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self, layout):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, layout)
+
+    def remove_student(self, database):
+        database.delete_subjects("student_id1")
+        database.delete_students("student_id1")
+
+    def test_writes_meanwhile_are_not_seen(self):
+        other = self.open(DatabaseConfig.LAYOUT_SPLIT)
+        with self.database.snapshot():
+            self.assertEqual(len(self.database.read_subjects()), 1)
+            # another process and the engine itself write meanwhile, without waiting for the snapshot
+            self.remove_student(other)
+            SubjectDao(self.database).add_subject(Subject("student_id1", "subject_id2", 50, "P"))
+            self.assertEqual([student.get_student_name() for student in self.database.iter_students()],
+                             ["student_name1"])
+            self.assertEqual(self.database.count_subjects_by_student_id("student_id1"), 1)
+            self.assertIsNotNone(self.database.find_student_by_email("email1"))
+        self.assertIsNone(self.database.find_student_by_id("student_id1"))
+        self.assertEqual(self.database.find_subjects_by_student_id("student_id1")[0].get_subject_id(), "subject_id2")
+
+    def test_other_threads_are_not_pinned(self):
+        seen = []
+        with self.database.snapshot():
+            thread = threading.Thread(target=lambda: (self.remove_student(self.database),
+                                                      seen.append(self.database.read_students())))
+            thread.start()
+            thread.join()
+            self.assertEqual(len(self.database.read_students()), 1)
+        self.assertEqual(seen, [[]])
+
+    def test_version_is_released(self):
+        with self.database.snapshot():
+            version = weakref.ref(self.database._snapshot_of(self.database._table_files["students"]))
+        self.remove_student(self.database)
+        self.assertIsNone(version())
+
+    @unittest.skipIf(os.name == "nt", "a snapshot pins the rows in memory on Windows")
+    def test_report_streams_pinned_file(self):
+        for file_format in (DatabaseConfig.FORMAT_JSON, DatabaseConfig.FORMAT_BINARY):
+            with self.subTest(file_format=file_format):
+                path = os.path.join(self.temp_dir.name, f'{file_format}.data')
+                writer = Database(path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                                  file_format=file_format)
+                writer.write_subjects([Subject(f"student_id{i}", "subject_id1", i, "P") for i in range(10)])
+                database = Database(path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                                    file_format=file_format)
+                table_file = database._table_files["subjects"]
+
+                with database.snapshot():
+                    self.assertIsInstance(database._snapshot_of(table_file), PinnedFile)
+                    subjects = database.iter_subjects(chunk_size=3)
+                    self.assertEqual(next(subjects).get_student_id(), "student_id0")
+                    # the data file is replaced meanwhile, the report keeps reading its generation
+                    writer.delete_subjects("student_id5")
+                    self.assertEqual(len(list(subjects)), 9)
+                    self.assertEqual(database.count_subjects_by_student_id("student_id5"), 1)
+                    # nothing was loaded into the table file
+                    self.assertIsNone(table_file._fingerprint)
+                self.assertEqual(len(database.read_subjects()), 9)
+
+    def test_report_joins_one_version(self):
+        admin_service = AdminService()
+        admin_service._student_dao = StudentDao(self.database)
+        admin_service._subject_dao = SubjectDao(self.database)
+
+        # the student is removed after the subjects are read, before the names are
+        query_student_names = admin_service._query_student_names
+        def remove_then_query():
+            self.remove_student(self.open(DatabaseConfig.LAYOUT_SPLIT))
+            return query_student_names()
+        admin_service._query_student_names = remove_then_query
+
+        self.assertEqual(admin_service.partition_students(), (["student_name1 :: student_id1 --> GRADE: HD - MARK: 90"],
+                                                              []))
+
+
+class TestShardedLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        # students and enrollments written in single layout, then migrated
+        single = Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE)
+        self.students = [Student(f"student_id{i}", f"student_name{i}", f"email{i}", "pass") for i in range(20)]
+        single.write_students(self.students)
+        single.write_subjects([Subject(f"student_id{i}", "subject_id1", 50 + i, "P") for i in range(20)])
+        self.database = self.open(3)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self, shard_count):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SHARDED,
+                        shard_count=shard_count)
+
+    def shard_files(self):
+        return sorted(name for name in os.listdir(self.temp_dir.name) if ".shard" in name)
+
+    def test_migration(self):
+        self.assertEqual(self.database.get_layout(), DatabaseConfig.LAYOUT_SHARDED)
+        self.assertEqual(self.shard_files(), [f"student.data.shard{i}of3" for i in range(3)])
+        self.assertTrue(os.path.exists(self.data_file_path + ".bak"))
+        self.assertEqual(sorted(student.get_student_id() for student in self.database.read_students()),
+                         sorted(student.get_student_id() for student in self.students))
+        self.assertEqual(len(list(self.database.iter_subjects())), 20)
+        # an existing manifest wins over the configured layout
+        self.assertEqual(Database(self.data_file_path).get_shard_count(), 3)
+
+    def test_point_operations_touch_one_shard(self):
+        def stats():
+            return {name: os.stat(os.path.join(self.temp_dir.name, name)).st_mtime_ns
+                    for name in os.listdir(self.temp_dir.name) if name.endswith(("of3", ".emails"))}
+        before = stats()
+        SubjectDao(self.database).add_subject(Subject("student_id7", "subject_id2", 70, "C"))
+        shard = f"student.data.shard{Database.shard_of('student_id7', 3)}of3"
+        self.assertEqual([name for name, mtime in stats().items() if mtime != before[name]], [shard])
+
+        self.assertEqual(self.database.count_subjects_by_student_id("student_id7"), 2)
+        self.assertEqual(self.database.find_subject("student_id7", "subject_id2").get_subject_mark(), 70)
+
+    def test_global_email_index(self):
+        student_dao = StudentDao(self.database)
+        self.assertEqual(student_dao.query_student_by_email("email13").get_student_id(), "student_id13")
+        with self.assertRaises(UniqueKeyDuplicationException):
+            student_dao.add_student(Student("student_id99", "student_name99", "email13", "pass"))
+
+        student = self.database.find_student_by_id("student_id13")
+        student.set_student_email("new_email13")
+        self.database.update_student(student)
+        self.assertIsNone(self.database.find_student_by_email("email13"))
+        self.assertEqual(self.database.find_student_by_email("new_email13").get_student_id(), "student_id13")
+
+        self.database.delete_students("student_id13")
+        self.assertIsNone(self.database.find_student_by_email("new_email13"))
+        # a new engine, like another process, reads the index from its file
+        self.assertEqual(self.open(3).find_student_by_email("email5").get_student_id(), "student_id5")
+
+    def test_recover_rebuilds_email_index(self):
+        # a crash after a shard was written and before the index: the index misses the email of student_id13
+        index_file = self.database._table_files["emails"]
+        index_file.set_rows("emails", [row for row in index_file.get_rows("emails") if row[0] != "email13"])
+        index_file.overwrite()
+        database = self.open(3)
+        self.assertIsNone(database.find_student_by_email("email13"))
+
+        self.assertEqual(database.recover()["repaired"], 1)
+        self.assertEqual(database.find_student_by_email("email13").get_student_id(), "student_id13")
+        with self.assertRaises(UniqueKeyDuplicationException):
+            StudentDao(database).add_student(Student("student_id99", "student_name99", "email13", "pass"))
+        self.assertEqual(self.open(3).recover()["repaired"], 0)
+
+    def test_shards_are_loaded_in_parallel(self):
+        threads = set()
+        load = TableFile.load
+
+        def record_thread(table_file):
+            threads.add(threading.current_thread().name)
+            return load(table_file)
+        with mock.patch.object(TableFile, "load", record_thread):
+            self.assertEqual(len(self.open(3).read_subjects()), 20)
+        self.assertTrue(all(name.startswith("shard") for name in threads))
+
+    def test_reshard(self):
+        reshard.main(["--shards", "5", "--data-file", self.data_file_path])
+        self.assertEqual(self.shard_files(), [f"student.data.shard{i}of5" for i in range(5)])
+
+        database = self.open(3)
+        self.assertEqual(database.get_shard_count(), 5)
+        for shard, table_file in enumerate(database._shards):
+            table_file.load()
+            self.assertTrue(all(Database.shard_of(row[0], 5) == shard for row in table_file.get_rows("students")))
+        self.assertEqual(len(database.read_students()), 20)
+        self.assertEqual(len(database.read_subjects()), 20)
+        self.assertEqual(database.find_student_by_email("email3").get_student_id(), "student_id3")
+
+
 if __name__ == '__main__':
     unittest.main()
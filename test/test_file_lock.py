@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.file_lock import FileLock
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from dao.impl.student_dao import StudentDao
+from dao.impl.subject_dao import SubjectDao
+from util.exception import LockTimeoutException
+
+
+def enroll_students(data_file_path, storage_mode, concurrency, worker, count):
+    # one clerk terminal: its own engine adding students and enrollments one by one
+    DatabaseConfig.CAS_RETRIES = 100
+    database = Database(data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE, concurrency=concurrency)
+    student_dao, subject_dao = StudentDao(database), SubjectDao(database)
+    for i in range(count):
+        student_id = f"student_{worker}_{i}"
+        student_dao.add_student(Student(student_id, "name", f"{student_id}@uni", "pass"))
+        subject_dao.add_subject(Subject(student_id, "subject_id1", 80, "D"))
+
+
+class TestFileLock(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lock_file_path = os.path.join(self.temp_dir.name, 'student.data.lock')
+        # flock is held per open file, so two FileLock objects behave like two processes
+        self.lock = FileLock(self.lock_file_path, timeout_ms=50)
+        self.other = FileLock(self.lock_file_path, timeout_ms=50)
+
+    def tearDown(self):
+        self.lock.close()
+        self.other.close()
+        self.temp_dir.cleanup()
+
+    def test_shared_locks_do_not_exclude_each_other(self):
+        with self.lock.shared(), self.other.shared():
+            pass
+        self.assertEqual(self.other.get_stats()["waits"], 0)
+
+    def test_exclusive_lock_times_out(self):
+        with self.lock.shared():
+            with self.assertRaises(LockTimeoutException):
+                with self.other.exclusive():
+                    pass
+        stats = self.other.get_stats()
+        self.assertEqual((stats["exclusive"], stats["timeouts"]), (0, 1))
+
+        # nothing is held after a timeout
+        with self.other.exclusive():
+            with self.assertRaises(LockTimeoutException):
+                with self.lock.shared():
+                    pass
+
+    def test_generation(self):
+        self.assertEqual(self.other.read_generation(), 0)
+        with self.lock.exclusive():
+            with self.lock.writing() as generation:
+                self.assertEqual((generation, self.other.read_generation()), (1, 1))
+        self.assertEqual(self.other.read_generation(), 2)
+
+    def test_nested_acquire_and_upgrade(self):
+        with self.lock.shared():
+            with self.lock.exclusive():
+                with self.lock.shared():
+                    pass
+            with self.assertRaises(LockTimeoutException):
+                with self.other.shared():
+                    pass
+        with self.other.exclusive():
+            pass
+        self.assertEqual(self.lock.get_stats()["shared"], 2)
+
+
+class TestConcurrentProcesses(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_no_lost_updates(self):
+        for storage_mode, concurrency in ((DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.CONCURRENCY_LOCKING),
+                                          (DatabaseConfig.STORAGE_WAL, DatabaseConfig.CONCURRENCY_LOCKING),
+                                          (DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.CONCURRENCY_OPTIMISTIC),
+                                          (DatabaseConfig.STORAGE_WAL, DatabaseConfig.CONCURRENCY_OPTIMISTIC)):
+            with self.subTest(storage_mode=storage_mode, concurrency=concurrency):
+                generation = FileLock(self.data_file_path + ".lock").read_generation()
+                processes = [multiprocessing.Process(target=enroll_students,
+                                                     args=(self.data_file_path, storage_mode, concurrency, worker, 15))
+                             for worker in range(4)]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+                self.assertEqual([process.exitcode for process in processes], [0] * 4)
+
+                database = Database(self.data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE)
+                self.assertEqual(len(database.read_students()), 60)
+                self.assertEqual(len(database.read_subjects()), 60)
+                # two generations per commit, one commit per student and per enrollment
+                self.assertEqual(FileLock(self.data_file_path + ".lock").read_generation() - generation, 2 * 120)
+                # the files are deleted as one write, so optimistic readers retry instead of reading half of them
+                database.delete_data_file()
+                self.assertEqual(FileLock(self.data_file_path + ".lock").read_generation() - generation, 2 * 121)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from dao.database.config import DatabaseConfig
+from dao.database.file_sync import FileSync
+
+
+class TestFileSync(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_write_atomic_replaces_file(self):
+        file_sync = FileSync(DatabaseConfig.FSYNC_ALWAYS)
+        file_sync.write_atomic(self.path, "old")
+        inode = os.stat(self.path).st_ino
+        file_sync.write_atomic(self.path, b"new")
+
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "new")
+        # a new file is renamed into place and no temp file is left behind
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(os.listdir(self.temp_dir.name), ['student.data'])
+
+    def test_failed_write_keeps_old_file(self):
+        file_sync = FileSync(DatabaseConfig.FSYNC_NEVER)
+        file_sync.write_atomic(self.path, "old")
+
+        with self.assertRaises(TypeError):
+            file_sync.write_atomic(self.path, 42)
+
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "old")
+        self.assertEqual(os.listdir(self.temp_dir.name), ['student.data'])
+
+    def test_policies(self):
+        always = FileSync(DatabaseConfig.FSYNC_ALWAYS)
+        always.append(self.path, "1\n")
+        always.append(self.path, "2\n")
+        # file twice, directory once for the new file
+        self.assertEqual(always.get_sync_count(), 3)
+
+        never = FileSync(DatabaseConfig.FSYNC_NEVER)
+        never.append(self.path, "3\n")
+        never.flush()
+        self.assertEqual(never.get_sync_count(), 0)
+
+        # group commit: many appends, one fsync for the file and one for its directory
+        interval = FileSync(DatabaseConfig.FSYNC_INTERVAL, interval_ms=60000)
+        for i in range(10):
+            interval.append(self.path, f"{i}\n")
+        interval.flush()
+        self.assertEqual(interval.get_sync_count(), 2)
+
+    def test_interval_syncs_data_file_before_rename(self):
+        interval = FileSync(DatabaseConfig.FSYNC_INTERVAL, interval_ms=60000)
+        interval.write_atomic(self.path, "data")
+        self.assertEqual(interval.get_sync_count(), 1)
+        # only the directory of the rename is left to the group commit
+        interval.flush()
+        self.assertEqual(interval.get_sync_count(), 2)
+
+    def test_flush_does_not_create_deleted_file(self):
+        interval = FileSync(DatabaseConfig.FSYNC_INTERVAL, interval_ms=60000)
+        interval.append(self.path, "1\n")
+        os.remove(self.path)
+        interval.flush()
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.index_file import IndexFile
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+
+
+class TestIndexFile(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.index_file_path = self.data_file_path + ".idx"
+
+        database = self.open_database(DatabaseConfig.STORAGE_OVERWRITE)
+        database.write_students([Student("student_id1", "student_name1", "Email1", "pass1"),
+                                 Student("student_id2", "student_name2", "email2", "pass2")])
+        database.write_subjects([Subject("student_id1", "subject_id1", 90, "HD"),
+                                 Subject("student_id2", "subject_id1", 40, "Z"),
+                                 Subject("student_id1", "subject_id2", 60, "P")])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_database(self, storage_mode=DatabaseConfig.STORAGE_WAL, email_case=DatabaseConfig.EMAIL_CASE_SENSITIVE):
+        return Database(self.data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE, DatabaseConfig.FSYNC_NEVER,
+                        DatabaseConfig.FORMAT_JSON, DatabaseConfig.READ_EAGER, email_case, DatabaseConfig.INDEX_FILES_ON)
+
+    def assert_lookups(self, database):
+        self.assertEqual(database.find_student_by_id("student_id2").get_student_email(), "email2")
+        self.assertEqual(database.find_student_by_email("Email1").get_student_id(), "student_id1")
+        self.assertIsNone(database.find_student_by_id("student_id3"))
+        self.assertEqual(database.find_subject("student_id1", "subject_id2").get_subject_mark(), 60)
+        self.assertEqual([subject.get_subject_id() for subject in database.find_subjects_by_student_id("student_id1")],
+                         ["subject_id1", "subject_id2"])
+        self.assertEqual(database.count_subjects_by_student_id("student_id2"), 1)
+
+    def test_cold_lookups_skip_parsing(self):
+        # the first cold engine finds no index file, parses the data file and writes it
+        first = self.open_database()
+        self.assert_lookups(first)
+        self.assertEqual(first.get_cache_stats()["misses"], 1)
+        self.assertTrue(os.path.exists(self.index_file_path))
+
+        # the next cold engine answers every lookup from the index file
+        second = self.open_database()
+        self.assert_lookups(second)
+        self.assertEqual(second.get_cache_stats(), {"hits": 0, "misses": 0})
+
+    def test_changed_data_file_rebuilds_index(self):
+        self.open_database().find_student_by_id("student_id1")
+        self.open_database().insert_student(Student("student_id3", "student_name3", "email3", "pass3"))
+        self.open_database().checkpoint()
+
+        # the generation does not match, so the lookup parses the data file and rewrites the index file
+        database = self.open_database()
+        self.assertEqual(database.find_student_by_email("email3").get_student_id(), "student_id3")
+        self.assertEqual(database.get_cache_stats()["misses"], 1)
+
+        database = self.open_database()
+        self.assertEqual(database.find_student_by_id("student_id3").get_student_name(), "student_name3")
+        self.assertEqual(database.get_cache_stats()["misses"], 0)
+
+    def test_log_changes_are_not_missed(self):
+        self.open_database().find_student_by_id("student_id1")
+        self.open_database().delete_students("student_id1")
+
+        database = self.open_database()
+        self.assertIsNone(database.find_student_by_id("student_id1"))
+        self.assertEqual(database.get_cache_stats()["misses"], 1)
+
+    def test_corrupt_index_file_is_ignored(self):
+        self.open_database().find_student_by_id("student_id1")
+        with open(self.index_file_path, 'r+b') as file:
+            file.seek(-1, os.SEEK_END)
+            last = file.read(1)
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes([last[0] ^ 0xff]))
+
+        database = self.open_database()
+        self.assert_lookups(database)
+        self.assertEqual(database.get_cache_stats()["misses"], 1)
+
+    def test_hash_collisions_are_filtered(self):
+        with mock.patch.object(IndexFile, "key_hashes", side_effect=lambda keys: [7] * len(keys)):
+            self.open_database().find_student_by_id("student_id1")
+            database = self.open_database()
+            self.assert_lookups(database)
+            self.assertEqual(database.get_cache_stats()["misses"], 0)
+
+    def test_case_insensitive_email(self):
+        self.open_database(email_case=DatabaseConfig.EMAIL_CASE_INSENSITIVE).find_student_by_id("student_id1")
+        database = self.open_database(email_case=DatabaseConfig.EMAIL_CASE_INSENSITIVE)
+        self.assertEqual(database.find_student_by_email("EMAIL1").get_student_id(), "student_id1")
+        self.assertEqual(database.get_cache_stats()["misses"], 0)
+
+        # a case sensitive engine does not use the normalized index
+        database = self.open_database()
+        self.assertIsNone(database.find_student_by_email("EMAIL1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from dao.database.json_format import JsonFormat
+from dao.database.table_file import TableFile
+from util.exception import CorruptDataException
+
+
+class TestJsonFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.table_columns = {table: TableFile.TABLE_COLUMNS[table] for table in ("students", "admins", "subjects")}
+        self.tables = {"students": [("000001", "näme1", "email1", "pass1", None),
+                                    ("000002", "name{2}", "email2", "pass2", "PASS")],
+                       "admins": [],
+                       "subjects": [("000001", "001", 90, "HD"), ("000001", "002", "90", "HD")]}
+
+    def test_round_trip(self):
+        content = JsonFormat.encode(self.tables, self.table_columns).encode("utf-8")
+        self.assertEqual(JsonFormat.decode(content, self.table_columns), self.tables)
+        self.assertIsNone(JsonFormat.salvage(json.dumps({"admins": []}).encode(), self.table_columns))
+
+    def test_version_1_is_read(self):
+        content = json.dumps({"students": [dict(zip(self.table_columns["students"], self.tables["students"][0]))]},
+                             indent=4).encode("utf-8")
+        self.assertEqual(JsonFormat.decode(content, self.table_columns),
+                         {"students": self.tables["students"][:1], "admins": [], "subjects": []})
+
+    def test_every_damaged_byte(self):
+        # one damaged byte is never read as other rows, and salvage keeps the rows it did not hit
+        content = JsonFormat.encode(self.tables, self.table_columns).encode("utf-8")
+        rows = {(table, row) for table, table_rows in self.tables.items() for row in table_rows}
+        for position in range(len(content)):
+            damaged = bytearray(content)
+            damaged[position] = ord("x") if content[position] != ord("x") else ord("y")
+            try:
+                self.assertEqual(JsonFormat.decode(bytes(damaged), self.table_columns), self.tables)
+                continue
+            except CorruptDataException:
+                pass
+            tables, _ = JsonFormat.salvage(bytes(damaged), self.table_columns)
+            salvaged = {(table, row) for table, table_rows in tables.items() for row in table_rows}
+            self.assertLessEqual(salvaged, rows)
+            # a damaged line break joins two rows on one line
+            self.assertLessEqual(len(rows) - len(salvaged), 2, position)
+
+
+if __name__ == '__main__':
+    unittest.main()
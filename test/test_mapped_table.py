@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.mapped_table import MappedTable
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from dao.impl.student_dao import StudentDao
+from dao.impl.subject_dao import SubjectDao
+
+
+class TestMappedTable(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+        database = self.open_database()
+        database.write_students([Student("student_id1", "student_name1", "email1", "pass1"),
+                                 Student("student_id2", "student_name2", "email2", "pass2")])
+        database.write_subjects([Subject("student_id1", "subject_id1", 90, "HD"),
+                                 Subject("student_id1", "subject_id2", 60, "P"),
+                                 Subject("student_id2", "subject_id1", 40, "Z")])
+
+        # a new engine maps the file written above
+        self.database = self.open_database()
+        self.table_file = self.database._table_files["subjects"]
+
+    def tearDown(self):
+        self.database.delete_data_file()
+        self.temp_dir.cleanup()
+
+    def open_database(self):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE,
+                        DatabaseConfig.FSYNC_NEVER, DatabaseConfig.FORMAT_BINARY, DatabaseConfig.READ_MMAP)
+
+    def test_lookups_do_not_build_rows(self):
+        self.assertEqual(SubjectDao(self.database).query_subject_count_by_student_id("student_id1"), 2)
+        student = StudentDao(self.database).query_student_by_email("email2")
+        self.assertEqual(student.get_student_id(), "student_id2")
+
+        subjects = self.table_file._version._tables["subjects"]
+        self.assertIsInstance(subjects, MappedTable)
+        # only the key column is decoded
+        self.assertEqual(list(subjects._decoded), ["student_id"])
+
+    def test_write_decodes_and_logs(self):
+        subject_dao = SubjectDao(self.database)
+        subject_dao.update_subject(Subject("student_id2", "subject_id1", 55, "P"))
+
+        self.assertNotIsInstance(self.table_file._version._tables["subjects"], MappedTable)
+        self.assertEqual(subject_dao.query_subject_by_student_and_subject("student_id2", "subject_id1")
+                         .get_subject_mark(), 55)
+
+        # a new engine maps the checkpoint and replays the log on top of it
+        database = self.open_database()
+        self.assertEqual(len(database.read_subjects()), 3)
+        self.assertEqual(database.find_subject("student_id2", "subject_id1").get_subject_mark(), 55)
+
+    def test_checkpoint_rewrites_mapped_file(self):
+        self.database.checkpoint()
+        self.assertEqual(len(self.open_database().read_students()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from dao.database.change_events import ChangeEvent
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.sqlite_database import SqliteDatabase
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from dao.impl.student_dao import StudentDao
+from dao.impl.subject_dao import SubjectDao
+from util.exception import PrimaryKeyDuplicationException, UniqueKeyDuplicationException
+
+
+class TestSqliteDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database = SqliteDatabase(os.path.join(self.temp_dir.name, 'student.data.sqlite'))
+        self.student_dao = StudentDao(self.database)
+        self.subject_dao = SubjectDao(self.database)
+
+        self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        self.student_dao.add_student(Student("student_id2", "student_name2", "email2", "pass2"))
+        self.subject_dao.add_subject(Subject("student_id1", "subject_id1", 90, "HD"))
+        self.subject_dao.add_subject(Subject("student_id1", "subject_id2", 60, "P"))
+
+    def tearDown(self):
+        self.database.close()
+        self.temp_dir.cleanup()
+
+    def test_wal_journal_mode(self):
+        mode = self.database._connection().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_recover(self):
+        # sqlite rolls its WAL back itself, recover only checks the file
+        self.assertEqual(self.database.recover(), {"repaired": 0, "dropped_bytes": 0, "dropped_rows": 0})
+
+    def test_keyed_queries(self):
+        self.assertEqual(self.student_dao.query_student_info_by_id("student_id2").get_student_email(), "email2")
+        self.assertEqual(self.student_dao.query_student_by_email("email1").get_student_id(), "student_id1")
+        self.assertIsNone(self.student_dao.query_student_by_email("email3"))
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("student_id1"), 2)
+        self.assertEqual(self.subject_dao.query_subject_by_student_and_subject("student_id1", "subject_id2")
+                         .get_subject_mark(), 60)
+
+    def test_update_keeps_insertion_semantics(self):
+        self.subject_dao.update_subject(Subject("student_id1", "subject_id1", 40, "Z"))
+
+        # an updated row moves to the end, like in the JSON engine
+        subjects = self.subject_dao.query_all_subjects()
+        self.assertEqual([subject.get_subject_id() for subject in subjects], ["subject_id2", "subject_id1"])
+        self.assertEqual(subjects[1].get_subject_mark(), 40)
+
+    def test_update_of_changed_columns(self):
+        subject = self.subject_dao.query_subject_by_student_and_subject("student_id1", "subject_id1")
+        subject.set_subject_mark(50)
+        self.subject_dao.update_subject(subject)
+        self.assertEqual(subject.get_dirty_fields(), set())
+        # the row keeps its place, only the mark is set
+        self.assertEqual([(one.get_subject_id(), one.get_subject_mark(), one.get_subject_grade())
+                          for one in self.database.read_subjects()][0], ("subject_id1", 50, "HD"))
+
+    def test_update_of_new_entity(self):
+        # a setter on an entity created by the caller does not drop its constructor values
+        subject = Subject("student_id1", "subject_id1", 78, "HD")
+        subject.set_subject_grade("D")
+        self.subject_dao.update_subject(subject)
+        stored = self.subject_dao.query_subject_by_student_and_subject("student_id1", "subject_id1")
+        self.assertEqual((stored.get_subject_mark(), stored.get_subject_grade()), (78, "D"))
+
+    def test_change_events(self):
+        events = []
+        self.database.subscribe(events.append)
+        subject = self.subject_dao.query_subject_by_student_and_subject("student_id1", "subject_id1")
+        subject.set_subject_mark(50)
+        with self.database.transaction():
+            self.subject_dao.update_subject(subject)
+            self.subject_dao.delete_subject_by_student_and_subject("student_id1", "subject_id9")
+            self.student_dao.delete_student_by_id("student_id2")
+            self.assertEqual(events, [])
+        self.assertEqual([event.get_kind() for event in events],
+                         [ChangeEvent.SUBJECT_UPDATED, ChangeEvent.STUDENT_DELETED])
+        self.assertEqual(events[0].get_row(), {"student_id": "student_id1", "subject_id": "subject_id1",
+                                               "mark": 50, "grade": "HD"})
+
+    def test_case_insensitive_email(self):
+        database = SqliteDatabase(os.path.join(self.temp_dir.name, 'nocase.sqlite'), DatabaseConfig.FSYNC_NEVER,
+                                  DatabaseConfig.EMAIL_CASE_INSENSITIVE)
+        student_dao = StudentDao(database)
+        student_dao.add_student(Student("student_id1", "student_name1", "Email1", "pass1"))
+        self.assertEqual(student_dao.query_student_by_email("EMAIL1").get_student_id(), "student_id1")
+        with self.assertRaises(UniqueKeyDuplicationException):
+            student_dao.add_student(Student("student_id2", "student_name2", "email1", "pass2"))
+        database.close()
+
+    def test_iter_in_chunks(self):
+        self.assertEqual([student.get_student_id() for student in self.student_dao.iter_students(chunk_size=1)],
+                         ["student_id1", "student_id2"])
+        self.assertEqual([subject.get_subject_id() for subject in self.subject_dao.iter_subjects(chunk_size=1)],
+                         ["subject_id1", "subject_id2"])
+
+    def test_delete(self):
+        self.subject_dao.delete_subject_by_student_and_subject("student_id1", "subject_id1")
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("student_id1"), 1)
+
+        self.subject_dao.delete_subject_list_by_student_id("student_id1")
+        self.student_dao.delete_student_by_id("student_id1")
+        self.assertEqual(self.subject_dao.query_all_subjects(), [])
+        self.assertEqual(len(self.student_dao.query_student_list()), 1)
+
+    def test_constraints_raise_dao_exceptions(self):
+        with self.assertRaises(PrimaryKeyDuplicationException):
+            self.database.insert_student(Student("student_id1", "student_name3", "email3", "pass3"))
+        with self.assertRaises(UniqueKeyDuplicationException):
+            self.database.insert_student(Student("student_id3", "student_name3", "email1", "pass3"))
+        with self.assertRaises(UniqueKeyDuplicationException):
+            self.database.update_student(Student("student_id2", "student_name2", "email1", "pass2"))
+
+        # a failed update leaves the old row in place
+        self.assertEqual(self.database.find_student_by_id("student_id2").get_student_email(), "email2")
+
+    def test_transaction(self):
+        with self.subject_dao.transaction():
+            self.subject_dao.delete_subject_list_by_student_id("student_id1")
+            # a failed call inside only undoes itself
+            with self.assertRaises(UniqueKeyDuplicationException):
+                self.database.update_student(Student("student_id2", "student_name2", "email1", "pass2"))
+            self.student_dao.delete_student_by_id("student_id1")
+        self.assertEqual(self.database.find_student_by_id("student_id2").get_student_email(), "email2")
+        self.assertIsNone(self.database.find_student_by_id("student_id1"))
+
+        with self.assertRaises(RuntimeError):
+            with self.database.transaction():
+                self.subject_dao.add_subject(Subject("student_id2", "subject_id3", 70, "C"))
+                raise RuntimeError("rollback")
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("student_id2"), 0)
+
+    def test_transaction_of_other_thread(self):
+        # a write of another thread neither joins the open transaction nor is rolled back with it
+        events = []
+        self.database.subscribe(events.append, kinds={ChangeEvent.STUDENT_ADDED})
+        writer = threading.Thread(target=lambda: self.database.insert_student(
+            Student("student_id4", "student_name4", "email4", "pass4")))
+        with self.assertRaises(RuntimeError):
+            with self.database.transaction():
+                self.database.insert_student(Student("student_id3", "student_name3", "email3", "pass3"))
+                writer.start()
+                # the writer waits for the write lock of the transaction
+                time.sleep(0.1)
+                self.assertTrue(writer.is_alive())
+                self.assertIsNone(self.database.find_student_by_id("student_id4"))
+                raise RuntimeError("rollback")
+        writer.join(5)
+
+        self.assertIsNone(self.database.find_student_by_id("student_id3"))
+        self.assertIsNotNone(self.database.find_student_by_id("student_id4"))
+        self.assertEqual([event.get_key() for event in events], [{"id": "student_id4"}])
+
+    def test_snapshot(self):
+        other = SqliteDatabase(self.database.get_data_file_path())
+        try:
+            with self.database.snapshot():
+                self.assertEqual(self.database.count_subjects_by_student_id("student_id1"), 2)
+                # another connection writes meanwhile, without waiting for the snapshot
+                other.delete_subjects("student_id1")
+                other.delete_students("student_id1")
+                self.assertEqual(len(self.database.read_subjects()), 2)
+                self.assertEqual(self.database.find_student_by_id("student_id1").get_student_name(), "student_name1")
+            self.assertEqual(self.database.read_subjects(), [])
+        finally:
+            other.close()
+
+    def test_snapshot_does_not_take_in_other_threads(self):
+        # a report that fails does not roll back what another thread wrote meanwhile
+        with self.assertRaises(RuntimeError):
+            with self.database.snapshot():
+                self.assertEqual(len(self.database.read_students()), 2)
+                writer = threading.Thread(target=lambda: self.database.insert_student(
+                    Student("student_id3", "student_name3", "email3", "pass3")))
+                writer.start()
+                writer.join(5)
+                self.assertFalse(writer.is_alive())
+                # the report still sees its own version
+                self.assertEqual(len(self.database.read_students()), 2)
+                raise RuntimeError("report failed")
+
+        self.assertEqual(len(self.database.read_students()), 3)
+        other = SqliteDatabase(self.database.get_data_file_path())
+        try:
+            self.assertIsNotNone(other.find_student_by_id("student_id3"))
+        finally:
+            other.close()
+
+    def test_import_from_json(self):
+        data_file_path = os.path.join(self.temp_dir.name, 'other.data')
+        json_database = Database(data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE)
+        json_database.write_students([Student("student_id9", "student_name9", "email9", "pass9")])
+
+        self.database.import_from(json_database)
+        self.assertEqual([student.get_student_id() for student in self.database.read_students()], ["student_id9"])
+        self.assertEqual(self.database.read_subjects(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
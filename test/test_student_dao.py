@@ -3,6 +3,7 @@ import unittest
 from dao.entity.student import Student
 from dao.impl.admin_dao import AdminDao
 from dao.impl.student_dao import StudentDao
+from util.exception import PrimaryKeyDuplicationException, UniqueKeyDuplicationException
 
 
 class TestStudentDao(unittest.TestCase):
@@ -62,6 +63,41 @@ class TestStudentDao(unittest.TestCase):
         self.assertEqual(updated_student.get_student_name(), "student_name_new")
         self.assertEqual(updated_student.get_student_email(), "student_email_new")
 
+    def test_add_students_in_batch(self):
+        failures = self.student_dao.add_students([
+            Student("student_id4", "student_name4", "student_email4", "pass4"),
+            Student("student_id5", "student_name5", "student_email5", "pass5")])
+        self.assertEqual(failures, [])
+        self.assertEqual(len(self.student_dao.query_student_list()), 5)
+        self.assertEqual(self.student_dao.query_student_info_by_id("student_id5").get_student_name(),
+                         "student_name5")
+
+    def test_add_students_rejects_whole_batch(self):
+        # repeated in database, then repeated inside the batch: nothing is saved
+        with self.assertRaises(PrimaryKeyDuplicationException):
+            self.student_dao.add_students([
+                Student("student_id4", "student_name4", "student_email4", "pass4"),
+                Student("student_id1", "student_name1", "student_email9", "pass1")])
+        with self.assertRaises(UniqueKeyDuplicationException):
+            self.student_dao.add_students([
+                Student("student_id4", "student_name4", "student_email4", "pass4"),
+                Student("student_id5", "student_name5", "student_email4", "pass5")])
+        self.assertEqual(len(self.student_dao.query_student_list()), 3)
+
+    def test_add_students_report_failures(self):
+        failures = self.student_dao.add_students([
+            Student("student_id4", "student_name4", "student_email4", "pass4"),
+            Student("student_id1", "student_name1", "student_email9", "pass1"),
+            Student("student_id4", "student_name4", "student_email8", "pass4"),
+            Student("student_id5", "student_name5", "student_email2", "pass5"),
+            Student("student_id6", "student_name6", "student_email6", "pass6")], report_failures=True)
+
+        self.assertEqual([position for position, _ in failures], [1, 2, 3])
+        self.assertIsInstance(failures[1][1], PrimaryKeyDuplicationException)
+        self.assertIsInstance(failures[2][1], UniqueKeyDuplicationException)
+        ids = sorted(student.get_student_id() for student in self.student_dao.query_student_list())
+        self.assertEqual(ids, ["student_id1", "student_id2", "student_id3", "student_id4", "student_id6"])
+
 
 if __name__ == '__main__':
     unittest.main()
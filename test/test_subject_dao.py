@@ -3,6 +3,7 @@ import unittest
 from dao.entity.subject import Subject
 from dao.impl.admin_dao import AdminDao
 from dao.impl.subject_dao import SubjectDao
+from util.exception import PrimaryKeyDuplicationException
 
 
 class TestSubjectDao(unittest.TestCase):
@@ -109,6 +110,21 @@ class TestSubjectDao(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def test_add_subjects_in_batch(self):
+        self.subject_dao.add_subject(self.subject1)
+
+        # the repeated enrollment rejects the whole batch
+        with self.assertRaises(PrimaryKeyDuplicationException):
+            self.subject_dao.add_subjects([self.subject2, self.subject3, self.subject2])
+        self.assertEqual(len(self.subject_dao.query_all_subjects()), 1)
+
+        # or is reported and skipped
+        failures = self.subject_dao.add_subjects([self.subject2, self.subject1, self.subject3, self.subject4],
+                                                 report_failures=True)
+        self.assertEqual([position for position, _ in failures], [1])
+        self.assertEqual(len(self.subject_dao.query_all_subjects()), 4)
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("student_id1"), 3)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from dao.database.binary_format import BinaryFormat
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.table_file import TableFile
+from dao.database.table_stream import JsonStreamReader, TableStream
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from dao.impl.subject_dao import SubjectDao
+from service.admin_service import AdminService
+
+
+class TestTableStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = {"students": [("id1", "näme1", "email1", "pass1", None), ("id2", "name2", "email2", "pass2", "C")],
+                       "subjects": [("id1", f"subject{i}", i, "P") for i in range(25)]}
+
+    def test_json_table_in_small_blocks(self):
+        # blocks of 7 bytes cut values, keys and multi-byte characters
+        content = json.dumps({table: [dict(zip(TableFile.TABLE_COLUMNS[table], row)) for row in rows]
+                              for table, rows in self.tables.items()}, indent=4).encode("utf-8")
+        with mock.patch.object(JsonStreamReader, "BLOCK_SIZE", 7):
+            for table, rows in self.tables.items():
+                chunks = list(TableStream.iter_json_table(io.BytesIO(content), table,
+                                                          TableFile.TABLE_COLUMNS[table], 10))
+                self.assertEqual([row for chunk in chunks for row in chunk], rows)
+                self.assertTrue(all(len(chunk) <= 10 for chunk in chunks))
+
+    def test_binary_table_in_small_blocks(self):
+        content = BinaryFormat.encode(self.tables, TableFile.TABLE_COLUMNS)
+        with mock.patch.object(TableStream, "BLOCK_SIZE", 8), mock.patch.object(JsonStreamReader, "BLOCK_SIZE", 3):
+            for table, rows in self.tables.items():
+                chunks = list(TableStream.iter_binary_table(content, table, TableFile.TABLE_COLUMNS[table], 10))
+                self.assertEqual([row for chunk in chunks for row in chunk], rows)
+
+    def test_missing_table_and_empty_file(self):
+        self.assertEqual(list(TableStream.iter_json_table(io.BytesIO(b""), "students", ("id",), 10)), [])
+        self.assertEqual(list(TableStream.iter_json_table(io.BytesIO(b'{"admins": []}'), "students", ("id",), 10)),
+                         [])
+
+
+class TestDatabaseStream(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_database(self, file_format, storage_mode=DatabaseConfig.STORAGE_OVERWRITE):
+        return Database(self.data_file_path, storage_mode, DatabaseConfig.LAYOUT_SINGLE,
+                        DatabaseConfig.FSYNC_NEVER, file_format)
+
+    def test_iter_is_not_cached(self):
+        for file_format in (DatabaseConfig.FORMAT_JSON, DatabaseConfig.FORMAT_BINARY):
+            self.open_database(file_format).write_subjects(
+                [Subject("id1", f"subject{i}", i, "P") for i in range(5)])
+
+            database = self.open_database(file_format)
+            subjects = list(SubjectDao(database).iter_subjects(chunk_size=2))
+            self.assertEqual([subject.get_subject_mark() for subject in subjects], list(range(5)))
+            self.assertEqual(database.get_cache_stats(), {"hits": 0, "misses": 0})
+
+    def test_iter_sees_logged_changes(self):
+        database = self.open_database(DatabaseConfig.FORMAT_JSON, DatabaseConfig.STORAGE_WAL)
+        database.insert_student(Student("id1", "name1", "email1", "pass1"))
+        database.insert_student(Student("id2", "name2", "email2", "pass2"))
+        database.delete_students("id1")
+
+        reopened = self.open_database(DatabaseConfig.FORMAT_JSON, DatabaseConfig.STORAGE_WAL)
+        self.assertEqual([student.get_student_id() for student in reopened.iter_students()], ["id2"])
+
+    def test_iter_waits_for_transaction_of_other_thread(self):
+        database = self.open_database(DatabaseConfig.FORMAT_JSON, DatabaseConfig.STORAGE_WAL)
+        database.insert_student(Student("id1", "name1", "email1", "pass1"))
+        iterated = []
+
+        def iterate():
+            iterated.extend(student.get_student_id() for student in database.iter_students())
+
+        reader = threading.Thread(target=iterate)
+        with self.assertRaises(RuntimeError):
+            with database.transaction():
+                database.insert_student(Student("id2", "name2", "email2", "pass2"))
+                reader.start()
+                # the reader waits for the lock, or reads the published version in snapshot threading mode,
+                # it never sees the uncommitted student
+                reader.join(0.2)
+                raise RuntimeError("rolled back")
+        reader.join(5)
+        self.assertEqual(iterated, ["id1"])
+        self.assertEqual([student.get_student_id() for student in database.read_students()], ["id1"])
+
+    def test_reports_from_stream(self):
+        database = self.open_database(DatabaseConfig.FORMAT_JSON)
+        database.write_students([Student("id1", "name1", "email1", "pass1")])
+        database.write_subjects([Subject("id1", "subject1", 80, "D"), Subject("id1", "subject2", 30, "Z")])
+
+        with mock.patch.object(Database, "get_instance", return_value=database):
+            admin_service = AdminService()
+        self.assertEqual(admin_service.partition_students(),
+                         (["name1 :: id1 --> GRADE: D - MARK: 80"], ["name1 :: id1 --> GRADE: Z - MARK: 30"]))
+        self.assertEqual(admin_service.group_students(),
+                         ["D\t-->[name1\t:: id1 --> GRADE: D - MARK: 80]",
+                          "Z\t-->[name1\t:: id1 --> GRADE: Z - MARK: 30]"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import gc
+import os
+import tempfile
+import unittest
+
+from dao.database.config import DatabaseConfig
+from dao.database.file_sync import FileSync
+from dao.database.table_file import TableFile
+from dao.database.table_replay import TableReplay
+from dao.entity.subject import Subject
+
+
+class TestTableVersion(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.table_file = TableFile(os.path.join(self.temp_dir.name, 'student.data'), ("students", "subjects"),
+                                    FileSync(DatabaseConfig.FSYNC_NEVER))
+        self.table_file.load()
+        self.table_file.set_rows("subjects", [("student_id1", f"subject_id{i}", i, "P") for i in range(1000)])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def record(self, op, subject_id, mark):
+        if op == "patch":
+            return {"op": op, "table": "subjects", "where": {"student_id": "student_id1", "subject_id": subject_id},
+                    "set": {"mark": mark}}
+        return {"op": op, "table": "subjects", "row": Subject("student_id1", subject_id, mark, "P").to_dict()}
+
+    def test_changes_do_not_copy_rows(self):
+        rows = self.table_file.get_rows("subjects")
+        version = self.table_file._version
+        keyed = None
+        for i in range(100):
+            self.table_file.apply([self.record("update", f"subject_id{i}", -i)])
+            self.table_file.apply([self.record("patch", f"subject_id{i + 500}", -i)])
+            # the rows are keyed on the first change and changed in place after that
+            keyed = keyed or version._keyed["subjects"]
+            self.assertIs(version._keyed["subjects"], keyed)
+            self.assertIsNone(version._tables["subjects"])
+
+        # a list handed out before stays unchanged
+        self.assertEqual(rows[0], ("student_id1", "subject_id0", 0, "P"))
+        # changed rows move to the end, like delete and add
+        changed_rows = self.table_file.get_rows("subjects")
+        self.assertEqual(len(changed_rows), 1000)
+        self.assertEqual(changed_rows[-2:], [("student_id1", "subject_id99", -99, "P"),
+                                             ("student_id1", "subject_id599", -99, "P")])
+        self.assertEqual(self.table_file.find_indexed("subjects", ("student_id", "subject_id"),
+                                                      ("student_id1", "subject_id5")),
+                         [("student_id1", "subject_id5", -5, "P")])
+
+    def test_published_version_is_not_changed(self):
+        published = self.table_file._version
+        published.table_indexes("subjects")
+        self.table_file._version = published.copy()
+        self.table_file.apply([self.record("insert", "subject_id1000", 1000),
+                               {"op": "delete", "table": "subjects", "where": {"subject_id": "subject_id1"}}])
+
+        self.assertEqual(len(published.get_rows("subjects")), 1000)
+        self.assertEqual(published.count_rows("subjects", "student_id", "student_id1"), 1000)
+        self.assertEqual(len(published.find_indexed("subjects", ("student_id", "subject_id"),
+                                                    ("student_id1", "subject_id1"))), 1)
+        self.assertEqual(self.table_file._version.count_rows("subjects", "student_id", "student_id1"), 1000)
+        self.assertEqual(self.table_file.get_rows("subjects")[-1], ("student_id1", "subject_id1000", 1000, "P"))
+        self.assertEqual(self.table_file.find_indexed("subjects", ("student_id", "subject_id"),
+                                                      ("student_id1", "subject_id1")), [])
+
+
+class TestPausedGc(unittest.TestCase):
+
+    def test_overlapping_pauses(self):
+        # the replays of two shards, the first one ends while the second one still runs
+        self.assertTrue(gc.isenabled())
+        first, second = TableReplay.paused_gc(), TableReplay.paused_gc()
+        first.__enter__()
+        second.__enter__()
+        first.__exit__(None, None, None)
+        self.assertFalse(gc.isenabled())
+        second.__exit__(None, None, None)
+        self.assertTrue(gc.isenabled())
+
+        # paused before, it stays paused
+        gc.disable()
+        try:
+            with TableReplay.paused_gc():
+                pass
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+
+
+if __name__ == '__main__':
+    unittest.main()
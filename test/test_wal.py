@@ -0,0 +1,240 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from dao.database.config import DatabaseConfig
+from dao.database.database import Database
+from dao.database.file_sync import FileSync
+from dao.database.table_file import TableFile
+from dao.database.wal import WriteAheadLog
+from dao.entity.student import Student
+from dao.entity.subject import Subject
+from dao.impl.student_dao import StudentDao
+from dao.impl.subject_dao import SubjectDao
+from util.exception import CorruptDataException
+
+
+class TestWriteAheadLog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.wal = WriteAheadLog(os.path.join(self.temp_dir.name, 'student.data.wal'),
+                                 FileSync(DatabaseConfig.FSYNC_NEVER))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_append_and_replay(self):
+        self.assertEqual(self.wal.replay(), ([], 0))
+
+        self.wal.append([{"op": "delete", "table": "students", "where": {"id": "1"}}])
+        records, offset = self.wal.replay()
+        self.assertEqual(len(records), 1)
+
+        # replay from offset only returns the tail
+        self.wal.append([{"op": "delete", "table": "students", "where": {"id": "2"}}])
+        records, offset = self.wal.replay(offset)
+        self.assertEqual(records, [{"op": "delete", "table": "students", "where": {"id": "2"}}])
+
+    def test_batch_is_replayed_whole_or_not_at_all(self):
+        records = [{"op": "delete", "table": "students", "where": {"id": str(i)}} for i in range(3)]
+        self.wal.append(records)
+        self.assertEqual(self.wal.replay()[0], records)
+
+        # a torn batch loses all of its records
+        size = os.path.getsize(self.wal.get_log_file_path())
+        self.wal.append(records)
+        with open(self.wal.get_log_file_path(), 'r+b') as file:
+            file.truncate(size + 40)
+        self.assertEqual(self.wal.replay(), (records, size))
+
+    def test_torn_tail_is_ignored(self):
+        self.wal.append([{"op": "delete", "table": "students", "where": {"id": "1"}}])
+        with open(self.wal.get_log_file_path(), 'a') as file:
+            file.write('{"op": "del')
+
+        records, offset = self.wal.replay()
+        self.assertEqual(len(records), 1)
+        self.assertLess(offset, os.path.getsize(self.wal.get_log_file_path()))
+
+    def test_damaged_record_ends_replay(self):
+        for i in range(3):
+            self.wal.append([{"op": "delete", "table": "students", "where": {"id": str(i)}}])
+        with open(self.wal.get_log_file_path(), 'rb') as file:
+            lines = file.readlines()
+        with open(self.wal.get_log_file_path(), 'wb') as file:
+            file.write(lines[0] + lines[1].replace(b'"1"', b'"7"') + lines[2])
+
+        # the records after the damaged one are dropped as well
+        records, offset = self.wal.replay()
+        self.assertEqual(records, [{"op": "delete", "table": "students", "where": {"id": "0"}}])
+        self.assertEqual(offset, len(lines[0]))
+
+    def test_lines_without_checksum(self):
+        with open(self.wal.get_log_file_path(), 'w') as file:
+            file.write('{"op":"delete","table":"students","where":{"id":"1"}}\n')
+        self.assertEqual(self.wal.replay()[0], [{"op": "delete", "table": "students", "where": {"id": "1"}}])
+
+
+class TestCrashRecovery(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = self.open()
+        self.database.insert_student(Student("student_id1", "student_name1", "email1", "pass1"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self):
+        return Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE)
+
+    def damage_log(self, content):
+        with open(self.data_file_path + ".wal", 'ab') as file:
+            file.write(content)
+
+    def test_append_after_torn_tail(self):
+        self.damage_log(b'0badc0de {"op":"ins')
+
+        # no repair needed, the next write cuts the torn line off before it appends
+        self.open().insert_student(Student("student_id2", "student_name2", "email2", "pass2"))
+        self.assertEqual(len(self.open().read_students()), 2)
+        with open(self.data_file_path + ".wal", 'rb') as file:
+            self.assertNotIn(b"0badc0de", file.read())
+
+    def test_recover_drops_damaged_tail(self):
+        size = os.path.getsize(self.data_file_path + ".wal")
+        # a complete line with a wrong checksum, then a valid one
+        self.damage_log(b'00000000 {"op":"delete","table":"students","where":{"id":"student_id1"}}\n')
+        self.damage_log(WriteAheadLog.encode({"op": "delete", "table": "students",
+                                              "where": {"id": "student_id1"}}).encode())
+        damaged_size = os.path.getsize(self.data_file_path + ".wal")
+
+        self.assertEqual(self.open().recover(),
+                         {"repaired": 1, "dropped_bytes": damaged_size - size, "dropped_rows": 0})
+        self.assertEqual(os.path.getsize(self.data_file_path + ".wal"), size)
+        self.assertEqual(self.open().recover(), {"repaired": 0, "dropped_bytes": 0, "dropped_rows": 0})
+        self.assertEqual(len(self.open().read_students()), 1)
+
+    def test_corrupt_json_data_file(self):
+        with open(self.data_file_path, 'w') as file:
+            file.write('{"students": [{"id": "student_id1",')
+        with self.assertRaises(CorruptDataException):
+            self.open().read_students()
+
+    def test_damaged_row_of_json_data_file(self):
+        path = self.data_file_path + ".json"
+
+        def open_json():
+            return Database(path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE,
+                            DatabaseConfig.FSYNC_NEVER, DatabaseConfig.FORMAT_JSON)
+
+        # a changed value is still valid JSON, a damaged quote is not
+        for damage, replacement in ((b'"name2"', b'"name7"'), (b'"email2"', b'"email2 ')):
+            with self.subTest(damage=damage):
+                open_json().write_students([Student(f"student_id{i}", f"name{i}", f"email{i}", "pass")
+                                            for i in range(1, 4)])
+                with open(path, 'rb') as file:
+                    content = file.read()
+                with open(path, 'wb') as file:
+                    file.write(content.replace(damage, replacement))
+
+                with self.assertRaises(CorruptDataException):
+                    open_json().read_students()
+                with self.assertRaises(CorruptDataException):
+                    list(open_json().iter_students())
+                # the other rows pass their checksums and are kept
+                self.assertEqual(open_json().recover(), {"repaired": 1, "dropped_bytes": 0, "dropped_rows": 1})
+                self.assertEqual([student.get_student_id() for student in open_json().read_students()],
+                                 ["student_id1", "student_id3"])
+
+    def test_bulk_replay_matches_apply(self):
+        random.seed(7)
+        records = []
+        for i in range(500):
+            student_id, subject_id = f"student_id{random.randrange(20)}", f"subject_id{random.randrange(5)}"
+            op = random.choice(("insert", "update", "patch", "delete", "delete_all"))
+            if op == "delete":
+                records.append({"op": "delete", "table": "subjects",
+                                "where": {"student_id": student_id, "subject_id": subject_id}})
+            elif op == "delete_all":
+                records.append({"op": "delete", "table": "subjects", "where": {"student_id": student_id}})
+            elif op == "patch":
+                records.append({"op": "patch", "table": "subjects",
+                                "where": {"student_id": student_id, "subject_id": subject_id}, "set": {"mark": i}})
+            else:
+                row = Subject(student_id, subject_id, i, "P").to_dict()
+                records.append({"op": op, "table": "subjects", "row": row})
+            if i % 7 == 0:
+                records.append({"op": "insert", "table": "students",
+                                "row": Student(student_id, "name", f"Email{i}", "pass").to_dict()})
+            if i % 11 == 0:
+                records.append({"op": "delete", "table": "students", "where": {"email": f"EMAIL{i - 4}"}})
+
+        def replayed(bulk_records):
+            table_file = TableFile(self.data_file_path + ".bulk", ("students", "subjects"),
+                                   FileSync(DatabaseConfig.FSYNC_NEVER),
+                                   email_case=DatabaseConfig.EMAIL_CASE_INSENSITIVE)
+            table_file.delete()
+            table_file._wal.append(records)
+            with mock.patch.object(TableFile, "BULK_REPLAY_RECORDS", bulk_records):
+                table_file.load()
+            return {table: table_file.get_rows(table) for table in ("students", "subjects")}
+
+        self.assertEqual(replayed(0), replayed(len(records)))
+
+
+class TestWalStorageMode(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.temp_dir.name, 'student.data')
+        self.database = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE)
+        self.student_dao = StudentDao(self.database)
+        self.subject_dao = SubjectDao(self.database)
+
+        self.student_dao.add_student(Student("student_id1", "student_name1", "email1", "pass1"))
+        self.subject_dao.add_subject(Subject("student_id1", "subject_id1", 90, "HD"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_changes_are_appended_not_rewritten(self):
+        self.assertEqual(os.path.getsize(self.data_file_path), 0)
+
+        size = os.path.getsize(self.data_file_path + ".wal")
+        self.subject_dao.update_subject(Subject("student_id1", "subject_id1", 40, "Z"))
+        self.assertGreater(os.path.getsize(self.data_file_path + ".wal"), size)
+        self.assertEqual(os.path.getsize(self.data_file_path), 0)
+
+    def test_reopen_replays_log(self):
+        self.subject_dao.update_subject(Subject("student_id1", "subject_id1", 40, "Z"))
+        self.student_dao.delete_student_by_id("student_id1")
+
+        database = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE)
+        self.assertEqual(database.read_students(), [])
+        subjects = database.read_subjects()
+        self.assertEqual(len(subjects), 1)
+        self.assertEqual(subjects[0].get_subject_mark(), 40)
+
+    def test_checkpoint_folds_log_into_data_file(self):
+        self.database.checkpoint()
+        self.assertFalse(os.path.exists(self.data_file_path + ".wal"))
+
+        # overwrite mode reads the same state from the checkpoint alone
+        database = Database(self.data_file_path, DatabaseConfig.STORAGE_OVERWRITE, DatabaseConfig.LAYOUT_SINGLE)
+        self.assertEqual(len(database.read_students()), 1)
+        self.assertEqual(len(database.read_subjects()), 1)
+
+    def test_log_tail_of_other_engine_is_replayed(self):
+        other = Database(self.data_file_path, DatabaseConfig.STORAGE_WAL, DatabaseConfig.LAYOUT_SINGLE)
+        SubjectDao(other).add_subject(Subject("student_id1", "subject_id2", 70, "C"))
+
+        self.assertEqual(self.subject_dao.query_subject_count_by_student_id("student_id1"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,31 @@ class UniqueKeyDuplicationException(DataAccessException):
     pass
 
 
+class LockTimeoutException(DataAccessException):
+    """
+    customised data access layer exception
+    raise this exception if the database file lock is not acquired within the lock timeout
+    """
+    pass
+
+
+class WriteConflictException(DataAccessException):
+    """
+    customised data access layer exception
+    raise this exception if another process committed since a transaction read the data, see optimistic concurrency
+    """
+    pass
+
+
+class CorruptDataException(DataAccessException):
+    """
+    customised data access layer exception
+    raise this exception if a data file fails its checksum or cannot be parsed, e.g. bytes damaged on disk
+    """
+    pass
+
+
 class BusinessException(Exception):
     """ customised service exception """
     pass
+